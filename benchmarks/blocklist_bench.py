@@ -0,0 +1,73 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.blocklist.index import BlocklistIndex
+
+
+def random_v4(rng):
+    return ".".join(str(rng.randrange(256)) for _ in range(4))
+
+
+def random_v6(rng):
+    return ":".join(f"{rng.randrange(65536):x}" for _ in range(8))
+
+
+def make_entries(rng, count):
+    # Mostly single IPs with a realistic share of ranges, the way ban lists look.
+    entries = []
+    for i in range(count):
+        kind = i % 10
+        if kind < 6:
+            entries.append(random_v4(rng))
+        elif kind == 6:
+            entries.append(f"{random_v4(rng)}/24")
+        elif kind == 7:
+            entries.append(f"{random_v4(rng)}/16")
+        elif kind == 8:
+            entries.append(random_v6(rng))
+        else:
+            entries.append(f"{random_v6(rng)}/{rng.choice((48, 64))}")
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BlocklistIndex lookup benchmark")
+    parser.add_argument("--entries", type=int, default=100_000, help="Blocklist entries to load")
+    parser.add_argument("--lookups", type=int, default=500_000, help="Lookups to time")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    entries = make_entries(rng, args.entries)
+
+    start = time.perf_counter()
+    index = BlocklistIndex(entries)
+    load_elapsed = time.perf_counter() - start
+
+    probes = [random_v4(rng) if i % 5 else random_v6(rng) for i in range(args.lookups // 2)]
+    probes += [entry.split("/")[0] for entry in rng.choices(entries, k=args.lookups - len(probes))]
+    rng.shuffle(probes)
+
+    start = time.perf_counter()
+    hits = 0
+    for ip in probes:
+        if ip in index:
+            hits += 1
+    elapsed = time.perf_counter() - start
+
+    # A periodic refresh where the database holds the same rows plus one new ban.
+    stored = list(index) + ["203.0.113.0/24"]
+    start = time.perf_counter()
+    index.sync(stored)
+    refresh_elapsed = time.perf_counter() - start
+
+    print(f"loaded {len(index)} entries in {load_elapsed * 1000:.0f} ms, refresh in {refresh_elapsed * 1000:.0f} ms")
+    print(f"{args.lookups / elapsed:,.0f} lookups/s ({hits} hits, {elapsed / args.lookups * 1e9:.0f} ns/lookup)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.protocol.decoder import FrameDecoder
+
+
+def varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def frame(packet_id, payload):
+    body = varint(packet_id) + payload
+    return varint(len(body)) + body
+
+
+def legacy_parse_varint(data):
+    value = 0
+    length = 0
+    for i in range(min(len(data), 5)):
+        byte = data[i]
+        value |= (byte & 0x7F) << (7 * i)
+        length += 1
+        if (byte & 0x80) == 0:
+            break
+    return value, length
+
+
+def run_legacy(chunks):
+    # The loop forward() used before FrameDecoder, minus logging and rate limiting.
+    buffer = bytearray()
+    frames = payload_bytes = 0
+    for data in chunks:
+        buffer.extend(data)
+        while len(buffer) >= 1:
+            length, length_bytes = legacy_parse_varint(buffer)
+            total_length = length_bytes + length
+            if len(buffer) < total_length:
+                break
+            packet = bytes(buffer[:total_length])
+            del buffer[:total_length]
+            packet_id, id_bytes = legacy_parse_varint(packet[length_bytes:])
+            payload = packet[length_bytes + id_bytes:]
+            frames += 1
+            payload_bytes += len(payload)
+    return frames, packet_id, payload_bytes
+
+
+def run_decoder(chunks):
+    decoder = FrameDecoder()
+    frames = payload_bytes = 0
+    for data in chunks:
+        decoder.feed(data)
+        for f in decoder:
+            packet_id = f.packet_id
+            payload = f.payload
+            frames += 1
+            payload_bytes += len(payload)
+    return frames, packet_id, payload_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FrameDecoder throughput benchmark")
+    parser.add_argument("--packets", type=int, default=500_000, help="Number of pipelined packets")
+    parser.add_argument("--payload", type=int, default=12, help="Payload bytes per packet")
+    parser.add_argument("--read-size", type=int, default=4096, help="Bytes delivered per read")
+    args = parser.parse_args()
+
+    # Small play packets (player position style) pipelined back to back.
+    stream = b"".join(frame(0x14 + (i % 4), bytes(args.payload)) for i in range(args.packets))
+    chunks = [stream[i:i + args.read_size] for i in range(0, len(stream), args.read_size)]
+    megabytes = len(stream) / (1024 * 1024)
+
+    # Frame count, last packet id and payload bytes; both loops must agree.
+    expected = (args.packets, 0x14 + (args.packets - 1) % 4, args.packets * args.payload)
+    for name, fn in (("legacy", run_legacy), ("FrameDecoder", run_decoder)):
+        start = time.perf_counter()
+        result = fn(chunks)
+        elapsed = time.perf_counter() - start
+        assert result == expected, (name, result)
+        frames = result[0]
+        print(f"{name:>13}: {megabytes / elapsed:8.1f} MB/s  {frames / elapsed:12.0f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import blast, gather_limited, run_backend
+
+SYSCALLS = ("send", "sendmsg", "recv", "recv_into")
+
+
+def run_proxy(ready, control, backend_port, options):
+    # Count socket calls in this process only; each one is one syscall.
+    counts = dict.fromkeys(SYSCALLS, 0)
+    for name in SYSCALLS:
+        original = getattr(socket.socket, name)
+
+        def counted(self, *args, _original=original, _name=name):
+            counts[_name] += 1
+            return _original(self, *args)
+
+        setattr(socket.socket, name, counted)
+
+    from dragonaegis import DragonAegis
+
+    async def main():
+        rate_limiter = DragonAegis(
+            db_manager=None,
+            max_connections=10 ** 9,
+            max_packets=10 ** 9,
+            subnet_limits_v4={},
+            subnet_limits_v6={},
+            log_packets=options.get("decode", False),
+            profile=options.get("profile", False),
+            **options.get("proxy", {}),
+        )
+        server = await asyncio.start_server(
+            lambda r, w: DragonAegis.handle_client(r, w, "127.0.0.1", backend_port, rate_limiter),
+            "127.0.0.1", 0
+        )
+        loop = asyncio.get_running_loop()
+        loop.add_reader(control.fileno(), lambda: (control.recv(), control.send({
+            "calls": dict(counts),
+            "profile": rate_limiter.profiler.describe() if rate_limiter.profiler is not None else None,
+        })))
+        ready.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    # Packet logging prints every frame; keep it off the terminal.
+    sys.stdout = open(os.devnull, "w")
+    asyncio.run(main())
+
+
+def sample(control):
+    control.send("stats")
+    return control.recv()
+
+
+async def drive(port, connections, packets, payload):
+    started = time.perf_counter()
+    sizes = await gather_limited(connections, [
+        (lambda i=i: blast(port, i, packets, payload)) for i in range(connections)
+    ])
+    return time.perf_counter() - started, sum(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forwarding syscalls-per-packet and throughput benchmark")
+    parser.add_argument("--connections", type=int, default=20, help="Concurrent sessions")
+    parser.add_argument("--packets", type=int, default=20000, help="Pipelined packets per session")
+    parser.add_argument("--payload", type=int, default=24, help="Payload bytes per packet")
+    parser.add_argument("--decode", action="store_true", help="Force full decoding (packet logging path) instead of passthrough")
+    parser.add_argument("--profile", action="store_true", help="Run the proxy with profiling on and include its stage and latency histograms")
+    parser.add_argument("--proxy-options", type=str, default="{}", help="JSON keyword arguments for DragonAegis")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("fork")
+    ready = ctx.Queue()
+    dials = ctx.Value("l", 0)
+    backend = ctx.Process(target=run_backend, args=(ready, dials), daemon=True)
+    backend.start()
+    backend_port = ready.get(timeout=10)
+
+    parent_end, child_end = ctx.Pipe()
+    options = {"decode": args.decode, "profile": args.profile, "proxy": json.loads(args.proxy_options)}
+    proxy = ctx.Process(target=run_proxy, args=(ready, child_end, backend_port, options), daemon=True)
+    proxy.start()
+    proxy_port = ready.get(timeout=10)
+
+    try:
+        before = sample(parent_end)
+        elapsed, total_bytes = asyncio.run(drive(proxy_port, args.connections, args.packets, args.payload))
+        after = sample(parent_end)
+    finally:
+        proxy.terminate()
+        backend.terminate()
+
+    packets = args.connections * args.packets
+    calls = {name: after["calls"][name] - before["calls"][name] for name in SYSCALLS}
+    # Every packet crosses the proxy twice: client -> backend and the echo back.
+    print(json.dumps({
+        "packets": packets,
+        "packets_per_sec": round(packets / elapsed),
+        "mb_per_sec": round(total_bytes * 2 / elapsed / (1024 * 1024), 2),
+        "send_calls_per_packet": round((calls["send"] + calls["sendmsg"]) / packets, 4),
+        "recv_calls_per_packet": round((calls["recv"] + calls["recv_into"]) / packets, 4),
+        "calls": calls,
+    }, indent=2))
+    if args.profile:
+        profile = after["profile"]
+        print(json.dumps({"stages": profile["stages"], "latency": profile["latency"], "packets": profile["packets"][:10]}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.protocol.decoder import FrameDecoder
+from src.protocol.encoder import encode_frame, encode_handshake, encode_string
+
+STATUS_JSON = json.dumps({
+    "version": {"name": "fake-backend", "protocol": 763},
+    "players": {"max": 100, "online": 0},
+    "description": {"text": "DragonAegis benchmark backend"},
+})
+
+
+# --- processes -------------------------------------------------------------
+
+def run_backend(ready, dials):
+    """Fake Minecraft server: answers status pings, echoes everything else."""
+
+    async def handle(reader, writer):
+        with dials.get_lock():
+            dials.value += 1
+        decoder = FrameDecoder()
+        try:
+            first = None
+            while first is None:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                decoder.feed(data)
+                first = decoder.next_frame()
+            if first.data[-1] == 1:
+                while True:
+                    for frame in decoder:
+                        if frame.packet_id == 0x00:
+                            writer.write(encode_frame(0x00, encode_string(STATUS_JSON)))
+                        elif frame.packet_id == 0x01:
+                            writer.write(encode_frame(0x01, frame.payload))
+                            return
+                    data = await reader.read(65536)
+                    if not data:
+                        return
+                    decoder.feed(data)
+            writer.write(bytes(first.data) + decoder.take_pending())
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=4096)
+        ready.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def run_proxy(ready, backend_port, handshake_timeout):
+    from dragonaegis import DragonAegis
+    from src.protocol.status import StatusCache
+
+    async def main():
+        # Every client comes from 127.0.0.1, so limits are effectively off.
+        rate_limiter = DragonAegis(
+            db_manager=None,
+            max_connections=10 ** 9,
+            max_packets=10 ** 9,
+            subnet_limits_v4={},
+            subnet_limits_v6={},
+            status_cache=StatusCache("127.0.0.1", backend_port),
+            handshake_timeout=handshake_timeout,
+        )
+        server = await asyncio.start_server(
+            lambda r, w: DragonAegis.handle_client(r, w, "127.0.0.1", backend_port, rate_limiter),
+            "127.0.0.1", 0, backlog=4096
+        )
+        ready.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    sys.stdout = open(os.devnull, "w")
+    asyncio.run(main())
+
+
+def process_usage(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/status") as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    return cpu, rss_kb
+
+
+# --- clients ---------------------------------------------------------------
+
+def login_bytes(index):
+    return encode_handshake("localhost", 25565, 2, 763) + encode_frame(0x00, encode_string(f"bot{index % 100000}") + bytes(16))
+
+
+async def session(port, index, packets, payload, samples):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        greeting = login_bytes(index)
+        writer.write(greeting)
+        await reader.readexactly(len(greeting))
+        frame = encode_frame(0x14, bytes(payload))
+        for _ in range(packets):
+            started = time.perf_counter()
+            writer.write(frame)
+            await reader.readexactly(len(frame))
+            samples.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+async def blast(port, index, packets, payload):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        greeting = login_bytes(index)
+        burst = encode_frame(0x14, bytes(payload)) * packets
+        writer.write(greeting + burst)
+        await reader.readexactly(len(greeting) + len(burst))
+    finally:
+        writer.close()
+    return len(burst)
+
+
+async def ping(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(encode_handshake("localhost", 25565, 1, 763) + encode_frame(0x00) + encode_frame(0x01, bytes(8)))
+        await reader.read()
+    finally:
+        writer.close()
+
+
+async def gather_limited(concurrency, factories):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(factory):
+        async with semaphore:
+            return await factory()
+
+    return await asyncio.gather(*(run(factory) for factory in factories))
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# --- scenarios -------------------------------------------------------------
+
+async def scenario_sessions(args, proxy_port, backend_port, proxy_pid):
+    direct, proxied = [], []
+    await gather_limited(args.concurrency, [
+        (lambda i=i: session(backend_port, i, args.packets, args.payload, direct)) for i in range(args.sessions)
+    ])
+    cpu_before, _ = process_usage(proxy_pid)
+    started = time.perf_counter()
+    await gather_limited(args.concurrency, [
+        (lambda i=i: session(proxy_port, i, args.packets, args.payload, proxied)) for i in range(args.sessions)
+    ])
+    elapsed = time.perf_counter() - started
+    cpu_after, _ = process_usage(proxy_pid)
+
+    ms = lambda value: round(value * 1000, 4)
+    return {
+        "sessions": args.sessions,
+        "packets": len(proxied),
+        "connections_per_sec": round(args.sessions / elapsed, 1),
+        "packets_per_sec": round(len(proxied) / elapsed, 1),
+        "direct_p50_ms": ms(percentile(direct, 0.5)),
+        "direct_p99_ms": ms(percentile(direct, 0.99)),
+        "proxy_p50_ms": ms(percentile(proxied, 0.5)),
+        "proxy_p99_ms": ms(percentile(proxied, 0.99)),
+        "added_p50_ms": ms(percentile(proxied, 0.5) - percentile(direct, 0.5)),
+        "added_p99_ms": ms(percentile(proxied, 0.99) - percentile(direct, 0.99)),
+        "proxy_cpu_ms_per_connection": ms((cpu_after - cpu_before) / args.sessions),
+        "proxy_cpu_us_per_packet": round((cpu_after - cpu_before) / max(1, len(proxied)) * 1e6, 2),
+    }
+
+
+async def scenario_throughput(args, proxy_port, proxy_pid):
+    cpu_before, _ = process_usage(proxy_pid)
+    started = time.perf_counter()
+    sizes = await gather_limited(args.concurrency, [
+        (lambda i=i: blast(proxy_port, i, args.burst, args.payload)) for i in range(args.concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+    cpu_after, _ = process_usage(proxy_pid)
+    packets = args.burst * args.concurrency
+    return {
+        "connections": args.concurrency,
+        "packets": packets,
+        "packets_per_sec": round(packets / elapsed, 1),
+        "mb_per_sec": round(sum(sizes) / elapsed / (1024 * 1024), 2),
+        "proxy_cpu_us_per_packet": round((cpu_after - cpu_before) / packets * 1e6, 2),
+    }
+
+
+async def scenario_ping_flood(args, proxy_port, proxy_pid, dials):
+    dials_before = dials.value
+    cpu_before, _ = process_usage(proxy_pid)
+    started = time.perf_counter()
+    await gather_limited(args.concurrency, [(lambda: ping(proxy_port)) for _ in range(args.pings)])
+    elapsed = time.perf_counter() - started
+    cpu_after, _ = process_usage(proxy_pid)
+    return {
+        "pings": args.pings,
+        "connections_per_sec": round(args.pings / elapsed, 1),
+        "backend_dials": dials.value - dials_before,
+        "proxy_cpu_ms_per_connection": round((cpu_after - cpu_before) / args.pings * 1000, 4),
+    }
+
+
+async def scenario_idle(args, proxy_port, proxy_pid, dials):
+    dials_before = dials.value
+    _, rss_before = process_usage(proxy_pid)
+    connections = []
+    for _ in range(args.idle):
+        reader, writer = await asyncio.open_connection("127.0.0.1", proxy_port)
+        connections.append((reader, writer, time.perf_counter()))
+    await asyncio.sleep(0.5)
+    cpu_before, rss_held = process_usage(proxy_pid)
+
+    async def dropped(reader, opened):
+        # Seconds from connecting to the proxy closing, or None if it never did.
+        data = await asyncio.wait_for(reader.read(), args.handshake_timeout + 5)
+        return time.perf_counter() - opened if data == b"" else None
+
+    # Idle bots should be cut off by the handshake deadline.
+    closed = await asyncio.gather(*(dropped(reader, opened) for reader, _, opened in connections),
+                                  return_exceptions=True)
+    dropped_after = [result for result in closed if isinstance(result, float)]
+    cpu_after, _ = process_usage(proxy_pid)
+    for _, writer, _ in connections:
+        writer.close()
+
+    return {
+        "connections": args.idle,
+        "rss_kb_per_connection": round((rss_held - rss_before) / args.idle, 2),
+        "dropped": len(dropped_after),
+        "dropped_after_s": round(max(dropped_after, default=0.0), 2),
+        "proxy_cpu_ms_per_connection": round((cpu_after - cpu_before) / args.idle * 1000, 4),
+        "backend_dials": dials.value - dials_before,
+    }
+
+
+# --- reporting -------------------------------------------------------------
+
+def compare(current, baseline, path=""):
+    for key, value in current.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        name = f"{path}{key}"
+        if isinstance(value, dict):
+            compare(value, old or {}, f"{name}.")
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and not isinstance(value, bool):
+            change = (value - old) / old * 100 if old else 0.0
+            print(f"  {name:<45} {old:>12} -> {value:<12} ({change:+.1f}%)")
+
+
+async def run_scenarios(args, proxy_port, backend_port, proxy_pid, dials):
+    results = {}
+    scenarios = args.scenarios.split(",")
+    if "sessions" in scenarios:
+        results["sessions"] = await scenario_sessions(args, proxy_port, backend_port, proxy_pid)
+    if "throughput" in scenarios:
+        results["throughput"] = await scenario_throughput(args, proxy_port, proxy_pid)
+    if "ping_flood" in scenarios:
+        results["ping_flood"] = await scenario_ping_flood(args, proxy_port, proxy_pid, dials)
+    if "idle" in scenarios:
+        results["idle"] = await scenario_idle(args, proxy_port, proxy_pid, dials)
+    _, results["proxy_rss_kb"] = process_usage(proxy_pid)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DragonAegis load generator and latency benchmark")
+    parser.add_argument("--scenarios", type=str, default="sessions,throughput,ping_flood,idle", help="Comma-separated scenarios to run")
+    parser.add_argument("--sessions", type=int, default=200, help="Login sessions in the sessions scenario")
+    parser.add_argument("--packets", type=int, default=50, help="Ping-pong play packets per session")
+    parser.add_argument("--payload", type=int, default=32, help="Payload bytes per play packet")
+    parser.add_argument("--burst", type=int, default=5000, help="Pipelined packets per connection in the throughput scenario")
+    parser.add_argument("--pings", type=int, default=2000, help="Status pings in the ping flood")
+    parser.add_argument("--idle", type=int, default=500, help="Connect-and-idle bots")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent client connections")
+    parser.add_argument("--handshake-timeout", type=float, default=2.0, help="Proxy handshake deadline")
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this file")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline JSON to compare against")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("fork")
+    dials = ctx.Value("l", 0)
+    ready = ctx.Queue()
+    backend = ctx.Process(target=run_backend, args=(ready, dials), daemon=True)
+    backend.start()
+    backend_port = ready.get(timeout=10)
+    proxy = ctx.Process(target=run_proxy, args=(ready, backend_port, args.handshake_timeout), daemon=True)
+    proxy.start()
+    proxy_port = ready.get(timeout=10)
+
+    try:
+        results = asyncio.run(run_scenarios(args, proxy_port, backend_port, proxy.pid, dials))
+    finally:
+        proxy.terminate()
+        backend.terminate()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare}:")
+        compare(results, baseline.get("results", {}))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ratelimit.limiter import create_limiter
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class LegacyLimiter:
+    # The per-IP timestamp list implementation DragonAegis used before.
+    def __init__(self, limit, interval):
+        self.limit = limit
+        self.interval = interval
+        self.entries = {}
+
+    def allow(self, ip):
+        now = time.time()
+        entries = [t for t in self.entries.get(ip, ()) if now - t < self.interval]
+        self.entries[ip] = entries
+        if len(entries) >= self.limit:
+            return False
+        entries.append(now)
+        return True
+
+
+def make_ips(count):
+    return [f"{(i >> 24) & 255}.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" for i in range(count)]
+
+
+def run_mode(mode, distinct_ips, hot_checks, limit):
+    ips = make_ips(distinct_ips)
+    base_rss = rss_mb()
+
+    if mode == "legacy":
+        limiter = LegacyLimiter(limit, 1)
+    else:
+        limiter = create_limiter(mode, limit, 1, max_keys=distinct_ips * 2)
+
+    allow = limiter.allow
+    start = time.perf_counter()
+    for ip in ips:
+        allow(ip)
+    spread_elapsed = time.perf_counter() - start
+    spread_rss = rss_mb() - base_rss
+
+    # Hot path: one IP hammered well past its limit, like a packet flood.
+    hot_ip = ips[0]
+    start = time.perf_counter()
+    for _ in range(hot_checks):
+        allow(hot_ip)
+    hot_elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "distinct_ips": distinct_ips,
+        "distinct_checks_per_sec": round(distinct_ips / spread_elapsed),
+        "hot_checks_per_sec": round(hot_checks / hot_elapsed),
+        "rss_mb": round(spread_rss, 1),
+        "bytes_per_ip": round(spread_rss * 1024 * 1024 / distinct_ips),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DragonAegis rate limiter microbenchmark")
+    parser.add_argument("--ips", type=int, default=1_000_000, help="Distinct source IPs to track")
+    parser.add_argument("--hot-checks", type=int, default=200_000, help="Checks against a single flooding IP")
+    parser.add_argument("--limit", type=int, default=100, help="Limit per interval (max_packets)")
+    parser.add_argument("--mode", type=str, default=None, help="Run one mode in-process")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.ips, args.hot_checks, args.limit)))
+        return
+
+    # Each mode runs in its own interpreter so RSS numbers don't bleed into each other.
+    for mode in ("legacy", "sliding_window", "token_bucket"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--ips", str(args.ips),
+             "--hot-checks", str(args.hot_checks), "--limit", str(args.limit)],
+            capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout)
+        print(f"{result['mode']:>15}: {result['distinct_checks_per_sec']:>10} new-ip checks/s  "
+              f"{result['hot_checks_per_sec']:>10} hot checks/s  "
+              f"{result['rss_mb']:>8} MB RSS ({result['bytes_per_ip']} B/ip)")
+
+
+if __name__ == "__main__":
+    main()
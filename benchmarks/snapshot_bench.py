@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dragonaegis import DragonAegis
+from src.database.MemoryManager import MemoryManager
+from src.snapshot.format import Snapshot, write_snapshot
+from src.snapshot.state import capture_state, restore_state, write_forked
+
+
+def make_aegis(keys):
+    return DragonAegis(MemoryManager(), max_packets=100, packet_interval=1, conn_interval=60,
+                       max_tracked_ips=keys * 4, attack_detector=None)
+
+
+def populate(aegis, ips, now):
+    started = time.perf_counter()
+    for ip in ips:
+        aegis.packets.allow(ip, now)
+    for ip in ips[:len(ips) // 4]:
+        aegis.connections.allow(ip, now)
+    for i, ip in enumerate(ips[:1000]):
+        aegis.block_ip(ip if i % 2 else f"{ip}/24")
+        aegis.heavy_hitters.record_connection(ip, ip)
+    return time.perf_counter() - started
+
+
+async def loop_lag(save):
+    """Run ``save()`` next to a 1 ms ticker; returns (seconds, worst lag, p99 lag, ticks)."""
+    lags = []
+    done = False
+
+    async def ticker():
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            lags.append(now - last - 0.001)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    lags.clear()
+    started = time.perf_counter()
+    await save()
+    elapsed = time.perf_counter() - started
+    done = True
+    await task
+    lags.sort()
+    return elapsed, lags[-1], lags[int(len(lags) * 0.99)], len(lags)
+
+
+async def compare_saves(aegis, path):
+    async def executor():
+        build, meta = capture_state(aegis)
+        await asyncio.get_running_loop().run_in_executor(None, lambda: write_snapshot(path, build(), meta))
+
+    async def forked():
+        await write_forked(aegis, path)
+
+    for name, save in (("executor", executor), ("fork", forked)):
+        elapsed, worst, p99, ticks = await loop_lag(save)
+        print(f"save via {name:<9} {elapsed * 1000:8.1f} ms, loop lag max {worst * 1000:6.1f} ms, "
+              f"p99 {p99 * 1000:6.1f} ms, {ticks} of ~{int(elapsed * 1000)} 1 ms ticks")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot write and restore times for large limiter tables")
+    parser.add_argument("--keys", type=int, default=1_000_000, help="Distinct IPs tracked by the packet limiter")
+    parser.add_argument("--lookups", type=int, default=200_000, help="Limiter checks timed after the restore")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    ips = [f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(args.keys)]
+    now = time.monotonic()
+    aegis = make_aegis(args.keys)
+    elapsed = populate(aegis, ips, now)
+    print(f"populated {len(aegis.packets):,} packet keys, {len(aegis.connections):,} connection keys in {elapsed:.1f}s")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "bench.snapshot")
+        started = time.perf_counter()
+        build, meta = capture_state(aegis, now)
+        captured = time.perf_counter()
+        size = write_snapshot(path, build(), meta)
+        written = time.perf_counter()
+        print(f"capture (on the event loop): {(captured - started) * 1000:8.1f} ms")
+        print(f"build + write (executor):    {(written - captured) * 1000:8.1f} ms, {size / 2 ** 20:.1f} MiB")
+
+        if hasattr(os, "fork"):
+            # Its own file: path is what the restore below is checked against.
+            asyncio.run(compare_saves(aegis, os.path.join(workdir, "compare.snapshot")))
+
+        # Restore on a clock moved on by the snapshot's real age, so both
+        # sides can be compared at the same instant.
+        restored = make_aegis(args.keys)
+        later = now + (time.time() - meta["wall"])
+        started = time.perf_counter()
+        counts = restore_state(restored, Snapshot(path), later)
+        elapsed = time.perf_counter() - started
+        print(f"restore via mmap:            {elapsed * 1000:8.1f} ms, {sum(counts.values()):,} entries")
+
+        # What loading into dicts would cost instead of mapping.
+        started = time.perf_counter()
+        table = Snapshot(path).section("packets")
+        eager = dict(zip(table.keys(), table.columns["state"].tolist()))
+        print(f"eager dict load (for scale): {(time.perf_counter() - started) * 1000:8.1f} ms, {len(eager):,} keys")
+
+        sample = rng.sample(ips, min(1000, len(ips)))
+        mismatched = sum(aegis.packets.peek(ip, later) != restored.packets.peek(ip, later) for ip in sample)
+        print(f"restored limiter mismatches: {mismatched} of {len(sample)}")
+
+        # First touches after a restore hit the mapped generation; later ones
+        # are plain dict hits again.
+        lookups = [ips[i % len(ips)] for i in range(args.lookups)]
+        started = time.perf_counter()
+        for ip in lookups:
+            restored.packets.allow(ip, later)
+        mapped = time.perf_counter() - started
+        started = time.perf_counter()
+        for ip in lookups:
+            restored.packets.allow(ip, later)
+        warm = time.perf_counter() - started
+        print(f"allow() first touch (mapped): {mapped / len(lookups) * 1e6:6.2f} us")
+        print(f"allow() after (dict):         {warm / len(lookups) * 1e6:6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
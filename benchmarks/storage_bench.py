@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.DatabaseManager import DatabaseManager
+from src.database.MemoryManager import MemoryManager
+from src.database.SQLiteManager import SQLiteManager
+
+
+def make_backend(name, args, workdir):
+    # Flushes are driven by hand so every run measures the same batches.
+    options = {"flush_interval": 3600, "batch_size": 10 ** 9, "max_queue": 10 ** 7}
+    if name == "memory":
+        return MemoryManager(**options)
+    if name == "sqlite":
+        return SQLiteManager(os.path.join(workdir, "bench.db"), **options)
+    if name == "mysql":
+        return DatabaseManager(
+            host=args.mysql_host, port=args.mysql_port, user=args.mysql_user,
+            password=args.mysql_password, db=args.mysql_db, refresh_tables=True, **options
+        )
+    raise ValueError(f"Unknown backend: {name}")
+
+
+async def conformance(db):
+    """The behaviour every backend has to share; raises AssertionError on a mismatch."""
+    await db.log_server("10.0.0.1", 25565)
+    server_id = await db.get_server_id("10.0.0.1", 25565)
+    assert server_id is not None, "registered server has no id"
+    assert await db.get_server_id("10.0.0.1", 1) is None, "unknown server should have no id"
+
+    await db.log_server("10.0.0.2", 25565, hostname="play.example.com", weight=3, max_connections=5)
+    routed = [row for row in await db.list_servers() if row["ip"] == "10.0.0.2"]
+    assert len(routed) == 1 and routed[0]["hostname"] == "play.example.com", "route not listed"
+    assert (routed[0]["weight"], routed[0]["max_connections"], routed[0]["max_packets"]) == (3, 5, None), "route columns"
+    assert await db.delete_server(routed[0]["id"]), "route not deleted"
+    assert all(row["ip"] != "10.0.0.2" for row in await db.list_servers()), "deleted route still listed"
+
+    await db.block_ip("1.1.1.1", server_id)
+    await db.block_ip("2.2.2.0/24", server_id)
+    await db.flush()
+    assert sorted(await db.list_blocked(server_id)) == ["1.1.1.1", "2.2.2.0/24"], "blocks not listed"
+    assert await db.list_blocked(server_id + 1000) == [], "blocks leaked to another server"
+
+    await db.unblock_ip("1.1.1.1", server_id)
+    await db.block_ip("3.3.3.3", server_id)
+    await db.unblock_ip("3.3.3.3", server_id)  # still queued, must never be written
+    await db.flush()
+    assert await db.list_blocked(server_id) == ["2.2.2.0/24"], "unblock did not stick"
+
+    for _ in range(3):
+        await db.log_connection("5.5.5.5", server_id)
+    for _ in range(4):
+        await db.log_packet("5.5.5.5", server_id)
+    await db.log_packet("6.6.6.6", server_id)
+    await db.increment_handshakes("10.0.0.1", 25565)
+    await db.flush()
+    assert await db.get_connection_count(("10.0.0.1", 25565)) == 3, "connection count"
+    assert await db.get_packet_count("5.5.5.5", server_id) == 4, "packet count"
+    assert await db.get_packet_count("5.5.5.5", server_id, since=time.time() + 120) == 0, "since filter"
+
+    removed = await db.cleanup_old_entries()
+    assert isinstance(removed, dict), "cleanup should report what it removed"
+    assert await db.get_packet_count("5.5.5.5", server_id) == 4, "cleanup removed fresh rollups"
+    return server_id
+
+
+async def measure(fn, count):
+    started = time.perf_counter()
+    await fn(count)
+    return count / (time.perf_counter() - started)
+
+
+async def bench(db, server_id, ops):
+    async def blocks(count):
+        for i in range(count):
+            await db.block_ip(f"172.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", server_id)
+        await db.flush()
+
+    async def events(count):
+        for i in range(count):
+            await db.log_packet(f"192.168.{i >> 8 & 255}.{i & 255}", server_id)
+        await db.flush()
+
+    async def list_blocked(count):
+        for _ in range(count):
+            await db.list_blocked(server_id)
+
+    async def server_lookups(count):
+        for _ in range(count):
+            await db.get_server_id("10.0.0.1", 25565)
+
+    async def packet_counts(count):
+        for i in range(count):
+            await db.get_packet_count(f"192.168.0.{i & 255}", server_id)
+
+    return {
+        "block writes/s": await measure(blocks, ops),
+        "event writes/s": await measure(events, ops * 10),
+        "server lookups/s": await measure(server_lookups, ops),
+        "count queries/s": await measure(packet_counts, ops),
+        "list_blocked/s": await measure(list_blocked, max(1, ops // 100)),
+    }
+
+
+async def run(name, args):
+    with tempfile.TemporaryDirectory() as workdir:
+        db = make_backend(name, args, workdir)
+        await db.initialize()
+        try:
+            server_id = await conformance(db)
+            print(f"{name}: conformance ok")
+            return await bench(db, server_id, args.ops)
+        finally:
+            await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage backend conformance checks and operations/sec")
+    parser.add_argument("--backends", type=str, default="memory,sqlite", help="Comma separated: memory, sqlite, mysql")
+    parser.add_argument("--ops", type=int, default=5000, help="Operations per measurement (event writes use 10x)")
+    parser.add_argument("--mysql-host", type=str, default="localhost")
+    parser.add_argument("--mysql-port", type=int, default=3306)
+    parser.add_argument("--mysql-user", type=str, default="root")
+    parser.add_argument("--mysql-password", type=str, default="")
+    parser.add_argument("--mysql-db", type=str, default="dragon_bench")
+    args = parser.parse_args()
+
+    results = {name: asyncio.run(run(name, args)) for name in args.backends.split(",")}
+    names = list(results)
+    print(f"\n{'operation':<18}" + "".join(f"{name:>14}" for name in names))
+    for operation in next(iter(results.values())):
+        print(f"{operation:<18}" + "".join(f"{results[name][operation]:>14,.0f}" for name in names))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.timers.wheel import TimerWheel
+
+
+async def bench_call_later(connections, rearms):
+    # What a wait_for per read costs: one loop timer per connection, cancelled
+    # and replaced every time the connection makes progress.
+    loop = asyncio.get_running_loop()
+    handles = [loop.call_later(300, lambda: None) for _ in range(connections)]
+    started = time.perf_counter()
+    for i in range(rearms):
+        index = i % connections
+        handles[index].cancel()
+        handles[index] = loop.call_later(300, lambda: None)
+    elapsed = time.perf_counter() - started
+    tick = await loop_tick_cost()
+    for handle in handles:
+        handle.cancel()
+    return elapsed, tick
+
+
+async def bench_wheel(connections, rearms):
+    wheel = TimerWheel()
+    timers = [wheel.schedule(300, lambda: None) for _ in range(connections)]
+    started = time.perf_counter()
+    for i in range(rearms):
+        index = i % connections
+        wheel.cancel(timers[index])
+        timers[index] = wheel.schedule(300, lambda: None)
+    elapsed = time.perf_counter() - started
+    tick = await loop_tick_cost()
+    for timer in timers:
+        wheel.cancel(timer)
+    return elapsed, tick
+
+
+async def loop_tick_cost(rounds=2000):
+    """Average wall time of one otherwise empty event loop iteration."""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.sleep(0)
+    return (time.perf_counter() - started) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-connection deadline cost: loop timers vs timer wheel")
+    parser.add_argument("--rearms", type=int, default=200_000, help="Deadline resets measured per run")
+    parser.add_argument("--sizes", type=str, default="1000,10000,100000", help="Concurrent connection counts")
+    args = parser.parse_args()
+
+    print(f"{'connections':>12} {'impl':>11} {'ns/rearm':>10} {'loop iter us':>13}")
+    for connections in (int(size) for size in args.sizes.split(",")):
+        for name, bench in (("call_later", bench_call_later), ("wheel", bench_wheel)):
+            elapsed, tick = asyncio.run(bench(connections, args.rearms))
+            print(f"{connections:>12} {name:>11} {elapsed / args.rearms * 1e9:>10.0f} {tick * 1e6:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,188 +1,919 @@
 import asyncio
+import os
 import time
 import argparse
+import re
 
 from collections import defaultdict
 from colorama import Fore, Back, Style, init
 from src.terminal.terminal import Terminal
 from src.database.DatabaseManager import DatabaseManager
-from src.web import http
+from src.database.MemoryManager import MemoryManager
+from src.database.SQLiteManager import SQLiteManager
+from src.database.StorageBackend import StorageBackend
+from src.web.http import AdminServer
+from src.ratelimit.attack import AttackDetector
+from src.ratelimit.limiter import create_limiter
+from src.ratelimit.subnet import SubnetLimiter, parse_prefix_limits
+from src.protocol.budget import ByteBudget
+from src.protocol.decoder import FrameCounter, FrameDecoder, FrameError, read_varint
+from src.protocol.encoder import encode_frame
+from src.protocol.login import LoginWatcher
+from src.protocol.status import StatusCache
+from src.routing.router import BALANCE_MODES, Router
+from src.snapshot.format import Snapshot, SnapshotError, write_snapshot
+from src.snapshot.state import capture_state, restore_state, write_forked
+from src.stats.heavy_hitters import HeavyHitters, subnet_of
+from src.stats.profiler import PacketScanner, Profiler, compressed_packet_id
+from src.timers.wheel import TimerWheel
+from src.blocklist.index import BlocklistIndex
+from src.workers.supervisor import EVENT_BAN, EVENT_BLOCK, EVENT_UNBLOCK, SharedState, run_workers
+
+VALID_USERNAME = re.compile(r"[A-Za-z0-9_]{1,16}")
+# Handshake next states: status, login and (1.20.5+) transfer.
+NEXT_STATES = (1, 2, 3)
+
+# Largest frame a client may send in each state. Handshake, status and Login
+# Start are a few hundred bytes at most; vanilla serverbound play packets stay
+# under 32 KiB, so play leaves generous room for modded plugin messages.
+DEFAULT_MAX_FRAME_SIZES = {"handshake": 1024, "status": 1024, "login": 4096, "play": 262144}
+
+# close_client reasons that point at a broken or hostile client. Only these
+# count toward the attack detector's failure ratio; blocks, rate limits and
+# routing or backend trouble say nothing about the handshake itself.
+HANDSHAKE_FAILURES = frozenset({
+    "early_close", "packet_spam", "invalid_packet", "buffer_limit",
+    "handshake_timeout", "status_timeout", "login_timeout",
+})
 
 class DragonAegis:
-    def __init__(self, db_manager: DatabaseManager, log_packets=False, max_connections=5, conn_interval=60, max_packets=100, packet_interval=1):
+    def __init__(self, db_manager: StorageBackend, log_packets=False, max_connections=5, conn_interval=60, max_packets=100, packet_interval=1,
+                 limiter_mode="sliding_window", max_tracked_ips=1_000_000, blocklist_refresh_interval=30,
+                 subnet_limits_v4=None, subnet_limits_v6=None, ban_threshold=10, ban_duration=300, min_ban_prefix=None,
+                 shared_state: SharedState = None, shared_sync_interval=0.1, status_cache: StatusCache = None,
+                 attack_detector: AttackDetector = None, router: Router = None, profile=False,
+                 handshake_timeout=5.0, login_timeout=10.0, idle_timeout=300.0, read_size=65536, write_high_water=262144, write_low_water=65536,
+                 max_frame_sizes=None, buffer_budget=64 * 1024 * 1024, connection_buffer_limit=512 * 1024,
+                 opaque_packet_bytes=256):
         self.max_connections = max_connections
         self.conn_interval = conn_interval
         self.max_packets = max_packets
         self.packet_interval = packet_interval
-        self.connections = defaultdict(list)
-        self.packets = defaultdict(list)
+        if subnet_limits_v4 is None:
+            subnet_limits_v4 = {24: max_connections * 4, 16: max_connections * 20}
+        if subnet_limits_v6 is None:
+            subnet_limits_v6 = {64: max_connections * 2, 48: max_connections * 20}
+        # With workers, connection limits and bans live in shared memory so
+        # every process sees the same counts; packet limits stay per process.
+        self.shared_state = shared_state
+        self.shared_sync_interval = shared_sync_interval
+        self.shared_sync = None
+        self._event_cursor = 0
+        self.connections = SubnetLimiter(
+            conn_interval,
+            v4_limits={32: max_connections, **subnet_limits_v4},
+            v6_limits={128: max_connections, **subnet_limits_v6},
+            mode=limiter_mode,
+            max_keys=max_tracked_ips,
+            ban_threshold=ban_threshold,
+            ban_duration=ban_duration,
+            min_ban_prefix=min_ban_prefix,
+            limiter_factory=shared_state.counters.limiter_factory if shared_state else None,
+            on_ban=self._publish_ban if shared_state else None
+        )
+        self.packets = create_limiter(limiter_mode, max_packets, packet_interval, max_keys=max_tracked_ips)
         
         self.allowed_connection = True
         
-        self.blocked_ips = set()
+        self.blocked_ips = BlocklistIndex()
+        self.blocklist_refresh_interval = blocklist_refresh_interval
+        self.server_id = None
+        self.blocklist_sync = None
+        # Local changes the write-behind queue may not have persisted yet,
+        # kept so a refresh from the database doesn't undo them.
+        self._unsynced_blocks = set()
+        self._unsynced_unblocks = set()
+        self._background = set()
         
         self.db_manager = db_manager
         self.cleanup = None
         self.log_packets = log_packets
         
         self.active_connections = defaultdict(int)
+        self.active_total = 0
+        # Decaying top talkers for /top; the database is never asked.
+        self.heavy_hitters = HeavyHitters()
         
         self.server_selected = None
 
+        self.status_cache = status_cache
+        # With a router, clients go to the backend their handshake's server
+        # address routes to, and that backend's status cache, limits and
+        # allow switch apply; otherwise everything goes to the one target.
+        self.router = router
+        # Optional; while it reports an attack, admission is reduced to
+        # known-good IPs plus a small trickle with halved deadlines.
+        self.attack_detector = attack_detector
+
+        # Clients must send a handshake and a valid Login Start within these
+        # deadlines before a backend connection is opened for them. A status
+        # exchange gets the login deadline in total; in play the client may
+        # go idle_timeout seconds without sending anything. All deadlines run
+        # on one timer wheel rather than a wait_for per connection.
+        self.handshake_timeout = handshake_timeout
+        self.login_timeout = login_timeout
+        self.idle_timeout = idle_timeout
+        self.timers = TimerWheel()
+        # Forwarding reads up to read_size bytes at a time and only waits on a
+        # destination once its transport buffer is past write_high_water;
+        # asyncio resumes it below write_low_water.
+        if not 0 <= write_low_water <= write_high_water:
+            raise ValueError("write_low_water must be between 0 and write_high_water")
+        self.read_size = read_size
+        self.write_high_water = write_high_water
+        self.write_low_water = write_low_water
+        # Undecoded client bytes are capped per frame by state, per connection,
+        # and across the process; see ByteBudget for who is shed first.
+        self.max_frame_sizes = {**DEFAULT_MAX_FRAME_SIZES, **(max_frame_sizes or {})}
+        # Once client bytes can't be walked as frames (encryption is on, or
+        # a length prefix made no sense) each read is charged as one packet
+        # plus one per opaque_packet_bytes.
+        self.opaque_packet_bytes = opaque_packet_bytes
+        self.buffers = ByteBudget(buffer_budget, connection_buffer_limit)
+        self.metrics = defaultdict(int)
+        self.packets_per_second = 0.0
+        self.loop_lag = 0.0
+        self.monitor = None
+
+        # Limiter, ban, blocklist and top-talker state is written here every
+        # snapshot_interval seconds and on shutdown, and read back on start.
+        self.snapshot_path = None
+        self.snapshot_interval = None
+        self.snapshots = None
+        self.last_snapshot = None
+
+        # Per-packet counts and stage timings; None unless profiling is on.
+        self.profiler = None
+        self.set_profiling(profile)
+
 
     async def cleanup_task(self) -> None:
         self.cleanup = asyncio.create_task(self._periodic_cleanup())
         
     async def _periodic_cleanup(self) -> None:
-         while True:
-            await self.db_manager.cleanup_old_entries()
+        # Partitions are hourly, so this also keeps the next ones created.
+        while True:
+            try:
+                await self.db_manager.cleanup_old_entries()
+            except Exception as e:
+                print(f"Database cleanup failed: {e}")
             await asyncio.sleep(3600)
 
-    def is_allowed_connection(self, ip):
-        now = time.time()
-        self.connections[ip] = [t for t in self.connections[ip] if now - t < self.conn_interval]
-        if len(self.connections[ip]) >= self.max_connections:
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def start_blocklist_sync(self, server_id) -> None:
+        self.server_id = server_id
+        await self.refresh_blocklist()
+        self.blocklist_sync = asyncio.create_task(self._periodic_blocklist_sync())
+
+    async def _periodic_blocklist_sync(self) -> None:
+        while True:
+            await asyncio.sleep(self.blocklist_refresh_interval)
+            try:
+                await self.refresh_blocklist()
+            except Exception as e:
+                print(f"Blocklist refresh failed: {e}")
+
+    async def refresh_blocklist(self):
+        stored = self.blocked_ips.normalize_all(await self.db_manager.list_blocked(self.server_id))
+        self._unsynced_blocks -= stored
+        self._unsynced_unblocks &= stored
+        added, removed = self.blocked_ips.sync(stored - self._unsynced_unblocks, keep=self._unsynced_blocks)
+        if added or removed:
+            print(f"Blocklist synced: +{len(added)} -{len(removed)} ({len(self.blocked_ips)} entries)")
+
+    def _apply_block(self, entry):
+        entry = self.blocked_ips.add(entry)
+        self._unsynced_unblocks.discard(entry)
+        if self.server_id is not None:
+            self._unsynced_blocks.add(entry)
+        return entry
+
+    def _apply_unblock(self, entry):
+        entry = BlocklistIndex.normalize(entry)
+        self.blocked_ips.remove(entry)
+        self.connections.lift_ban(entry)
+        self._unsynced_blocks.discard(entry)
+        if self.server_id is not None:
+            self._unsynced_unblocks.add(entry)
+        return entry
+
+    def block_ip(self, entry):
+        entry = self._apply_block(entry)
+        if self.server_id is not None:
+            self._spawn(self.db_manager.block_ip(entry, self.server_id))
+        if self.shared_state is not None:
+            self.shared_state.events.publish(EVENT_BLOCK, entry)
+        return entry
+
+    def unblock_ip(self, entry):
+        entry = self._apply_unblock(entry)
+        if self.server_id is not None:
+            self._spawn(self.db_manager.unblock_ip(entry, self.server_id))
+        if self.shared_state is not None:
+            self.shared_state.events.publish(EVENT_UNBLOCK, entry)
+        return entry
+
+    def _publish_ban(self, network, expires):
+        self.shared_state.events.publish(EVENT_BAN, network, expires)
+
+    async def start_shared_sync(self) -> None:
+        # Replay what is still in the ring so a restarted worker catches up.
+        events = self.shared_state.events
+        self._event_cursor = max(0, events.sequence - events.capacity)
+        self.apply_shared_events()
+        self.shared_sync = asyncio.create_task(self._periodic_shared_sync())
+
+    async def _periodic_shared_sync(self) -> None:
+        while True:
+            await asyncio.sleep(self.shared_sync_interval)
+            try:
+                self.apply_shared_events()
+            except Exception as e:
+                print(f"Shared state sync failed: {e}")
+
+    def apply_shared_events(self):
+        events, self._event_cursor, overrun = self.shared_state.events.read(self._event_cursor)
+        for kind, entry, expires in events:
+            if kind == EVENT_BLOCK:
+                self._apply_block(entry)
+            elif kind == EVENT_UNBLOCK:
+                self._apply_unblock(entry)
+            elif kind == EVENT_BAN:
+                self.connections.ban(entry, expires)
+        if overrun and self.server_id is not None:
+            self._spawn(self.refresh_blocklist())
+
+    def list_blocked(self):
+        return list(self.blocked_ips)
+
+    async def start_monitor(self, interval=1.0) -> None:
+        self.monitor = asyncio.create_task(self._periodic_monitor(interval))
+
+    async def _periodic_monitor(self, interval) -> None:
+        # Event-loop lag is how late this task wakes up; packet rate is the
+        # counter delta over the same tick.
+        last = time.monotonic()
+        last_packets = self.metrics["packets"]
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self.loop_lag = max(0.0, now - last - interval)
+            packets = self.metrics["packets"]
+            self.packets_per_second = (packets - last_packets) / (now - last)
+            last, last_packets = now, packets
+            if self.attack_detector is not None and self.attack_detector.evaluate(now):
+                self.metrics["attack_mode_transitions"] += 1
+
+    async def start_snapshots(self, path, interval=30.0) -> None:
+        self.snapshot_path = path
+        self.snapshot_interval = interval
+        self.snapshots = asyncio.create_task(self._periodic_snapshot())
+
+    async def _periodic_snapshot(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            await self.save_snapshot()
+
+    async def stop_snapshots(self) -> None:
+        if self.snapshots is not None:
+            self.snapshots.cancel()
+            self.snapshots = None
+            await self.save_snapshot()
+
+    async def save_snapshot(self) -> None:
+        # A forked child captures, encodes and writes, so the loop only pays
+        # for the fork. Without fork() the tables are copied on the loop and
+        # encoded on the executor, which still competes with the loop for the GIL.
+        started = time.perf_counter()
+        try:
+            if hasattr(os, "fork"):
+                size, meta, paused = await write_forked(self, self.snapshot_path)
+                captured = started + paused
+            else:
+                build, meta = capture_state(self)
+                captured = time.perf_counter()
+                size = await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: write_snapshot(self.snapshot_path, build(), meta)
+                )
+        except Exception as e:
+            self.metrics["snapshot_failures"] += 1
+            print(f"Snapshot failed: {e}")
+            return
+        self.metrics["snapshots_written"] += 1
+        self.last_snapshot = {
+            "path": self.snapshot_path,
+            "bytes": size,
+            "loop_seconds": captured - started,
+            "total_seconds": time.perf_counter() - started,
+            "time": meta["wall"],
+        }
+
+    def load_snapshot(self, path) -> None:
+        started = time.perf_counter()
+        try:
+            restored = restore_state(self, Snapshot(path))
+        except (OSError, KeyError, SnapshotError) as e:
+            print(f"Ignoring snapshot {path}: {e}")
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"Restored {sum(restored.values())} entries from {path} in {elapsed:.1f}ms")
+
+    def is_allowed_connection(self, ip, host=True):
+        # With host=False only the subnet levels are charged; the address's
+        # own limit is left to is_allowed_host once the client is routed.
+        if not self.connections.allow(ip, host=host):
             return False
-        self.connections[ip].append(now)
         self.active_connections[ip] += 1
+        self.active_total += 1
+        self.metrics["accepted"] += 1
         return True
 
-    def is_allowed_packet(self, ip):
-        now = time.time()
-        self.packets[ip] = [t for t in self.packets[ip] if now - t < self.packet_interval]
-        if len(self.packets[ip]) >= self.max_packets:
-            return False
-        self.packets[ip].append(now)
-        return True
+    def is_allowed_host(self, ip, limiter=None):
+        # A backend's own max_connections replaces the global per-IP limit.
+        if limiter is not None:
+            return limiter.allow(ip)
+        return self.connections.allow_host(ip)
+
+    def release_connection(self, ip):
+        self.active_total -= 1
+        remaining = self.active_connections.get(ip, 0) - 1
+        if remaining > 0:
+            self.active_connections[ip] = remaining
+        else:
+            self.active_connections.pop(ip, None)
+
+    def is_allowed_packet(self, ip, count=1, limiter=None):
+        self.metrics["packets"] += count
+        return (limiter or self.packets).allow(ip, cost=count)
+
+    def set_profiling(self, enabled):
+        """Install a fresh Profiler, or remove it. Connections already open keep the one they started with."""
+        self.profiler = Profiler() if enabled else None
+        if self.db_manager is not None:
+            self.db_manager.profiler = self.profiler
+        return self.profiler
+
+    def set_allowed_connection(self, address, allowed):
+        """Switch connections to the server at ``address`` (``ip:port``) on or off; returns how many backends matched."""
+        if self.router is None:
+            self.allowed_connection = allowed
+            return 1
+        host, _, port = address.rpartition(":")
+        backends = self.router.find(host, int(port))
+        for backend in backends:
+            backend.allowed = allowed
+        return len(backends)
 
     async def handle_client(reader, writer, backend_host, backend_port, rate_limiter):
         transport = writer.transport
+        transport.set_write_buffer_limits(rate_limiter.write_high_water, rate_limiter.write_low_water)
         peername = transport.get_extra_info('peername')
         client_ip = peername[0] if peername else 'unknown'
 
         client_state = "handshake"
-        buffer = bytearray()
         username = None
+        metrics = rate_limiter.metrics
+        buffers = rate_limiter.buffers
+        max_frame_sizes = rate_limiter.max_frame_sizes
+        client_decoder = FrameDecoder(max_frame_size=max_frame_sizes["handshake"], initial_size=4096)
+        # Once in play with nothing to inspect, only frame prefixes are walked
+        # for rate limiting and each read is forwarded with a single write.
+        passthrough = False
+        handshake_timeout = rate_limiter.handshake_timeout
+        login_timeout = rate_limiter.login_timeout
+
+        client_subnet = subnet_of(client_ip)
+        heavy_hitters = rate_limiter.heavy_hitters
+        # Everything profiled hangs off this check, so it costs nothing when off.
+        profiler = rate_limiter.profiler
+        heavy_hitters.record_connection(client_ip, client_subnet)
+
+        attack = rate_limiter.attack_detector
+        if attack is not None:
+            attack.record_connection(client_ip)
+            if attack.active:
+                if not attack.admit(client_ip):
+                    metrics["rejected_attack_mode"] += 1
+                    transport.abort()
+                    return
+                if client_ip not in attack.good_ips:
+                    handshake_timeout /= 2
+                    login_timeout /= 2
+
+        if client_ip in rate_limiter.blocked_ips:
+            print(f"Blocked connection from {client_ip}: IP is blocked.")
+            metrics["rejected_blocked"] += 1
+            writer.close()
+            await writer.wait_closed()
+            return
 
-        if not rate_limiter.is_allowed_connection(client_ip):
+        router = rate_limiter.router
+        # With a router the per-IP limit depends on the backend, so only the
+        # subnet levels are checked here.
+        if not rate_limiter.is_allowed_connection(client_ip, host=router is None):
             print(f"Blocked connection from {client_ip}: too many connections.")
+            metrics["rejected_too_many_connections"] += 1
             writer.close()
             await writer.wait_closed()
             return
         
-        if rate_limiter.server_selected is not None:     
+        if router is None and rate_limiter.server_selected is not None:
             if not rate_limiter.allowed_connection:
                 print(f"Blocked connection from {client_ip}: connections to server are disabled.")
-                writer.close();
-            
-        try:
-            backend_reader, backend_writer = await asyncio.open_connection(backend_host, backend_port)
-        except Exception as e:
-            print(f"Backend connection failed: {e}")
-            writer.close()
-            await writer.wait_closed()
-            return
+                metrics["rejected_connections_disabled"] += 1
+                rate_limiter.release_connection(client_ip)
+                writer.close()
+                await writer.wait_closed()
+                return
+
+        # Set once the handshake is routed; the backend is charged from then on.
+        backend = None
+        pool = None
+        packet_limiter = None
+        status_cache = rate_limiter.status_cache
+
+        buffer_token = buffers.register(transport.abort)
+        timers = rate_limiter.timers
+        deadline = None
+        last_activity = timers.now
 
-        def parse_varint(data):
-            value = 0
-            length = 0
-            for i in range(min(len(data), 5)):
-                byte = data[i]
-                value |= (byte & 0x7F) << (7 * i)
-                length += 1
-                if (byte & 0x80) == 0:
-                    break
-            return value, length
+        def expire():
+            nonlocal deadline
+            deadline = None
+            if client_state == "play":
+                remaining = rate_limiter.idle_timeout - timers.elapsed(last_activity)
+                if remaining > 0:
+                    deadline = timers.schedule(remaining, expire)
+                    return
+            # Wakes whatever read is pending (or the next one) with a timeout.
+            reader.set_exception(asyncio.TimeoutError())
+
+        def arm(seconds):
+            nonlocal deadline
+            if deadline is not None:
+                timers.cancel(deadline)
+            deadline = timers.schedule(seconds, expire)
+
+        def enter_state(state):
+            nonlocal client_state
+            client_state = state
+            client_decoder.max_frame_size = max_frame_sizes[state]
+            buffers.set_stage(buffer_token, state)
+
+        def account_buffer():
+            # The budget may abort this connection (or others) to stay in bounds.
+            if not buffers.update(buffer_token, len(client_decoder)):
+                raise BufferError(f"{len(client_decoder)} buffered bytes over budget")
+
+        def release():
+            if deadline is not None:
+                timers.cancel(deadline)
+            if backend is not None:
+                backend.active -= 1
+            buffers.release(buffer_token)
+            rate_limiter.release_connection(client_ip)
 
         def parse_handshake(payload):
-            offset = 0
-            if len(payload) < offset + 1:
-                raise ValueError("Incomplete handshake packet")
-            
-            proto_version,proto_bytes = parse_varint(payload[offset:])
-            offset += proto_bytes
-            if len(payload) < offset + 1:
+            proto_version, offset = read_varint(payload)
+            if proto_version is None or len(payload) < offset + 1:
                 raise ValueError("Incomplete handshake packet")
             addr_length = payload[offset]
             offset += 1
             if len(payload) < offset + addr_length:
                 raise ValueError("Incomplete handshake packet")
-            server_addr = payload[offset:offset+addr_length].decode('utf-8')
+            server_addr = str(payload[offset:offset+addr_length], 'utf-8')
             offset += addr_length
             if len(payload) < offset + 2:
                 raise ValueError("Incomplete handshake packet")
-            port = int.from_bytes(payload[offset:offset+2], byteorder='big')
+            # Port is unused; the route comes from the server address.
             offset += 2
-            if len(payload) < offset + 1:
+            next_state, _ = read_varint(payload, offset)
+            if next_state is None:
                 raise ValueError("Incomplete handshake packet")
-            next_state, _ = parse_varint(payload[offset:])
-            return next_state
+            if next_state not in NEXT_STATES:
+                raise ValueError(f"Unknown next state {next_state}")
+            return next_state, server_addr
 
         def parse_login_start(payload):
-            username_length = payload[0]
-            return payload[1:1+username_length].decode('utf-8')
+            username_length, offset = read_varint(payload)
+            if username_length is None or len(payload) < offset + username_length:
+                raise ValueError("Incomplete login start packet")
+            name = str(payload[offset:offset+username_length], 'utf-8')
+            if not VALID_USERNAME.fullmatch(name):
+                raise ValueError(f"Invalid username {name!r}")
+            return name
+
+        def admit_packets(count):
+            heavy_hitters.record_packets(client_ip, client_subnet, username, count)
+            if not rate_limiter.is_allowed_packet(client_ip, count, packet_limiter):
+                print(f"Blocked {client_ip} for packet spam.")
+                return False
+            return True
+
+        if profiler is not None:
+            parse_handshake = profiler.timed("parse", parse_handshake)
+            parse_login_start = profiler.timed("parse", parse_login_start)
+            admit_packets = profiler.timed("rate_limit", admit_packets)
+
+        def reject(reason):
+            # Before or after the dial, a reason is counted the same way.
+            metrics[f"rejected_{reason}"] += 1
+            if attack is not None and reason in HANDSHAKE_FAILURES:
+                attack.record_failure()
+
+        async def close_client(reason=None):
+            # Every exit through here is a connection the backend never saw.
+            metrics["backend_dials_saved"] += 1
+            if reason:
+                reject(reason)
+            release()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                # Already reset by the client; nothing left to flush.
+                pass
+
+        async def read_frame():
+            while True:
+                frame = client_decoder.next_frame()
+                if frame is not None:
+                    if profiler is not None:
+                        profiler.count(profiler.tally("upstream", client_state), frame.packet_id, len(frame.data))
+                    return frame
+                data = await reader.read(4096)
+                if not data:
+                    return None
+                client_decoder.feed(data)
+                account_buffer()
+
+        async def serve_status():
+            # Status Request (0x00) then Ping (0x01), answered from the cache.
+            # None once the Status Request was answered, otherwise the reason
+            # the exchange failed.
+            answered = False
+            for _ in range(2):
+                try:
+                    frame = await read_frame()
+                except asyncio.TimeoutError:
+                    # Got its status and never pinged; still answered.
+                    if answered:
+                        return None
+                    raise
+                if frame is None:
+                    return None if answered else "early_close"
+                if not admit_packets(1):
+                    return "packet_spam"
+                if frame.packet_id == 0x00 and not answered:
+                    writer.write(await status_cache.get())
+                    answered = True
+                elif frame.packet_id == 0x01:
+                    writer.write(encode_frame(0x01, frame.payload))
+                    await writer.drain()
+                    return None if answered else "invalid_packet"
+                else:
+                    return "invalid_packet"
+                await writer.drain()
+            return None
+
+        # Handshake and Login Start are read and validated before dialing, so
+        # pings, idlers and garbage never cost a backend connection.
+        arm(handshake_timeout)
+        try:
+            handshake = await read_frame()
+            if handshake is None:
+                await close_client("early_close")
+                return
+            if not admit_packets(1):
+                await close_client("packet_spam")
+                return
+            if handshake.packet_id != 0x00:
+                raise ValueError(f"Expected handshake, got packet 0x{handshake.packet_id:02x}")
+            next_state, server_addr = parse_handshake(handshake.payload)
+            replay = bytes(handshake.data)
+
+            if router is not None:
+                pool = router.route(server_addr)
+                if pool is None:
+                    print(f"Dropped {client_ip}: no route for {server_addr!r}.")
+                    await close_client("unknown_host")
+                    return
+                if next_state == 1 and pool[0].status_cache is not None:
+                    # Answered from a cache, so no backend is charged; a
+                    # healthy one's cache is preferred but any will do.
+                    status_cache = next((member for member in pool if member.healthy), pool[0]).status_cache
+                else:
+                    picked = router.pick(pool)
+                    if picked is None:
+                        await close_client(router.unavailable_reason(pool))
+                        return
+                    backend = picked
+                    backend.active += 1
+                    packet_limiter = backend.packets
+                    status_cache = backend.status_cache
+                backend_limiter = backend.connections if backend is not None else None
+                if not rate_limiter.is_allowed_host(client_ip, backend_limiter):
+                    if backend_limiter is not None:
+                        print(f"Blocked connection from {client_ip}: too many connections to {backend.address}.")
+                        await close_client("backend_rate_limit")
+                    else:
+                        print(f"Blocked connection from {client_ip}: too many connections.")
+                        await close_client("too_many_connections")
+                    return
+
+            if next_state == 1:
+                if status_cache is not None:
+                    enter_state("status")
+                    arm(login_timeout)
+                    try:
+                        reason = await serve_status()
+                    except ConnectionError as e:
+                        print(f"Status request error from {client_ip}: {e}")
+                        reason = "early_close"
+                    if reason is None:
+                        metrics["status_served"] += 1
+                        if attack is not None:
+                            attack.record_success()
+                    await close_client(reason)
+                    return
+                enter_state("status")
+                arm(login_timeout)
+                passthrough = True
+            else:
+                # Login, or a transfer from another server, which logs in the same way.
+                enter_state("login")
+                arm(login_timeout)
+                login = await read_frame()
+                if login is None:
+                    await close_client("early_close")
+                    return
+                if not admit_packets(1):
+                    await close_client("packet_spam")
+                    return
+                if login.packet_id != 0x00:
+                    raise ValueError(f"Expected login start, got packet 0x{login.packet_id:02x}")
+                username = parse_login_start(login.payload)
+                heavy_hitters.record_login(username)
+                if attack is not None:
+                    attack.record_success(client_ip)
+                replay += bytes(login.data)
+                enter_state("play")
+                last_activity = timers.now
+                arm(rate_limiter.idle_timeout)
+                passthrough = not rate_limiter.log_packets
+        except asyncio.TimeoutError:
+            print(f"Dropped {client_ip}: timed out in {client_state} state.")
+            await close_client(f"{client_state}_timeout")
+            return
+        except ValueError as e:
+            print(f"Packet parsing error: {e}")
+            await close_client("invalid_packet")
+            return
+        except BufferError as e:
+            print(f"Dropped {client_ip}: {e}.")
+            await close_client("buffer_limit")
+            return
+        except OSError as e:
+            # Reset or otherwise gone before the backend was dialed.
+            print(f"Dropped {client_ip}: {e or type(e).__name__}.")
+            await close_client("early_close")
+            return
+
+        # A block may have landed while the client was logging in.
+        if client_ip in rate_limiter.blocked_ips:
+            print(f"Blocked connection from {client_ip}: IP is blocked.")
+            await close_client("blocked")
+            return
+
+        tried = []
+        if profiler is not None:
+            dial_started = time.perf_counter_ns()
+        while True:
+            try:
+                if backend is None:
+                    backend_reader, backend_writer = await asyncio.open_connection(backend_host, backend_port)
+                else:
+                    backend_reader, backend_writer = await router.dial(backend)
+                break
+            except Exception as e:
+                print(f"Backend connection failed: {e}")
+                if backend is not None:
+                    # Passive health check, then the next backend in the pool if there is one.
+                    router.record_failure(backend, e)
+                    tried.append(backend)
+                    fallback = router.pick(pool, exclude=tried)
+                    if fallback is not None:
+                        metrics["backend_failovers"] += 1
+                        backend.active -= 1
+                        backend = fallback
+                        backend.active += 1
+                        packet_limiter = backend.packets
+                        continue
+                metrics["backend_dial_failures"] += 1
+                release()
+                writer.close()
+                await writer.wait_closed()
+                return
+
+        if profiler is not None:
+            profiler.record("dial", time.perf_counter_ns() - dial_started)
+        backend_writer.transport.set_write_buffer_limits(rate_limiter.write_high_water, rate_limiter.write_low_water)
+        metrics["backend_dials"] += 1
+        metrics["bytes_upstream"] += len(replay)
+        backend_writer.write(replay)
+
+        high_water = rate_limiter.write_high_water
+        # Set when the server turns on encryption or a client frame prefix
+        # makes no sense; from then on client reads are charged by size.
+        opaque = False
+        opaque_packet_bytes = rate_limiter.opaque_packet_bytes
+        login_watcher = LoginWatcher() if next_state != 1 else None
+        # One per direction; both switch to compressed framing together.
+        scanners = None
+        if profiler is not None:
+            scanners = {direction: PacketScanner() for direction in ("upstream", "downstream")}
+
+        async def send(dest, data):
+            # drain() is only worth awaiting once the peer is actually behind;
+            # below the high-water mark the bytes are already on their way.
+            dest.write(data)
+            if dest.transport.get_write_buffer_size() > high_water:
+                metrics["backpressure_pauses"] += 1
+                if profiler is None:
+                    await dest.drain()
+                else:
+                    started = time.perf_counter_ns()
+                    await dest.drain()
+                    profiler.record("drain", time.perf_counter_ns() - started)
+
+        def profiled_frames():
+            # Decoding timed as the parse stage, each frame tallied by packet id.
+            parse = profiler.stages["parse"]
+            tally = profiler.tally("upstream", client_state)
+            while True:
+                started = time.perf_counter_ns()
+                frame = client_decoder.next_frame()
+                parse.record(time.perf_counter_ns() - started)
+                if frame is None:
+                    return
+                if scanners["upstream"].compressed:
+                    profiler.count(tally, compressed_packet_id(frame), len(frame.data))
+                else:
+                    profiler.count(tally, frame.packet_id, len(frame.data))
+                yield frame
+
+        async def relay_client_frames(dest, walk):
+            try:
+                if passthrough:
+                    # Whatever arrived behind Login Start, forwarded as one block.
+                    rest = client_decoder.take_pending()
+                    account_buffer()
+                    count = walk(rest)
+                    if count and not admit_packets(count):
+                        return False
+                    if rest:
+                        await send(dest, rest)
+                    return True
+
+                # Every complete frame from this read goes out in one write.
+                batch = []
+                for frame in client_decoder if profiler is None else profiled_frames():
+                    packet_id = frame.packet_id
+                    payload = frame.payload
+
+                    if client_state == "play" and rate_limiter.log_packets:
+                        print(f"Client packet: {frame.data.hex()}")
+
+                    if not admit_packets(1):
+                        return False
+
+                    if client_state == "play":
+                        if packet_id == 0x07:
+                            if rate_limiter.log_packets:
+                                print(f"Chat message from {username}: {str(payload[1:], 'utf-8')}")
+
+                    batch.append(frame.data)
+
+                if batch:
+                    await send(dest, b"".join(batch))
+
+            except ValueError as e:
+                print(f"Packet parsing error: {e}")
+                return False
+            return True
 
         async def forward(src, dest, is_client=True):
-            nonlocal client_state, buffer, username
+            nonlocal last_activity, passthrough, opaque, login_watcher
+            counter = FrameCounter(client_decoder.max_frame_size)
+            direction = "upstream" if is_client else "downstream"
+            bytes_metric = f"bytes_{direction}"
+            read_size = rate_limiter.read_size
+            latency = scanner = None
+            if profiler is None:
+                count_frames = counter.count
+            else:
+                latency = profiler.latency[direction]
+                scanner = scanners[direction]
+                timed_count = profiler.timed("parse", counter.count)
+
+                # Only the client side walks frames, so this always tallies upstream.
+                def count_frames(data):
+                    scanner.scan(data, profiler.tally(direction, client_state))
+                    return timed_count(data)
+
+            def walk(data):
+                # Packets in data by their frames, or by size once frames can't be trusted.
+                nonlocal opaque
+                if not opaque:
+                    try:
+                        return count_frames(data)
+                    except FrameError as e:
+                        opaque = True
+                        metrics["frame_walks_abandoned"] += 1
+                        print(f"Counting packets from {client_ip} by size from now on: {e}.")
+                return 1 + len(data) // opaque_packet_bytes
             try:
+                if is_client and not await relay_client_frames(dest, walk):
+                    return
                 while True:
-                    data = await src.read(4096)
+                    data = await src.read(read_size)
                     if not data:
                         break
-
+                    if latency is not None:
+                        started = time.perf_counter_ns()
+                    metrics[bytes_metric] += len(data)
                     if is_client:
-                        buffer.extend(data)
-                        while True:
-                            if len(buffer) < 1:
-                                break
-
-                            try:
-                                length, length_bytes = parse_varint(buffer)
-                                total_length = length_bytes + length
-
-                                packet = bytes(buffer[:total_length])
-                                del buffer[:total_length]
-
-                                if client_state == "play" and rate_limiter.log_packets:
-                                    print(f"Client packet: {packet.hex()}")
-
-                                packet_id, id_bytes = parse_varint(packet[length_bytes:])
-                                payload = packet[length_bytes + id_bytes:]
-
-                                if not rate_limiter.is_allowed_packet(client_ip):
-                                    print(f"Blocked {client_ip} for packet spam.")
-                                    return
-
-                                if client_ip in rate_limiter.blocked_ips:
-                                    print(f"Blocked connection from {client_ip}: IP is blocked.")
-                                    return
-
-                                if client_state == "handshake":
-                                    if packet_id == 0x00:
-                                        next_state = parse_handshake(payload)
-                                        if next_state == 2:
-                                            client_state = "login"
-                                    if packet_id == 0xFE:
-                                        pass
-                                elif client_state == "login":
-                                    if packet_id == 0x00:
-                                        username = parse_login_start(payload)
-                                        client_state = "play"
-                                elif client_state == "play":
-                                    if packet_id == 0x07:
-                                        if rate_limiter.log_packets:
-                                            print(f"Chat message from {username}: {payload[1:].decode('utf-8')}")
-                                        
-                                dest.write(packet)
-                                await dest.drain()
-
-                            except ValueError as e:
-                                print(f"Packet parsing error: {e}")
-                                break
+                        last_activity = timers.now
+
+                    if not passthrough and opaque and is_client:
+                        # Decoding stops here; whatever it had buffered goes out first.
+                        data = client_decoder.take_pending() + data
+                        account_buffer()
+                        passthrough = True
+
+                    if is_client and passthrough:
+                        count = walk(data)
+                        if count and not admit_packets(count):
+                            return
+                        await send(dest, data)
+
+                    elif is_client:
+                        client_decoder.feed(data)
+                        if not await relay_client_frames(dest, count_frames):
+                            return
+                        account_buffer()
 
                     else:
-                        dest.write(data)
-                        await dest.drain()
+                        # Offset in data where compressed framing starts, once it does.
+                        split = None
+                        if login_watcher is not None:
+                            # Checked before forwarding, so the client can't answer an
+                            # Encryption Request before the upstream side knows about it.
+                            fed = login_watcher.seen
+                            login_watcher.feed(data)
+                            start = login_watcher.compression_start
+                            if scanner is not None and start is not None and not scanner.compressed:
+                                split = max(0, start - fed)
+                            if login_watcher.encrypted:
+                                opaque = True
+                                metrics["encrypted_sessions"] += 1
+                            if login_watcher.done:
+                                login_watcher = None
+                        if scanner is not None and not opaque:
+                            tally = profiler.tally(direction, client_state)
+                            if split is None:
+                                scanner.scan(data, tally)
+                            else:
+                                scanner.scan(data[:split], tally)
+                                for each in scanners.values():
+                                    each.compressed = True
+                                scanner.scan(data[split:], tally)
+                        await send(dest, data)
+
+                    if latency is not None:
+                        # From the read returning to its bytes being handed to the other side.
+                        latency.record(time.perf_counter_ns() - started)
+            except BufferError as e:
+                print(f"Dropped {client_ip}: {e}.")
+                metrics["rejected_buffer_limit"] += 1
+            except asyncio.TimeoutError:
+                print(f"Dropped {client_ip}: timed out in {client_state} state.")
+                reject(f"{client_state}_timeout")
             except Exception as e:
                 print(f"Forwarding error: {e}")
             finally:
@@ -192,7 +923,10 @@ class DragonAegis:
         client_to_server = forward(reader, backend_writer, is_client=True)
         server_to_client = forward(backend_reader, writer, is_client=False)
         
-        await asyncio.gather(client_to_server, server_to_client)
+        try:
+            await asyncio.gather(client_to_server, server_to_client)
+        finally:
+            release()
 
         writer.close()
         await writer.wait_closed()
@@ -200,75 +934,207 @@ class DragonAegis:
     def get_connections(self):
         return self.active_connections
 
-async def main():
+def parse_args():
     parser = argparse.ArgumentParser(description='DragonAegis Proxy')
-    parser.add_argument('--target-server', type=str, default="", help="Target server to stream socket to")
+    parser.add_argument('--target-server', type=str, default="", help="Default backend; other hostnames are routed by the servers table")
     parser.add_argument('--target-server-port', type=int, default=0, help="Target server port")
     parser.add_argument('--log-packets', type=bool, default=False, help='Log incoming packets')
     parser.add_argument('--refresh-tables', type=bool, default=False, help='Refresh database tables')
+    parser.add_argument('--storage', choices=("mysql", "sqlite", "memory"), default="mysql", help="Where blocks, servers and event counts are stored")
+    parser.add_argument('--sqlite-path', type=str, default="dragon.db", help="Database file for --storage sqlite")
     parser.add_argument('--api-mode', type=bool, default=False, help="Enables the api")
+    parser.add_argument('--api-host', type=str, default="localhost", help="Admin API bind address")
+    parser.add_argument('--api-port', type=int, default=8080, help="Admin API port, offset by the worker id in --workers mode")
+    parser.add_argument('--workers', type=int, default=1, help="Number of proxy processes sharing the port via SO_REUSEPORT")
+    parser.add_argument('--balance', choices=BALANCE_MODES, default="least_connections", help="How clients are spread over the backends of one hostname")
+    parser.add_argument('--health-check-interval', type=float, default=5.0, help="Seconds between backend health checks")
+    parser.add_argument('--probe-pool-size', type=int, default=1, help="Health-check connections kept open per backend and handed to the next client; 0 closes them")
+    parser.add_argument('--routes-refresh-interval', type=float, default=30.0, help="Seconds between reloads of the servers table")
+    parser.add_argument('--status-refresh-interval', type=float, default=5.0, help="Seconds between server-list status refreshes from the backend")
+    parser.add_argument('--handshake-timeout', type=float, default=5.0, help="Seconds a client has to send its handshake")
+    parser.add_argument('--login-timeout', type=float, default=10.0, help="Seconds a client has to send Login Start after the handshake")
+    parser.add_argument('--idle-timeout', type=float, default=300.0, help="Seconds a logged-in client may send nothing before it is dropped")
+    parser.add_argument('--subnet-limits-v4', type=parse_prefix_limits, default=None, help="Connections per minute per IPv4 prefix, e.g. 24:20,16:100; empty for none")
+    parser.add_argument('--subnet-limits-v6', type=parse_prefix_limits, default=None, help="Connections per minute per IPv6 prefix, e.g. 64:10,48:100; empty for none")
+    parser.add_argument('--ban-threshold', type=int, default=10, help="Denials within a minute that turn into a temporary ban of the prefix")
+    parser.add_argument('--ban-duration', type=float, default=300.0, help="Seconds a flooding prefix stays banned")
+    parser.add_argument('--min-ban-prefix-v4', type=int, default=24, help="Shortest IPv4 prefix that may be banned; broader ones are only rate limited")
+    parser.add_argument('--min-ban-prefix-v6', type=int, default=48, help="Shortest IPv6 prefix that may be banned; broader ones are only rate limited")
+    parser.add_argument('--attack-connection-rate', type=float, default=200, help="Connections per second that trigger attack mode")
+    parser.add_argument('--attack-new-ip-rate', type=float, default=100, help="Previously unseen IPs per second that trigger attack mode")
+    parser.add_argument('--attack-failure-ratio', type=float, default=0.6, help="Share of failed handshakes that triggers attack mode")
+    parser.add_argument('--attack-unknown-rate', type=int, default=5, help="Connections per second admitted from IPs without a recent login during attack mode")
+    parser.add_argument('--read-size', type=int, default=65536, help="Maximum bytes read from a socket per forwarding step")
+    parser.add_argument('--write-high-water', type=int, default=262144, help="Buffered bytes at which reading from the other side pauses")
+    parser.add_argument('--write-low-water', type=int, default=65536, help="Buffered bytes at which reading resumes")
+    parser.add_argument('--max-play-frame', type=int, default=DEFAULT_MAX_FRAME_SIZES["play"], help="Largest frame a client may send once logged in")
+    parser.add_argument('--opaque-packet-bytes', type=int, default=256, help="Once a client's traffic is encrypted, each read is charged as one packet plus one per this many bytes")
+    parser.add_argument('--connection-buffer-limit', type=int, default=512 * 1024, help="Undecoded bytes one connection may hold")
+    parser.add_argument('--snapshot-path', type=str, default="dragon.snapshot", help="File limiter, ban and blocklist state is saved to and restored from; empty to disable")
+    parser.add_argument('--snapshot-interval', type=float, default=30.0, help="Seconds between state snapshots")
+    parser.add_argument('--profile', action='store_true', help="Count packets per state and packet id and time each stage of the pipeline; see /profile")
+    parser.add_argument('--buffer-budget', type=int, default=64 * 1024 * 1024, help="Undecoded bytes all connections together may hold before the least-progressed are shed")
 
     args = parser.parse_args()
 
+    if bool(args.target_server) != bool(args.target_server_port):
+        print(f"\n{Fore.RED}⚠️ Target server or port not specified {Style.RESET_ALL}")
+        exit(-1)
+
+    return args
+
+async def main(args, worker_id=0, shared_state=None):
     log_packets = args.log_packets
     refresh_tables = args.refresh_tables
     enable_api = args.api_mode
 
-    if not args.target_server or args.target_server_port:
-        print(f"\n{Fore.RED}⚠️ Target server or port not specified {Style.RESET_ALL}")
-        exit(-1)
-
     backend_host = args.target_server
     backend_port = args.target_server_port
     proxy_port = 25565
+    conn_interval = 60
+    packet_interval = 1
+
+    if args.storage == "sqlite":
+        db_manager = SQLiteManager(args.sqlite_path)
+    elif args.storage == "memory":
+        db_manager = MemoryManager()
+    else:
+        db_manager = DatabaseManager(
+            host='localhost',
+            port=3306,
+            user="root",
+            password="",
+            db="dragon",
+            refresh_tables=refresh_tables and worker_id == 0
+        )
+    await db_manager.initialize()
 
+    # The target server is registered as the default route (no hostname);
+    # everything else comes from the servers table.
+    server_id = None
+    if backend_host:
+        server_id = await db_manager.get_server_id(backend_host, backend_port)
+        if server_id is None:
+            await db_manager.log_server(backend_host, backend_port)
+            server_id = await db_manager.get_server_id(backend_host, backend_port)
 
-    if enable_api:
-        http.run()
-
-    db_manager = DatabaseManager(
-        host='localhost',
-        port=3306,
-        user="root",
-        password="",
-        db="dragon",
-        refresh_tables=refresh_tables
+    router = Router(
+        db_manager,
+        balance=args.balance,
+        conn_interval=conn_interval,
+        packet_interval=packet_interval,
+        status_refresh_interval=args.status_refresh_interval,
+        refresh_interval=args.routes_refresh_interval,
+        check_interval=args.health_check_interval,
+        pool_size=args.probe_pool_size,
+        limiter_factory=shared_state.counters.limiter_factory if shared_state else None
     )
-    await db_manager.initialize()
+    await router.start()
+    if not router.backends:
+        print(f"\n{Fore.RED}⚠️ Target server or port not specified and no servers configured {Style.RESET_ALL}")
+        await db_manager.close()
+        exit(-1)
+    if server_id is None:
+        server_id = min(router.backends)
 
     rate_limiter = DragonAegis(
         log_packets=log_packets,
         db_manager=db_manager,
         max_connections=5,      
-        conn_interval=60,
+        conn_interval=conn_interval,
         max_packets=100,      
-        packet_interval=1
+        packet_interval=packet_interval,
+        subnet_limits_v4=args.subnet_limits_v4,
+        subnet_limits_v6=args.subnet_limits_v6,
+        ban_threshold=args.ban_threshold,
+        ban_duration=args.ban_duration,
+        min_ban_prefix={4: args.min_ban_prefix_v4, 6: args.min_ban_prefix_v6},
+        shared_state=shared_state,
+        router=router,
+        profile=args.profile,
+        attack_detector=AttackDetector(
+            connection_rate=args.attack_connection_rate,
+            new_ip_rate=args.attack_new_ip_rate,
+            failure_ratio=args.attack_failure_ratio,
+            unknown_rate=args.attack_unknown_rate
+        ),
+        handshake_timeout=args.handshake_timeout,
+        login_timeout=args.login_timeout,
+        idle_timeout=args.idle_timeout,
+        read_size=args.read_size,
+        write_high_water=args.write_high_water,
+        write_low_water=args.write_low_water,
+        max_frame_sizes={"play": args.max_play_frame},
+        buffer_budget=args.buffer_budget,
+        connection_buffer_limit=args.connection_buffer_limit,
+        opaque_packet_bytes=args.opaque_packet_bytes
     )
+    await rate_limiter.start_blocklist_sync(server_id)
+    # Limiter state is per process, so each worker keeps its own snapshot.
+    snapshot_path = args.snapshot_path
+    if snapshot_path and shared_state is not None:
+        snapshot_path = f"{snapshot_path}.{worker_id}"
+    if snapshot_path:
+        if os.path.exists(snapshot_path):
+            rate_limiter.load_snapshot(snapshot_path)
+        await rate_limiter.start_snapshots(snapshot_path, args.snapshot_interval)
+    await rate_limiter.start_monitor()
+    if worker_id == 0:
+        await rate_limiter.cleanup_task()
+    if shared_state is not None:
+        await rate_limiter.start_shared_sync()
+
+    # The admin API shares this loop with the proxy; each worker serves its own.
+    admin = None
+    if enable_api:
+        admin = AdminServer(rate_limiter, host=args.api_host, port=args.api_port + worker_id)
+        await admin.start()
+        print(f"{Fore.CYAN}🌐 Admin API on: {Fore.YELLOW}{args.api_host}:{args.api_port + worker_id}{Style.RESET_ALL}")
     
-    print(f"\n{Fore.GREEN}🚀 DragonAegis started {Style.RESET_ALL}")
-    print(f"{Fore.CYAN}📡 Forwarding to: {Fore.YELLOW}{backend_host}:{backend_port}{Style.RESET_ALL}")
-    print(f"{Fore.CYAN}🛡️ Proxy listening on: {Fore.YELLOW}0.0.0.0:{proxy_port}{Style.RESET_ALL}\n")
+    if worker_id == 0:
+        print(f"\n{Fore.GREEN}🚀 DragonAegis started {Style.RESET_ALL}")
+        for backend in router.backends.values():
+            print(f"{Fore.CYAN}📡 Routing {Fore.YELLOW}{backend.hostname or '*'}{Fore.CYAN} to: {Fore.YELLOW}{backend.address}"
+                  f"{Fore.CYAN} (weight {backend.weight}){Style.RESET_ALL}")
+        print(f"{Fore.CYAN}🛡️ Proxy listening on: {Fore.YELLOW}0.0.0.0:{proxy_port}{Style.RESET_ALL}\n")
 
     server = await asyncio.start_server(
         lambda r, w: DragonAegis.handle_client(r, w, backend_host, backend_port, rate_limiter),
-        '0.0.0.0', proxy_port
+        '0.0.0.0', proxy_port,
+        reuse_port=shared_state is not None
     )
 
-    terminal = Terminal(
-        db_manager=db_manager
-    )
-    
-    asyncio.create_task(terminal.terminal_loop(rate_limiter))
+    # Only one process can own stdin.
+    if worker_id == 0:
+        terminal = Terminal(
+            db_manager=db_manager
+        )
+        
+        asyncio.create_task(terminal.terminal_loop(rate_limiter))
 
-    if not enable_api:
+    try:
         async with server:
-            print(f"Proxy running on port {proxy_port}...")
+            print(f"Proxy running on port {proxy_port} (worker {worker_id})...")
             await server.serve_forever()
-    else:
-        print("unable to run socket, api is enabled")
+    finally:
+        if admin is not None:
+            await admin.close()
+        await rate_limiter.stop_snapshots()
+        await router.close()
+        await db_manager.close()
 
-if __name__ == '__main__':
+def run(args, worker_id=0, shared_state=None):
     try:
-        asyncio.run(main())
+        asyncio.run(main(args, worker_id, shared_state))
     except KeyboardInterrupt:
-        print(f"\n{Fore.YELLOW}⚠️ Proxy shutting down...{Style.RESET_ALL}")
\ No newline at end of file
+        if worker_id == 0:
+            print(f"\n{Fore.YELLOW}⚠️ Proxy shutting down...{Style.RESET_ALL}")
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.workers > 1:
+        # Shared memory has to exist before the fork so every worker maps it.
+        shared_state = SharedState()
+        run_workers(args.workers, lambda worker_id: run(args, worker_id, shared_state))
+    else:
+        run(args)
@@ -0,0 +1,127 @@
+import ipaddress
+import socket
+
+
+def parse_address(ip: str):
+    """Return ``(version, int_value)`` for an IP string, unwrapping IPv4-mapped IPv6."""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except OSError:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+        if value >> 32 == 0xFFFF:
+            return 4, value & 0xFFFFFFFF
+        return 6, value
+
+
+class BlocklistIndex:
+    """Blocked single IPs and IPv4/IPv6 CIDR ranges.
+
+    Entries are kept in one prefix table per address family, keyed by prefix
+    length and holding the network prefixes as ints. A lookup masks the
+    address once per prefix length in use, so it costs a handful of set
+    probes no matter how many entries are loaded.
+    """
+
+    _BITS = {4: 32, 6: 128}
+
+    def __init__(self, entries=()):
+        self._tables = {4: {}, 6: {}}
+        self._lengths = {4: (), 6: ()}
+        self._entries = {}
+        for entry in entries:
+            self.add(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __contains__(self, ip):
+        return self.match(ip) is not None
+
+    @staticmethod
+    def _parse(entry: str):
+        network = ipaddress.ip_network(entry.strip(), strict=False)
+        if network.version == 6 and network.network_address.ipv4_mapped and network.prefixlen >= 96:
+            network = ipaddress.ip_network(f"{network.network_address.ipv4_mapped}/{network.prefixlen - 96}")
+        length = network.prefixlen
+        prefix = int(network.network_address) >> (network.max_prefixlen - length)
+        if length == network.max_prefixlen:
+            return str(network.network_address), network.version, length, prefix
+        return str(network), network.version, length, prefix
+
+    @classmethod
+    def normalize(cls, entry: str) -> str:
+        return cls._parse(entry)[0]
+
+    def normalize_all(self, entries) -> set:
+        # Entries already in the index are in normal form, skip re-parsing them.
+        normalized = set()
+        for entry in entries:
+            if entry in self._entries:
+                normalized.add(entry)
+                continue
+            try:
+                normalized.add(self.normalize(entry))
+            except ValueError:
+                print(f"Skipping invalid blocklist entry: {entry}")
+        return normalized
+
+    def add(self, entry: str) -> str:
+        entry, version, length, prefix = self._parse(entry)
+        if entry in self._entries:
+            return entry
+        table = self._tables[version]
+        if length not in table:
+            table[length] = set()
+            self._lengths[version] = tuple(sorted(table, reverse=True))
+        table[length].add(prefix)
+        self._entries[entry] = None
+        return entry
+
+    def remove(self, entry: str) -> bool:
+        entry, version, length, prefix = self._parse(entry)
+        if entry not in self._entries:
+            return False
+        del self._entries[entry]
+        table = self._tables[version]
+        table[length].discard(prefix)
+        if not table[length]:
+            del table[length]
+            self._lengths[version] = tuple(sorted(table, reverse=True))
+        return True
+
+    def clear(self):
+        for version in self._tables:
+            self._tables[version] = {}
+            self._lengths[version] = ()
+        self._entries.clear()
+
+    def match(self, ip: str):
+        """Return the most specific prefix length that covers ``ip``, or ``None``."""
+        try:
+            version, value = parse_address(ip)
+        except (OSError, TypeError):
+            return None
+        bits = self._BITS[version]
+        table = self._tables[version]
+        for length in self._lengths[version]:
+            if value >> (bits - length) in table[length]:
+                return length
+        return None
+
+    def sync(self, entries, keep=()):
+        """Make the index hold exactly ``entries`` plus ``keep``, touching only the difference.
+
+        Returns ``(added, removed)``.
+        """
+        wanted = self.normalize_all(entries)
+        wanted.update(keep)
+        removed = [entry for entry in self._entries if entry not in wanted]
+        added = [entry for entry in wanted if entry not in self._entries]
+        for entry in removed:
+            self.remove(entry)
+        for entry in added:
+            self.add(entry)
+        return added, removed
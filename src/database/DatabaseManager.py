@@ -1,17 +1,45 @@
 import aiomysql
+import asyncio
 import time
 
-class DatabaseManager:
-    def __init__(self, host: str, port: int, user: str, password: str, db: str, refresh_tables: bool = False):
+from src.database.StorageBackend import BUCKET_SECONDS, EVENT_TABLES, SERVER_COLUMNS, StorageBackend
+
+class DatabaseManager(StorageBackend):
+    """MySQL storage. Raw events are partitioned by hour (``bucket`` = unix
+    time // 3600) so retention drops whole partitions."""
+
+    _BATCH_INSERTS = {
+        "connections": "INSERT INTO connections (ip, server_id, timestamp, bucket) VALUES (%s, %s, %s, %s)",
+        "packets": "INSERT INTO packets (ip, server_id, timestamp, bucket) VALUES (%s, %s, %s, %s)",
+    }
+    _ROLLUP_UPSERT = (
+        "INSERT INTO {table} (server_id, ip, minute, count) VALUES (%s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE count = count + VALUES(count)"
+    )
+    # Added to servers tables created before virtual-host routing.
+    _SERVER_MIGRATIONS = {
+        "hostname": "ALTER TABLE servers ADD COLUMN hostname VARCHAR(255) NULL",
+        "weight": "ALTER TABLE servers ADD COLUMN weight INT NOT NULL DEFAULT 1",
+        "max_connections": "ALTER TABLE servers ADD COLUMN max_connections INT NULL",
+        "max_packets": "ALTER TABLE servers ADD COLUMN max_packets INT NULL",
+    }
+
+    def __init__(self, host: str, port: int, user: str, password: str, db: str, refresh_tables: bool = False,
+                 partitions_ahead: int = 3, cleanup_chunk_size: int = 5000, cleanup_pause: float = 0.05, **kwargs):
+        super().__init__(refresh_tables=refresh_tables, **kwargs)
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.db = db
         self.pool = None
-        self.refresh_tables = refresh_tables    
+
+        # Anything not partitioned is deleted ``cleanup_chunk_size`` rows at a time.
+        self.partitions_ahead = partitions_ahead
+        self.cleanup_chunk_size = cleanup_chunk_size
+        self.cleanup_pause = cleanup_pause
         
-    async def initialize(self):
+    async def _connect(self):
         self.pool = await aiomysql.create_pool(
             host=self.host,
             port=self.port,
@@ -21,7 +49,27 @@ class DatabaseManager:
             autocommit=True,
             pool_recycle=300
         )
-        await self._create_tables()
+
+    async def _disconnect(self):
+        if self.pool:
+            self.pool.close()
+            await self.pool.wait_closed()
+
+    async def _write(self, batches, handshakes):
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                for table, batch in batches.items():
+                    await cur.executemany(self._BATCH_INSERTS[table], batch)
+                    if table in EVENT_TABLES:
+                        await cur.executemany(
+                            self._ROLLUP_UPSERT.format(table=EVENT_TABLES[table]),
+                            self._rollup(batch)
+                        )
+                if handshakes:
+                    await cur.executemany(
+                        "UPDATE servers SET handshakes = COALESCE(handshakes, 0) + %s WHERE ip = %s AND port = %s",
+                        [(count, ip, port) for (ip, port), count in handshakes.items()]
+                    )
         
     async def _create_tables(self):
         if self.refresh_tables:
@@ -31,18 +79,38 @@ class DatabaseManager:
                     server_id INT
                 )""",
                 """CREATE TABLE IF NOT EXISTS connections (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    id BIGINT AUTO_INCREMENT,
                     ip VARCHAR(45),
                     server_id INT,
-                    timestamp FLOAT,
+                    timestamp DOUBLE,
+                    bucket INT NOT NULL,
+                    PRIMARY KEY (id, bucket),
                     INDEX idx_conn (ip, timestamp)
-                )""",
+                ) PARTITION BY RANGE (bucket) (PARTITION pmax VALUES LESS THAN MAXVALUE)""",
                 """CREATE TABLE IF NOT EXISTS packets (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    id BIGINT AUTO_INCREMENT,
                     ip VARCHAR(45),
                     server_id INT,
-                    timestamp FLOAT,
+                    timestamp DOUBLE,
+                    bucket INT NOT NULL,
+                    PRIMARY KEY (id, bucket),
                     INDEX idx_packets (ip, timestamp)
+                ) PARTITION BY RANGE (bucket) (PARTITION pmax VALUES LESS THAN MAXVALUE)""",
+                """CREATE TABLE IF NOT EXISTS connection_rollups (
+                    server_id INT NOT NULL,
+                    ip VARCHAR(45) NOT NULL,
+                    minute INT NOT NULL,
+                    count INT NOT NULL,
+                    PRIMARY KEY (server_id, ip, minute),
+                    INDEX idx_conn_minute (minute)
+                )""",
+                """CREATE TABLE IF NOT EXISTS packet_rollups (
+                    server_id INT NOT NULL,
+                    ip VARCHAR(45) NOT NULL,
+                    minute INT NOT NULL,
+                    count INT NOT NULL,
+                    PRIMARY KEY (server_id, ip, minute),
+                    INDEX idx_packet_minute (minute)
                 )""",
                 """CREATE TABLE IF NOT EXISTS servers (
                     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -50,6 +118,10 @@ class DatabaseManager:
                     port INT,
                     timestamp FLOAT,
                     handshakes INT,
+                    hostname VARCHAR(255) NULL,
+                    weight INT NOT NULL DEFAULT 1,
+                    max_connections INT NULL,
+                    max_packets INT NULL,
                     INDEX idx_server (ip, timestamp)
                 )"""
             ]
@@ -57,18 +129,57 @@ class DatabaseManager:
                 async with conn.cursor() as cur:
                     for table in tables:
                         await cur.execute(table)
+                    for table in EVENT_TABLES:
+                        await self._ensure_partitions(cur, table)
         else:
             print("Skipping table creation, refresh_tables is False")
-                    
-    async def block_ip(self, ip: str, server_id: int):
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute("INSERT INTO blocked_ips (ip, server_id) VALUES (%s, %s)", (ip, server_id))
-                
-    async def unblock_ip(self, ip: str, server_id: int):
+                await self._migrate_servers(cur)
+                await self._migrate_events(cur)
+
+    async def _columns(self, cur, table: str) -> set:
+        await cur.execute(
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table,)
+        )
+        return {row[0] for row in await cur.fetchall()}
+
+    async def _migrate_servers(self, cur):
+        columns = await self._columns(cur, "servers")
+        if not columns:
+            return
+        for column, statement in self._SERVER_MIGRATIONS.items():
+            if column not in columns:
+                await cur.execute(statement)
+
+    async def _migrate_events(self, cur):
+        # Event tables from before partitioning have no bucket, which every
+        # batch insert writes. It is added and backfilled a chunk at a time;
+        # the tables stay unpartitioned and cleanup keeps deleting by timestamp.
+        for table in EVENT_TABLES:
+            columns = await self._columns(cur, table)
+            if not columns or "bucket" in columns:
+                continue
+            print(f"Adding bucket column to {table}")
+            await cur.execute(f"ALTER TABLE {table} ADD COLUMN bucket INT NOT NULL DEFAULT 0")
+            while await cur.execute(
+                f"UPDATE {table} SET bucket = FLOOR(timestamp / {BUCKET_SECONDS}) "
+                f"WHERE bucket = 0 AND timestamp >= {BUCKET_SECONDS} LIMIT %s",
+                (self.cleanup_chunk_size,)
+            ):
+                await asyncio.sleep(self.cleanup_pause)
+                    
+    async def _write_blocks(self, changes):
+        # One IP appears at most once, so inserts and deletes can go in two batches.
+        inserts = [(ip, server_id) for ip, server_id, blocked in changes if blocked]
+        deletes = [(ip, server_id) for ip, server_id, blocked in changes if not blocked]
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute("DELETE FROM blocked_ips WHERE ip = %s AND server_id = %s", (ip, server_id))
+                if inserts:
+                    await cur.executemany("INSERT IGNORE INTO blocked_ips (ip, server_id) VALUES (%s, %s)", inserts)
+                if deletes:
+                    await cur.executemany("DELETE FROM blocked_ips WHERE ip = %s AND server_id = %s", deletes)
                 
     async def list_blocked(self, server_id: int):
         async with self.pool.acquire() as conn:
@@ -76,57 +187,107 @@ class DatabaseManager:
                 await cur.execute("SELECT ip FROM blocked_ips WHERE server_id = %s", (server_id,))
                 return [row[0] async for row in cur]
     
-    async def log_connection(self, ip: str, server_id: int):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("INSERT INTO connections (ip, server_id, timestamp) VALUES (%s, %s, %s)", (ip, server_id, time.time()))
-                
-    async def log_packet(self, ip: str, server_id: int):
+    async def _rollup_count(self, table: str, server_id: int, ip: str = None, since: float = None):
+        query = f"SELECT COALESCE(SUM(count), 0) FROM {table} WHERE server_id = %s"
+        params = [server_id]
+        if ip is not None:
+            query += " AND ip = %s"
+            params.append(ip)
+        if since is not None:
+            query += " AND minute >= %s"
+            params.append(int(since // 60))
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute("INSERT INTO packets (ip, server_id, timestamp) VALUES (%s, %s, %s)", (ip, server_id, time.time()))
+                await cur.execute(query, params)
+                return int((await cur.fetchone())[0])
                 
-    async def get_connection_count(self, address: str):
-        id = await self.get_server_id(ip=address[0], port=address[1]) 
+    async def get_server_id(self, ip: str, port: int):
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute("SELECT COUNT(*) FROM connections WHERE ip = %s AND server_id = %s", (address[0], id))
-                return (await cur.fetchone())[0]
+                await cur.execute("SELECT id FROM servers WHERE ip = %s AND port = %s ORDER BY id LIMIT 1", (ip, port))
+                row = await cur.fetchone()
+                return row[0] if row else None
             
-    async def get_packet_count(self, ip: str, server_id: int):
+    async def log_server(self, ip: str, port: int, hostname: str = None, weight: int = 1,
+                         max_connections: int = None, max_packets: int = None):
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute("SELECT COUNT(*) FROM packets WHERE ip = %s AND server_id = %s", (ip, server_id))
-                return (await cur.fetchone())[0]
-    
-    async def get_server_id(self, ip: str, port: int):
+                await cur.execute(
+                    "INSERT INTO servers (ip, port, timestamp, hostname, weight, max_connections, max_packets) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                    (ip, port, time.time(), hostname, weight, max_connections, max_packets)
+                )
+
+    async def list_servers(self):
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute("SELECT id FROM servers WHERE ip = %s AND port = %s", (ip, port))
-                return (await cur.fetchone())[0]
-            
-    async def log_server(self, ip: str, port: int):
+                await cur.execute(f"SELECT {', '.join(SERVER_COLUMNS)} FROM servers ORDER BY id")
+                return [dict(zip(SERVER_COLUMNS, row)) for row in await cur.fetchall()]
+
+    async def delete_server(self, server_id: int) -> bool:
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute("INSERT INTO servers (ip, port, timestamp) VALUES (%s, %s, %s)", (ip, port, time.time()))
+                return await cur.execute("DELETE FROM servers WHERE id = %s", (server_id,)) > 0
             
-    async def cleanup_old_entries(self):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                # Keep 1 hour of data for demonstration, adjust as needed
-                await cur.execute(
-                    "DELETE FROM connections WHERE timestamp < %s",
-                    (time.time() - 3600,)
-                )
-                await cur.execute(
-                    "DELETE FROM packets WHERE timestamp < %s",
-                    (time.time() - 3600,)
-                )
+    async def _partitions(self, cur, table: str):
+        """Map of hourly partition name to its upper bucket, ``None`` if ``table`` is not partitioned."""
+        await cur.execute(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL",
+            (table,)
+        )
+        rows = await cur.fetchall()
+        if not rows:
+            return None
+        return {name: int(bound) for name, bound in rows if name != "pmax"}
+
+    async def _ensure_partitions(self, cur, table: str, partitions: dict = None):
+        # Split the catch-all partition so the next few hours each get their own.
+        if partitions is None:
+            partitions = await self._partitions(cur, table)
+            if partitions is None:
+                return
+        current = int(time.time() // BUCKET_SECONDS)
+        highest = max(partitions.values(), default=current)
+        for bucket in range(max(current, highest), current + self.partitions_ahead + 1):
+            await cur.execute(
+                f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ("
+                f"PARTITION p{bucket} VALUES LESS THAN ({bucket + 1}), "
+                f"PARTITION pmax VALUES LESS THAN MAXVALUE)"
+            )
+
+    async def _delete_in_chunks(self, cur, table: str, column: str, cutoff) -> int:
+        # Small deletes keep row locks short and let the write-behind flush in between.
+        deleted = 0
+        while True:
+            rows = await cur.execute(
+                f"DELETE FROM {table} WHERE {column} < %s LIMIT %s",
+                (cutoff, self.cleanup_chunk_size)
+            )
+            deleted += rows
+            if rows < self.cleanup_chunk_size:
+                return deleted
+            await asyncio.sleep(self.cleanup_pause)
 
-    async def increment_handshakes(self, ip: str, port: int):
+    async def cleanup_old_entries(self):
+        """Apply retention and pre-create upcoming partitions; returns rows or partitions removed per table."""
+        now = time.time()
+        cutoff_bucket = int((now - self.retention) // BUCKET_SECONDS)
+        removed = {}
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute(
-                    "UPDATE servers SET handshakes = handshakes + 1 WHERE ip = %s AND port = %s",
-                    (ip, port)
-                )
\ No newline at end of file
+                for table, rollups in EVENT_TABLES.items():
+                    partitions = await self._partitions(cur, table)
+                    if partitions is not None:
+                        expired = [name for name, bound in partitions.items() if bound <= cutoff_bucket]
+                        if expired:
+                            await cur.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}")
+                        await self._ensure_partitions(cur, table, partitions)
+                        removed[table] = len(expired)
+                    else:
+                        # Tables created before partitioning still get bounded deletes.
+                        removed[table] = await self._delete_in_chunks(cur, table, "timestamp", now - self.retention)
+                    removed[rollups] = await self._delete_in_chunks(
+                        cur, rollups, "minute", int((now - self.rollup_retention) // 60)
+                    )
+        return removed
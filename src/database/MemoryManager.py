@@ -0,0 +1,111 @@
+import time
+
+from collections import defaultdict, deque
+
+from src.database.StorageBackend import EVENT_TABLES, SERVER_COLUMNS, StorageBackend
+
+class MemoryManager(StorageBackend):
+    """Storage kept in process memory; nothing survives a restart.
+
+    Meant for running without a database and for tests and benchmarks.
+    It goes through the same write-behind queue as the other backends, so
+    writes become visible after a flush just like they do elsewhere.
+    """
+
+    persistent = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.blocked = {}
+        # id -> row; lookups by address take the lowest id, like the SQL backends.
+        self.servers = {}
+        self._server_ids = 0
+        self.events = {table: deque() for table in EVENT_TABLES}
+        # rollup table -> (server_id, ip) -> minute -> count
+        self.rollups = {table: defaultdict(lambda: defaultdict(int)) for table in EVENT_TABLES.values()}
+
+    async def _connect(self):
+        pass
+
+    async def _disconnect(self):
+        pass
+
+    async def _create_tables(self):
+        pass
+
+    async def _write(self, batches, handshakes):
+        for table, batch in batches.items():
+            self.events[table].extend(batch)
+            rollups = self.rollups[EVENT_TABLES[table]]
+            for server_id, ip, minute, count in self._rollup(batch):
+                rollups[server_id, ip][minute] += count
+        for (ip, port), count in handshakes.items():
+            for server in self.servers.values():
+                if server["ip"] == ip and server["port"] == port:
+                    server["handshakes"] = (server["handshakes"] or 0) + count
+
+    async def _write_blocks(self, changes):
+        for ip, server_id, blocked in changes:
+            if blocked:
+                self.blocked.setdefault(ip, server_id)
+            elif self.blocked.get(ip) == server_id:
+                del self.blocked[ip]
+
+    async def list_blocked(self, server_id: int):
+        return [ip for ip, owner in self.blocked.items() if owner == server_id]
+
+    async def _rollup_count(self, table: str, server_id: int, ip: str = None, since: float = None):
+        rollups = self.rollups[table]
+        if ip is not None:
+            series = [rollups[server_id, ip]] if (server_id, ip) in rollups else []
+        else:
+            series = [minutes for (row_server, _), minutes in rollups.items() if row_server == server_id]
+        since_minute = int(since // 60) if since is not None else None
+        return sum(
+            count for minutes in series for minute, count in minutes.items()
+            if since_minute is None or minute >= since_minute
+        )
+
+    async def get_server_id(self, ip: str, port: int):
+        for server_id, server in self.servers.items():
+            if server["ip"] == ip and server["port"] == port:
+                return server_id
+        return None
+
+    async def log_server(self, ip: str, port: int, hostname: str = None, weight: int = 1,
+                         max_connections: int = None, max_packets: int = None):
+        self._server_ids += 1
+        self.servers[self._server_ids] = {
+            "id": self._server_ids, "ip": ip, "port": port, "hostname": hostname, "weight": weight,
+            "max_connections": max_connections, "max_packets": max_packets,
+            "timestamp": time.time(), "handshakes": None,
+        }
+
+    async def list_servers(self):
+        return [{column: server[column] for column in SERVER_COLUMNS} for server in self.servers.values()]
+
+    async def delete_server(self, server_id: int) -> bool:
+        return self.servers.pop(server_id, None) is not None
+
+    async def cleanup_old_entries(self):
+        now = time.time()
+        removed = {}
+        for table, rollups in EVENT_TABLES.items():
+            events = self.events[table]
+            cutoff = now - self.retention
+            count = 0
+            while events and events[0][2] < cutoff:
+                events.popleft()
+                count += 1
+            removed[table] = count
+            minute_cutoff = int((now - self.rollup_retention) // 60)
+            count = 0
+            for key, minutes in list(self.rollups[rollups].items()):
+                stale = [minute for minute in minutes if minute < minute_cutoff]
+                for minute in stale:
+                    del minutes[minute]
+                count += len(stale)
+                if not minutes:
+                    del self.rollups[rollups][key]
+            removed[rollups] = count
+        return removed
@@ -0,0 +1,218 @@
+import asyncio
+import sqlite3
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from src.database.StorageBackend import EVENT_TABLES, SERVER_COLUMNS, StorageBackend
+
+class SQLiteManager(StorageBackend):
+    """Embedded storage in a single SQLite file, no server required.
+
+    The connection lives on one dedicated thread so the event loop never
+    waits on disk. The database runs in WAL mode so reads don't queue
+    behind the batched writes, and each flush is one transaction. Every
+    statement is a fixed string, so sqlite3's per-connection statement
+    cache keeps them prepared. Tables are always created if missing.
+    """
+
+    _SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS blocked_ips (
+            ip TEXT PRIMARY KEY,
+            server_id INTEGER
+        )""",
+        """CREATE TABLE IF NOT EXISTS connections (
+            ip TEXT,
+            server_id INTEGER,
+            timestamp REAL,
+            bucket INTEGER
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_conn_time ON connections (timestamp)",
+        """CREATE TABLE IF NOT EXISTS packets (
+            ip TEXT,
+            server_id INTEGER,
+            timestamp REAL,
+            bucket INTEGER
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_packets_time ON packets (timestamp)",
+        """CREATE TABLE IF NOT EXISTS connection_rollups (
+            server_id INTEGER NOT NULL,
+            ip TEXT NOT NULL,
+            minute INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            UNIQUE (server_id, ip, minute)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_conn_minute ON connection_rollups (minute)",
+        """CREATE TABLE IF NOT EXISTS packet_rollups (
+            server_id INTEGER NOT NULL,
+            ip TEXT NOT NULL,
+            minute INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            UNIQUE (server_id, ip, minute)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_packet_minute ON packet_rollups (minute)",
+        """CREATE TABLE IF NOT EXISTS servers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ip TEXT,
+            port INTEGER,
+            timestamp REAL,
+            handshakes INTEGER,
+            hostname TEXT,
+            weight INTEGER NOT NULL DEFAULT 1,
+            max_connections INTEGER,
+            max_packets INTEGER
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_server ON servers (ip, port)",
+    ]
+    # Added to servers tables created before virtual-host routing.
+    _SERVER_MIGRATIONS = {
+        "hostname": "ALTER TABLE servers ADD COLUMN hostname TEXT",
+        "weight": "ALTER TABLE servers ADD COLUMN weight INTEGER NOT NULL DEFAULT 1",
+        "max_connections": "ALTER TABLE servers ADD COLUMN max_connections INTEGER",
+        "max_packets": "ALTER TABLE servers ADD COLUMN max_packets INTEGER",
+    }
+    _BATCH_INSERTS = {
+        "connections": "INSERT INTO connections (ip, server_id, timestamp, bucket) VALUES (?, ?, ?, ?)",
+        "packets": "INSERT INTO packets (ip, server_id, timestamp, bucket) VALUES (?, ?, ?, ?)",
+    }
+    _ROLLUP_UPSERT = (
+        "INSERT INTO {table} (server_id, ip, minute, count) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (server_id, ip, minute) DO UPDATE SET count = count + excluded.count"
+    )
+
+    def __init__(self, path: str = "dragon.db", cleanup_chunk_size: int = 5000, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.cleanup_chunk_size = cleanup_chunk_size
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+    def _run(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _open(self):
+        # Autocommit mode; writes open their own transaction.
+        conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    async def _connect(self):
+        self._conn = await self._run(self._open)
+
+    async def _disconnect(self):
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    async def _create_tables(self):
+        def create():
+            for statement in self._SCHEMA:
+                self._conn.execute(statement)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(servers)")}
+            for column, statement in self._SERVER_MIGRATIONS.items():
+                if column not in columns:
+                    self._conn.execute(statement)
+        await self._run(create)
+
+    def _write_sync(self, batches, handshakes):
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            for table, batch in batches.items():
+                conn.executemany(self._BATCH_INSERTS[table], batch)
+                if table in EVENT_TABLES:
+                    conn.executemany(self._ROLLUP_UPSERT.format(table=EVENT_TABLES[table]), self._rollup(batch))
+            if handshakes:
+                conn.executemany(
+                    "UPDATE servers SET handshakes = COALESCE(handshakes, 0) + ? WHERE ip = ? AND port = ?",
+                    [(count, ip, port) for (ip, port), count in handshakes.items()]
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def _write(self, batches, handshakes):
+        await self._run(self._write_sync, batches, handshakes)
+
+    def _write_blocks_sync(self, changes):
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO blocked_ips (ip, server_id) VALUES (?, ?)",
+                [(ip, server_id) for ip, server_id, blocked in changes if blocked]
+            )
+            conn.executemany(
+                "DELETE FROM blocked_ips WHERE ip = ? AND server_id = ?",
+                [(ip, server_id) for ip, server_id, blocked in changes if not blocked]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def _write_blocks(self, changes):
+        await self._run(self._write_blocks_sync, changes)
+
+    def _fetchall(self, query: str, params=()):
+        return self._conn.execute(query, params).fetchall()
+
+    def _execute(self, query: str, params=()) -> int:
+        return self._conn.execute(query, params).rowcount
+
+    async def list_blocked(self, server_id: int):
+        rows = await self._run(self._fetchall, "SELECT ip FROM blocked_ips WHERE server_id = ?", (server_id,))
+        return [row[0] for row in rows]
+
+    async def _rollup_count(self, table: str, server_id: int, ip: str = None, since: float = None):
+        query = f"SELECT COALESCE(SUM(count), 0) FROM {table} WHERE server_id = ?"
+        params = [server_id]
+        if ip is not None:
+            query += " AND ip = ?"
+            params.append(ip)
+        if since is not None:
+            query += " AND minute >= ?"
+            params.append(int(since // 60))
+        rows = await self._run(self._fetchall, query, params)
+        return int(rows[0][0])
+
+    async def get_server_id(self, ip: str, port: int):
+        rows = await self._run(self._fetchall, "SELECT id FROM servers WHERE ip = ? AND port = ? ORDER BY id LIMIT 1", (ip, port))
+        return rows[0][0] if rows else None
+
+    async def log_server(self, ip: str, port: int, hostname: str = None, weight: int = 1,
+                         max_connections: int = None, max_packets: int = None):
+        await self._run(
+            self._execute,
+            "INSERT INTO servers (ip, port, timestamp, hostname, weight, max_connections, max_packets) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (ip, port, time.time(), hostname, weight, max_connections, max_packets)
+        )
+
+    async def list_servers(self):
+        rows = await self._run(self._fetchall, f"SELECT {', '.join(SERVER_COLUMNS)} FROM servers ORDER BY id")
+        return [dict(zip(SERVER_COLUMNS, row)) for row in rows]
+
+    async def delete_server(self, server_id: int) -> bool:
+        return await self._run(self._execute, "DELETE FROM servers WHERE id = ?", (server_id,)) > 0
+
+    async def _delete_in_chunks(self, table: str, column: str, cutoff) -> int:
+        # One short transaction per chunk, so flushes can interleave.
+        query = f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {column} < ? LIMIT ?)"
+        deleted = 0
+        while True:
+            rows = await self._run(self._execute, query, (cutoff, self.cleanup_chunk_size))
+            deleted += rows
+            if rows < self.cleanup_chunk_size:
+                return deleted
+
+    async def cleanup_old_entries(self):
+        now = time.time()
+        removed = {}
+        for table, rollups in EVENT_TABLES.items():
+            removed[table] = await self._delete_in_chunks(table, "timestamp", now - self.retention)
+            removed[rollups] = await self._delete_in_chunks(rollups, "minute", int((now - self.rollup_retention) // 60))
+        return removed
@@ -0,0 +1,252 @@
+import asyncio
+import time
+
+from collections import defaultdict, deque
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+# Raw event tables and the per-minute rollups their counts are read from.
+EVENT_TABLES = {"connections": "connection_rollups", "packets": "packet_rollups"}
+BUCKET_SECONDS = 3600
+QUEUED_TABLES = ("connections", "packets")
+# What list_servers() returns per row. hostname is the virtual host routed to
+# the server (NULL for the default route); the limits override the proxy's.
+SERVER_COLUMNS = ("id", "ip", "port", "hostname", "weight", "max_connections", "max_packets")
+
+
+class StorageBackend:
+    """Everything the proxy persists, independent of where it goes.
+
+    Writes (connection/packet events, handshake counts) go through a
+    write-behind queue and reach the backend in batches via ``_write``;
+    the overflow policy only ever drops these. Blocks and unblocks are kept
+    apart, latest change per IP winning, and written via ``_write_blocks``
+    on the same flush; they are never dropped and are retried until they
+    land. Reads go straight to the backend. Subclasses implement the
+    underscore hooks and the query methods.
+    """
+
+    # Whether what is written survives a restart.
+    persistent = True
+
+    def __init__(self, refresh_tables: bool = False, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_queue: int = 50000, overflow_policy: str = "drop_oldest",
+                 retention: float = 3600, rollup_retention: float = 7 * 86400):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.refresh_tables = refresh_tables
+
+        # Write-behind queue: events are grouped per table and written in
+        # batches, handshake increments are merged per server.
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self._queues = {table: deque() for table in QUEUED_TABLES}
+        self._handshakes = defaultdict(int)
+        # (ip, server_id) -> True to block, False to unblock, oldest first.
+        self._block_changes = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_wakeup = asyncio.Event()
+        self._flushed = asyncio.Event()
+        self._flush_task = None
+        self._closing = False
+
+        self.flushed_events = 0
+        self.dropped_events = 0
+        self.flushes = 0
+        self.block_write_failures = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        # Set by DragonAegis.set_profiling; flush times go to its db_flush stage.
+        self.profiler = None
+
+        # Raw events are kept for ``retention`` seconds, rollups for ``rollup_retention``.
+        self.retention = retention
+        self.rollup_retention = rollup_retention
+
+    async def initialize(self):
+        await self._connect()
+        await self._create_tables()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        self._closing = True
+        self._flush_wakeup.set()
+        if self._flush_task:
+            await self._flush_task
+            self._flush_task = None
+        await self.flush()
+        if self._block_changes:
+            print(f"Database unavailable at shutdown, {len(self._block_changes)} block changes were not saved")
+        await self._disconnect()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values()) + len(self._handshakes)
+
+    def queue_stats(self) -> dict:
+        return {
+            "depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "flushed_events": self.flushed_events,
+            "dropped_events": self.dropped_events,
+            "flushes": self.flushes,
+            "pending_block_changes": len(self._block_changes),
+            "block_write_failures": self.block_write_failures,
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+        }
+
+    async def _enqueue(self, table: str, row: tuple):
+        queue = self._queues[table]
+        if self.queue_depth >= self.max_queue:
+            if self.overflow_policy == "block":
+                while self.queue_depth >= self.max_queue and not self._closing:
+                    self._flush_wakeup.set()
+                    self._flushed.clear()
+                    await self._flushed.wait()
+            elif self.overflow_policy == "drop_oldest" and queue:
+                queue.popleft()
+                self.dropped_events += 1
+            else:
+                self.dropped_events += 1
+                return
+        queue.append(row)
+        if self.queue_depth >= self.batch_size:
+            self._flush_wakeup.set()
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            await self._flush_blocks()
+            batches = {}
+            for table, queue in self._queues.items():
+                if queue:
+                    batches[table] = list(queue)
+                    queue.clear()
+            handshakes, self._handshakes = self._handshakes, defaultdict(int)
+            if not batches and not handshakes:
+                return
+
+            rows = sum(len(batch) for batch in batches.values()) + len(handshakes)
+            started = time.perf_counter()
+            try:
+                await self._write(batches, handshakes)
+                self.flushed_events += rows
+            except Exception as e:
+                self.dropped_events += rows
+                print(f"Database flush failed, dropped {rows} events: {e}")
+            finally:
+                self.last_flush_latency = time.perf_counter() - started
+                self.max_flush_latency = max(self.max_flush_latency, self.last_flush_latency)
+                if self.profiler is not None:
+                    self.profiler.record("db_flush", int(self.last_flush_latency * 1e9))
+                self.flushes += 1
+                self._flushed.set()
+
+    @staticmethod
+    def _rollup(batch):
+        counts = defaultdict(int)
+        for ip, server_id, timestamp, _ in batch:
+            counts[(server_id, ip, int(timestamp // 60))] += 1
+        return [(server_id, ip, minute, count) for (server_id, ip, minute), count in counts.items()]
+
+    async def _flush_blocks(self):
+        changes, self._block_changes = self._block_changes, {}
+        if not changes:
+            return
+        try:
+            await self._write_blocks([(ip, server_id, blocked) for (ip, server_id), blocked in changes.items()])
+        except Exception as e:
+            # Retried on the next flush; anything changed meanwhile is newer and wins.
+            for key, blocked in self._block_changes.items():
+                changes.pop(key, None)
+                changes[key] = blocked
+            self._block_changes = changes
+            self.block_write_failures += 1
+            print(f"Database flush failed, {len(changes)} block changes will be retried: {e}")
+
+    def _change_block(self, ip: str, server_id: int, blocked: bool):
+        # Re-inserted so the dict stays in the order the changes were made.
+        self._block_changes.pop((ip, server_id), None)
+        self._block_changes[ip, server_id] = blocked
+        self._flush_wakeup.set()
+
+    async def block_ip(self, ip: str, server_id: int):
+        self._change_block(ip, server_id, True)
+
+    async def unblock_ip(self, ip: str, server_id: int):
+        self._change_block(ip, server_id, False)
+
+    async def log_connection(self, ip: str, server_id: int):
+        now = time.time()
+        await self._enqueue("connections", (ip, server_id, now, int(now // BUCKET_SECONDS)))
+
+    async def log_packet(self, ip: str, server_id: int):
+        now = time.time()
+        await self._enqueue("packets", (ip, server_id, now, int(now // BUCKET_SECONDS)))
+
+    async def increment_handshakes(self, ip: str, port: int):
+        self._handshakes[(ip, port)] += 1
+        if self.queue_depth >= self.batch_size:
+            self._flush_wakeup.set()
+
+    async def get_connection_count(self, address, since: float = None):
+        """Connections to the server at ``address`` (ip, port), from the rollups."""
+        server_id = await self.get_server_id(ip=address[0], port=int(address[1]))
+        return await self._rollup_count("connection_rollups", server_id, since=since)
+
+    async def get_packet_count(self, ip: str, server_id: int, since: float = None):
+        return await self._rollup_count("packet_rollups", server_id, ip=ip, since=since)
+
+    # Backend hooks.
+
+    async def _connect(self):
+        raise NotImplementedError
+
+    async def _disconnect(self):
+        raise NotImplementedError
+
+    async def _create_tables(self):
+        raise NotImplementedError
+
+    async def _write(self, batches: dict, handshakes: dict):
+        """Persist queued rows per table and merged handshake increments per (ip, port)."""
+        raise NotImplementedError
+
+    async def _write_blocks(self, changes):
+        """Apply ``[(ip, server_id, blocked), ...]``, at most one per IP and server; must be idempotent."""
+        raise NotImplementedError
+
+    async def _rollup_count(self, table: str, server_id: int, ip: str = None, since: float = None) -> int:
+        raise NotImplementedError
+
+    async def list_blocked(self, server_id: int):
+        raise NotImplementedError
+
+    async def get_server_id(self, ip: str, port: int):
+        raise NotImplementedError
+
+    async def log_server(self, ip: str, port: int, hostname: str = None, weight: int = 1,
+                         max_connections: int = None, max_packets: int = None):
+        raise NotImplementedError
+
+    async def list_servers(self):
+        """Every server as a dict keyed by ``SERVER_COLUMNS``."""
+        raise NotImplementedError
+
+    async def delete_server(self, server_id: int) -> bool:
+        """Whether a server with that id existed."""
+        raise NotImplementedError
+
+    async def cleanup_old_entries(self):
+        raise NotImplementedError
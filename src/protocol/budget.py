@@ -0,0 +1,89 @@
+import itertools
+
+# How far along a connection is; lower stages are shed first.
+STAGES = {"handshake": 0, "status": 1, "login": 1, "play": 2}
+
+
+class ByteBudget:
+    """Process-wide cap on bytes held in per-connection receive buffers.
+
+    Each connection reports how many undecoded bytes it is holding. A single
+    connection over ``connection_limit`` is refused outright; once the total
+    goes over ``limit``, connections are aborted until usage is back under
+    ``shed_to`` of the limit, least-progressed first and newest first within
+    a stage. Only connections actually holding bytes are candidates.
+    """
+
+    def __init__(self, limit: int = 64 * 1024 * 1024, connection_limit: int = 512 * 1024, shed_to: float = 0.9):
+        self.limit = limit
+        self.connection_limit = connection_limit
+        self.shed_to = shed_to
+        self.used = 0
+        self.peak = 0
+        self.shed = 0
+        self.refused = 0
+        # token -> [used, stage, sequence, abort]
+        self._holders = {}
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self._holders)
+
+    def register(self, abort, stage: str = "handshake") -> int:
+        token = next(self._sequence)
+        self._holders[token] = [0, STAGES[stage], token, abort]
+        return token
+
+    def set_stage(self, token: int, stage: str) -> None:
+        holder = self._holders.get(token)
+        if holder is not None:
+            holder[1] = STAGES[stage]
+
+    def update(self, token: int, size: int) -> bool:
+        """Record that ``token`` now holds ``size`` bytes; ``False`` means drop it."""
+        holder = self._holders.get(token)
+        if holder is None:
+            return False
+        if size > self.connection_limit:
+            self.refused += 1
+            self.release(token)
+            return False
+        self.used += size - holder[0]
+        holder[0] = size
+        if self.used > self.peak:
+            self.peak = self.used
+        if self.used > self.limit:
+            self._shed()
+        return token in self._holders
+
+    def release(self, token: int) -> None:
+        holder = self._holders.pop(token, None)
+        if holder is not None:
+            self.used -= holder[0]
+
+    def _shed(self) -> None:
+        target = self.limit * self.shed_to
+        candidates = sorted(
+            (holder for holder in self._holders.values() if holder[0]),
+            key=lambda holder: (holder[1], -holder[2])
+        )
+        for used, _, token, abort in candidates:
+            if self.used <= target:
+                break
+            del self._holders[token]
+            self.used -= used
+            self.shed += 1
+            abort()
+
+    def stats(self) -> dict:
+        holding = sum(1 for holder in self._holders.values() if holder[0])
+        return {
+            "used": self.used,
+            "limit": self.limit,
+            "connection_limit": self.connection_limit,
+            "peak": self.peak,
+            "connections": len(self._holders),
+            "holding": holding,
+            "shed": self.shed,
+            "refused": self.refused,
+        }
@@ -0,0 +1,185 @@
+from typing import NamedTuple
+
+# Minecraft caps the frame length prefix at 3 bytes.
+MAX_FRAME_SIZE = 2097151
+
+
+class FrameError(ValueError):
+    pass
+
+
+class Frame(NamedTuple):
+    packet_id: int
+    data: memoryview
+    payload_offset: int
+
+    @property
+    def payload(self) -> memoryview:
+        return self.data[self.payload_offset:]
+
+
+# Skips the generated NamedTuple __new__, which is measurable per frame.
+_new_frame = tuple.__new__
+
+
+def read_varint(buf, offset: int = 0, end: int = None, max_bytes: int = 5):
+    """Decode a VarInt from ``buf`` starting at ``offset``.
+
+    Returns ``(value, next_offset)``, or ``(None, offset)`` if the VarInt is
+    not complete yet. ``buf`` can be anything indexable as ints (bytes,
+    bytearray or memoryview), nothing is sliced or copied.
+    """
+    if end is None:
+        end = len(buf)
+    value = 0
+    shift = 0
+    pos = offset
+    limit = offset + max_bytes
+    while pos < end:
+        byte = buf[pos]
+        value |= (byte & 0x7F) << shift
+        pos += 1
+        if not byte & 0x80:
+            return value, pos
+        if pos >= limit:
+            raise FrameError("VarInt is too long")
+        shift += 7
+    return None, offset
+
+
+class FrameDecoder:
+    """Incremental decoder for length-prefixed Minecraft frames.
+
+    Incoming data is copied once into a reusable buffer and frames are handed
+    out as memoryviews into it, so they are only valid until the next
+    ``feed()``. The unread tail is moved to the front only when the buffer
+    runs out of room and the consumed prefix is at least as large as what is
+    left, otherwise the buffer is grown.
+    """
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE, initial_size: int = 16384):
+        self.max_frame_size = max_frame_size
+        self._buf = bytearray(initial_size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buf)
+
+    def feed(self, data) -> None:
+        size = len(data)
+        if self._start == self._end:
+            self._start = self._end = 0
+        if self._end + size > len(self._buf):
+            self._make_room(size)
+        # Same-length slice assignment never resizes, so outstanding views stay legal.
+        self._buf[self._end:self._end + size] = data
+        self._end += size
+
+    def _make_room(self, size: int) -> None:
+        pending = self._end - self._start
+        needed = pending + size
+        if needed <= len(self._buf) and self._start >= pending:
+            self._buf[:pending] = self._view[self._start:self._end]
+        else:
+            capacity = len(self._buf)
+            while capacity < needed:
+                capacity *= 2
+            buf = bytearray(capacity)
+            buf[:pending] = self._view[self._start:self._end]
+            self._buf = buf
+            self._view = memoryview(buf)
+        self._start = 0
+        self._end = pending
+
+    def take_pending(self) -> bytes:
+        """Remove and return whatever has been fed but not decoded yet."""
+        pending = bytes(self._view[self._start:self._end])
+        self._start = self._end = 0
+        return pending
+
+    def next_frame(self):
+        """Return the next complete :class:`Frame`, or ``None`` if more data is needed."""
+        buf = self._buf
+        start = self._start
+        end = self._end
+        if start >= end:
+            return None
+        length = buf[start]
+        if length < 0x80:
+            body_start = start + 1
+        else:
+            length, body_start = read_varint(buf, start, end, max_bytes=3)
+            if length is None:
+                return None
+        if length == 0:
+            raise FrameError("Empty frame")
+        if length > self.max_frame_size:
+            raise FrameError(f"Frame of {length} bytes exceeds limit of {self.max_frame_size}")
+        frame_end = body_start + length
+        if frame_end > end:
+            return None
+        packet_id = buf[body_start]
+        if packet_id < 0x80:
+            payload_start = body_start + 1
+        else:
+            packet_id, payload_start = read_varint(buf, body_start, frame_end)
+            if packet_id is None:
+                raise FrameError("Truncated packet id")
+        self._start = frame_end
+        return _new_frame(Frame, (packet_id, self._view[start:frame_end], payload_start - start))
+
+    def __iter__(self):
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+
+
+class FrameCounter:
+    """Counts frames in a byte stream by walking only the length prefixes.
+
+    Nothing is buffered: the counter remembers how far into the next chunk
+    the current frame body extends and any partially read length prefix.
+    A frame is counted as soon as its length prefix is complete.
+    """
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._skip = 0
+        self._length = 0
+        self._shift = 0
+
+    def count(self, data) -> int:
+        end = len(data)
+        pos = self._skip
+        length = self._length
+        shift = self._shift
+        frames = 0
+        while pos < end:
+            byte = data[pos]
+            pos += 1
+            length |= (byte & 0x7F) << shift
+            if byte & 0x80:
+                shift += 7
+                if shift >= 21:
+                    raise FrameError("VarInt is too long")
+                continue
+            if length == 0:
+                raise FrameError("Empty frame")
+            if length > self.max_frame_size:
+                raise FrameError(f"Frame of {length} bytes exceeds limit of {self.max_frame_size}")
+            frames += 1
+            pos += length
+            length = 0
+            shift = 0
+        self._skip = pos - end
+        self._length = length
+        self._shift = shift
+        return frames
@@ -0,0 +1,27 @@
+def encode_varint(value: int) -> bytes:
+    # Negative values are sent as their 32-bit two's complement, like Java does.
+    value &= 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def encode_string(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return encode_varint(len(data)) + data
+
+
+def encode_frame(packet_id: int, payload=b"") -> bytes:
+    body = encode_varint(packet_id) + bytes(payload)
+    return encode_varint(len(body)) + body
+
+
+def encode_handshake(host: str, port: int, next_state: int, protocol_version: int = -1) -> bytes:
+    payload = encode_varint(protocol_version) + encode_string(host) + port.to_bytes(2, "big") + encode_varint(next_state)
+    return encode_frame(0x00, payload)
@@ -0,0 +1,68 @@
+import zlib
+
+from src.protocol.decoder import FrameDecoder, FrameError, read_varint
+
+# Clientbound login packets that change how the rest of the stream is framed.
+DISCONNECT = 0x00
+ENCRYPTION_REQUEST = 0x01
+LOGIN_SUCCESS = 0x02
+SET_COMPRESSION = 0x03
+
+
+class LoginWatcher:
+    """Follows the server's side of the login phase until the framing settles.
+
+    After Encryption Request both directions are ciphertext, so nothing can
+    be walked as frames any more; that sets ``encrypted``. Set Compression
+    is tracked so the packet id of later login packets can still be read;
+    ``compression_start`` is how many bytes into the stream it took effect.
+    Login Success, a disconnect, anything unparseable or more than
+    ``max_bytes`` of login traffic ends the watch (``done``).
+    """
+
+    def __init__(self, max_bytes: int = 65536):
+        self.max_bytes = max_bytes
+        self.encrypted = False
+        self.done = False
+        self._compressed = False
+        self.compression_start = None
+        self.seen = 0
+        self._decoder = FrameDecoder(initial_size=1024)
+
+    def feed(self, data) -> None:
+        if self.done:
+            return
+        self.seen += len(data)
+        self._decoder.feed(data)
+        try:
+            for frame in self._decoder:
+                self._packet(frame)
+                if self.done:
+                    break
+        except (FrameError, zlib.error):
+            self.done = True
+        if self.seen > self.max_bytes:
+            self.done = True
+        if self.done:
+            self._decoder = None
+
+    def _packet(self, frame) -> None:
+        packet_id, payload = frame.packet_id, frame.payload
+        if self._compressed:
+            # The "packet id" is really the uncompressed length; 0 means sent as is.
+            if packet_id:
+                payload = zlib.decompressobj().decompress(payload, 10)
+            packet_id, offset = read_varint(payload)
+            if packet_id is None:
+                raise FrameError("Truncated packet id")
+            payload = payload[offset:]
+        if packet_id == ENCRYPTION_REQUEST:
+            self.encrypted = True
+            self.done = True
+        elif packet_id == SET_COMPRESSION:
+            threshold, _ = read_varint(payload)
+            self._compressed = threshold is not None and threshold < 1 << 31
+            if self._compressed and self.compression_start is None:
+                self.compression_start = self.seen - len(self._decoder)
+        elif packet_id in (LOGIN_SUCCESS, DISCONNECT):
+            self.done = True
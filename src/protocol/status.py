@@ -0,0 +1,100 @@
+import asyncio
+import json
+import time
+
+from src.protocol.decoder import FrameDecoder, read_varint
+from src.protocol.encoder import encode_frame, encode_handshake, encode_string
+
+FALLBACK_STATUS = {
+    "version": {"name": "DragonAegis", "protocol": -1},
+    "players": {"max": 0, "online": 0},
+    "description": {"text": "Server unavailable"},
+}
+
+
+class StatusCache:
+    """Server-list status served by the proxy instead of the backend.
+
+    The backend is asked at most once per ``refresh_interval``. Once the cached
+    response is older than that it is still served while one background
+    refresh runs (stale-while-revalidate); only past ``max_stale`` do callers
+    wait for a fresh one. Concurrent refreshes share a single in-flight fetch.
+    """
+
+    def __init__(self, host: str, port: int, refresh_interval: float = 5.0, max_stale: float = 60.0, timeout: float = 3.0):
+        self.host = host
+        self.port = port
+        self.refresh_interval = refresh_interval
+        self.max_stale = max_stale
+        self.timeout = timeout
+        self.status_json = None
+        self.fetched_at = None
+        self.last_error = None
+        self.refreshes = 0
+        self.served = 0
+        self._response = None
+        self._inflight = None
+        self._fallback = encode_frame(0x00, encode_string(json.dumps(FALLBACK_STATUS)))
+
+    async def get(self) -> bytes:
+        """Return a complete Status Response frame."""
+        self.served += 1
+        if self._response is not None:
+            age = time.monotonic() - self.fetched_at
+            if age < self.refresh_interval:
+                return self._response
+            refresh = self._refresh()
+            if age < self.max_stale:
+                return self._response
+        else:
+            refresh = self._refresh()
+        try:
+            return await asyncio.shield(refresh)
+        except Exception:
+            return self._response or self._fallback
+
+    def _refresh(self) -> asyncio.Future:
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch())
+            self._inflight.add_done_callback(self._refresh_done)
+        return self._inflight
+
+    def _refresh_done(self, task):
+        self._inflight = None
+        if not task.cancelled() and task.exception() is not None:
+            error = str(task.exception()) or type(task.exception()).__name__
+            if error != self.last_error:
+                print(f"Status refresh from {self.host}:{self.port} failed: {error}")
+            self.last_error = error
+
+    async def _fetch(self) -> bytes:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        try:
+            writer.write(encode_handshake(self.host, self.port, 1) + encode_frame(0x00))
+            await writer.drain()
+            frame = await asyncio.wait_for(self._read_response(reader), self.timeout)
+        finally:
+            writer.close()
+
+        length, offset = read_varint(frame.payload)
+        if length is None:
+            raise ValueError("Malformed status response")
+        self.status_json = str(frame.payload[offset:offset + length], "utf-8")
+        self._response = bytes(frame.data)
+        self.fetched_at = time.monotonic()
+        self.last_error = None
+        self.refreshes += 1
+        return self._response
+
+    async def _read_response(self, reader):
+        decoder = FrameDecoder()
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                raise ConnectionError("Backend closed before sending status")
+            decoder.feed(data)
+            frame = decoder.next_frame()
+            if frame is not None:
+                if frame.packet_id != 0x00:
+                    raise ValueError(f"Unexpected status packet 0x{frame.packet_id:02x}")
+                return frame
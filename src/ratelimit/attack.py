@@ -0,0 +1,164 @@
+import time
+
+from collections import deque
+
+from src.ratelimit.limiter import TokenBucketLimiter
+
+
+class RecentSet:
+    """Membership over roughly the last ``ttl`` seconds in bounded memory.
+
+    Two generations of plain sets: lookups check both, inserts go to the
+    young one, and the old one is dropped once the young one is ``ttl``
+    old or holds ``max_keys`` entries, the same scheme the rate limiters use.
+    """
+
+    def __init__(self, ttl: float, max_keys: int):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._young = set()
+        self._old = set()
+        self._rotated = time.monotonic()
+
+    def __contains__(self, key):
+        return key in self._young or key in self._old
+
+    def __len__(self):
+        return len(self._young) + len(self._old)
+
+    def generations(self):
+        return self._young.copy(), self._old.copy()
+
+    def restore(self, old, rotated_at: float):
+        self._young = set()
+        self._old = old
+        self._rotated = rotated_at
+
+    def add(self, key, now: float = None) -> bool:
+        """Insert ``key``; returns ``True`` if it was not already present."""
+        if key in self._young:
+            return False
+        if now is None:
+            now = time.monotonic()
+        if len(self._young) >= self.max_keys or now - self._rotated >= self.ttl:
+            self._old = self._young
+            self._young = set()
+            self._rotated = now
+        is_new = key not in self._old
+        self._young.add(key)
+        return is_new
+
+
+class AttackDetector:
+    """Flips the proxy into attack mode and back from connection statistics.
+
+    Every ``evaluate()`` tick looks at the connection rate, the rate of IPs
+    not seen in the last ``seen_ttl`` seconds and the share of handshakes
+    that failed. Attack mode starts once any signal is over its threshold
+    for ``enter_after`` ticks in a row and ends once all of them are below
+    ``calm_factor`` of their thresholds for ``exit_after`` ticks in a row.
+
+    In attack mode only IPs that completed a login within ``good_ttl`` are
+    admitted normally; everyone else shares ``unknown_rate`` admissions per
+    second and is rejected before anything is parsed.
+    """
+
+    def __init__(self, connection_rate: float = 200, new_ip_rate: float = 100, failure_ratio: float = 0.6,
+                 min_handshakes: int = 20, enter_after: int = 2, exit_after: int = 30, calm_factor: float = 0.5,
+                 unknown_rate: int = 5, seen_ttl: float = 300, good_ttl: float = 3600, max_keys: int = 200_000):
+        self.connection_rate = connection_rate
+        self.new_ip_rate = new_ip_rate
+        self.failure_ratio = failure_ratio
+        self.min_handshakes = min_handshakes
+        self.enter_after = enter_after
+        self.exit_after = exit_after
+        self.calm_factor = calm_factor
+        self.active = False
+        self.since = time.monotonic()
+        self.transitions = deque(maxlen=50)
+        self.signals = {"connection_rate": 0.0, "new_ip_rate": 0.0, "failure_ratio": 0.0}
+        self.seen_ips = RecentSet(seen_ttl, max_keys)
+        self.good_ips = RecentSet(good_ttl, max_keys)
+        self._unknown = TokenBucketLimiter(unknown_rate, 1, max_keys=1)
+        self._streak = 0
+        self._connections = 0
+        self._new_ips = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._last = self.since
+
+    def record_connection(self, ip) -> None:
+        self._connections += 1
+        if self.seen_ips.add(ip):
+            self._new_ips += 1
+
+    def record_success(self, ip=None) -> None:
+        """A handshake that ended well; with ``ip``, it also logged in."""
+        self._succeeded += 1
+        if ip is not None:
+            self.good_ips.add(ip)
+
+    def record_failure(self) -> None:
+        self._failed += 1
+
+    def admit(self, ip) -> bool:
+        """The attack-mode gate: known-good IPs, then a trickle of everyone else."""
+        return ip in self.good_ips or self._unknown.allow("unknown")
+
+    def evaluate(self, now: float = None) -> bool:
+        """Update the signals for the ticks since the last call; returns ``True`` on a transition."""
+        if now is None:
+            now = time.monotonic()
+        elapsed = now - self._last
+        # Rates over a sliver of a second are noise; keep accumulating.
+        if elapsed < 0.5:
+            return False
+        handshakes = self._succeeded + self._failed
+        signals = {
+            "connection_rate": self._connections / elapsed,
+            "new_ip_rate": self._new_ips / elapsed,
+            "failure_ratio": self._failed / handshakes if handshakes >= self.min_handshakes else 0.0,
+        }
+        self.signals = signals
+        self._connections = self._new_ips = self._succeeded = self._failed = 0
+        self._last = now
+
+        thresholds = {
+            "connection_rate": self.connection_rate,
+            "new_ip_rate": self.new_ip_rate,
+            "failure_ratio": self.failure_ratio,
+        }
+        if not self.active:
+            hot = [name for name, value in signals.items() if value >= thresholds[name]]
+            self._streak = self._streak + 1 if hot else 0
+            if self._streak >= self.enter_after:
+                self._transition(True, ", ".join(f"{name}={signals[name]:.2f}" for name in hot), now)
+                return True
+        else:
+            calm = all(value < thresholds[name] * self.calm_factor for name, value in signals.items())
+            self._streak = self._streak + 1 if calm else 0
+            if self._streak >= self.exit_after:
+                self._transition(False, f"calm for {self.exit_after} ticks", now)
+                return True
+        return False
+
+    def _transition(self, active: bool, reason: str, now: float) -> None:
+        self.active = active
+        self.since = now
+        self._streak = 0
+        self.transitions.append({"time": time.time(), "active": active, "reason": reason})
+        print(f"Attack mode {'enabled' if active else 'disabled'}: {reason}")
+
+    def describe(self) -> dict:
+        return {
+            "active": self.active,
+            "for_seconds": round(time.monotonic() - self.since, 1),
+            "signals": {name: round(value, 3) for name, value in self.signals.items()},
+            "thresholds": {
+                "connection_rate": self.connection_rate,
+                "new_ip_rate": self.new_ip_rate,
+                "failure_ratio": self.failure_ratio,
+            },
+            "known_good_ips": len(self.good_ips),
+            "transitions": list(self.transitions),
+        }
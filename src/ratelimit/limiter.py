@@ -0,0 +1,177 @@
+import time
+
+
+class RateLimiter:
+    """Base class for the per-key limiters.
+
+    State for every key is packed into a single int so a million tracked IPs
+    stay in the low hundreds of megabytes. Keys live in two generations: a key
+    that is not touched for a whole generation is dropped on the next rotation.
+    A generation rotates when it fills half of ``max_keys`` or when
+    ``idle_timeout`` seconds have passed, whichever comes first. An evicted key
+    simply starts over with a full allowance.
+    """
+
+    def __init__(self, limit: int, interval: float, max_keys: int = 1_000_000, idle_timeout: float = None):
+        if limit <= 0 or interval <= 0:
+            raise ValueError("limit and interval must be positive")
+        self.limit = limit
+        self.interval = interval
+        self.max_keys = max(2, max_keys)
+        self.idle_timeout = max(idle_timeout or interval * 2, interval)
+        self._young = {}
+        self._old = {}
+        self._rotated_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._young) + len(self._old)
+
+    def __contains__(self, key):
+        return key in self._young or key in self._old
+
+    def clear(self):
+        self._young.clear()
+        self._old.clear()
+
+    def generations(self):
+        """``(young, old)`` copies for a snapshot; the old one may be shared if read-only."""
+        return self._young.copy(), self._old.copy()
+
+    def restore(self, old, rotated_at: float):
+        """Start over with ``old`` as the old generation, rotated at ``rotated_at``."""
+        self._young = {}
+        self._old = old
+        self._rotated_at = rotated_at
+
+    def clock_base(self, now: float) -> int:
+        """The packed-state offset of ``now``; subtracting it makes states clock-independent."""
+        return self._clock(now) << self._CLOCK_SHIFT
+
+    def _clock(self, now: float) -> int:
+        raise NotImplementedError
+
+    def _rotate(self, now: float):
+        self._old = self._young
+        self._young = {}
+        self._rotated_at = now
+
+    def _load(self, key, now: float):
+        if len(self._young) >= self.max_keys // 2 or now - self._rotated_at >= self.idle_timeout:
+            self._rotate(now)
+        state = self._young.get(key)
+        if state is None:
+            state = self._old.pop(key, None)
+        return state
+
+    def allow(self, key, now: float = None, cost: int = 1, charge: bool = True) -> bool:
+        """Whether ``cost`` more fits under the limit; it is only used up if ``charge`` and allowed."""
+        raise NotImplementedError
+
+    def peek(self, key, now: float = None) -> float:
+        raise NotImplementedError
+
+
+class TokenBucketLimiter(RateLimiter):
+    """Allows bursts of ``limit`` refilled at ``limit / interval`` per second.
+
+    State layout: ``(last_refill_ms << 32) | milli_tokens``.
+    """
+
+    _TOKEN_MASK = (1 << 32) - 1
+    _CLOCK_SHIFT = 32
+
+    def __init__(self, limit: int, interval: float, **kwargs):
+        super().__init__(limit, interval, **kwargs)
+        self._capacity = min(limit * 1000, self._TOKEN_MASK)
+        # milli-tokens per millisecond
+        self._refill_per_ms = limit / interval
+
+    def _clock(self, now: float) -> int:
+        return int(now * 1000)
+
+    def _refill(self, state, now_ms: int) -> int:
+        if state is None:
+            return self._capacity
+        elapsed = now_ms - (state >> 32)
+        tokens = (state & self._TOKEN_MASK) + int(elapsed * self._refill_per_ms)
+        return tokens if tokens < self._capacity else self._capacity
+
+    def allow(self, key, now: float = None, cost: int = 1, charge: bool = True) -> bool:
+        if now is None:
+            now = time.monotonic()
+        now_ms = int(now * 1000)
+        tokens = self._refill(self._load(key, now), now_ms)
+        allowed = tokens >= cost * 1000
+        if allowed and charge:
+            tokens -= cost * 1000
+        self._young[key] = (now_ms << 32) | tokens
+        return allowed
+
+    def peek(self, key, now: float = None) -> float:
+        if now is None:
+            now = time.monotonic()
+        state = self._young.get(key)
+        if state is None:
+            state = self._old.get(key)
+        tokens = self._refill(state, int(now * 1000))
+        return self.limit - tokens / 1000.0
+
+
+class SlidingWindowLimiter(RateLimiter):
+    """Sliding-window counter: weights the previous fixed window by how much of
+    it still overlaps the sliding one.
+
+    State layout: ``(window << 40) | (previous << 20) | current``.
+    """
+
+    _COUNT_BITS = 20
+    _COUNT_MASK = (1 << 20) - 1
+    _CLOCK_SHIFT = 40
+
+    def _clock(self, now: float) -> int:
+        return int(now / self.interval)
+
+    def _estimate(self, state, now: float):
+        window = int(now / self.interval)
+        if state is None:
+            return window, 0, 0, 0.0
+        last_window = state >> 40
+        previous = (state >> self._COUNT_BITS) & self._COUNT_MASK
+        current = state & self._COUNT_MASK
+        if window != last_window:
+            previous = current if window == last_window + 1 else 0
+            current = 0
+        overlap = 1.0 - (now / self.interval - window)
+        return window, previous, current, previous * overlap + current
+
+    def allow(self, key, now: float = None, cost: int = 1, charge: bool = True) -> bool:
+        if now is None:
+            now = time.monotonic()
+        window, previous, current, estimate = self._estimate(self._load(key, now), now)
+        allowed = estimate + cost - 1 < self.limit
+        if allowed and charge:
+            current = min(current + cost, self._COUNT_MASK)
+        self._young[key] = (window << 40) | (previous << self._COUNT_BITS) | current
+        return allowed
+
+    def peek(self, key, now: float = None) -> float:
+        if now is None:
+            now = time.monotonic()
+        state = self._young.get(key)
+        if state is None:
+            state = self._old.get(key)
+        return self._estimate(state, now)[3]
+
+
+LIMITER_MODES = {
+    "token_bucket": TokenBucketLimiter,
+    "sliding_window": SlidingWindowLimiter,
+}
+
+
+def create_limiter(mode: str, limit: int, interval: float, **kwargs) -> RateLimiter:
+    try:
+        limiter_cls = LIMITER_MODES[mode]
+    except KeyError:
+        raise ValueError(f"Unknown limiter mode: {mode}") from None
+    return limiter_cls(limit, interval, **kwargs)
@@ -0,0 +1,105 @@
+import mmap
+import struct
+import time
+
+from multiprocessing import Lock
+
+# fingerprint, window, previous count, current count
+_SLOT = struct.Struct("=QQII")
+_BUCKET = 4
+_MASK64 = (1 << 64) - 1
+_COUNT_MAX = (1 << 32) - 1
+
+
+def _fingerprint(key) -> int:
+    return ((hash(key) * 0x9E3779B97F4A7C15) & _MASK64) or 1
+
+
+class SharedCounterTable:
+    """Sliding-window counters in anonymous shared memory.
+
+    Created before the workers fork so every process maps the same pages.
+    Keys hash to a bucket of four slots guarded by one of ``stripes`` locks;
+    a key takes its own slot, an empty or stale one, or evicts the slot with
+    the oldest window. Counts are exact per key as long as the table is not
+    overcommitted, after which the least recently active keys lose history.
+    """
+
+    def __init__(self, slots: int = 1 << 20, stripes: int = 64):
+        self.buckets = max(1, slots // _BUCKET)
+        self.slots = self.buckets * _BUCKET
+        self._mem = mmap.mmap(-1, self.slots * _SLOT.size, flags=mmap.MAP_SHARED)
+        self._locks = [Lock() for _ in range(stripes)]
+
+    def __len__(self):
+        fingerprints = memoryview(self._mem).cast("Q")[0::_SLOT.size // 8]
+        return sum(1 for fingerprint in fingerprints if fingerprint)
+
+    def charge(self, fingerprint: int, now: float, interval: float, limit: int, cost: int = 1, commit: bool = True) -> bool:
+        window = int(now / interval)
+        bucket = (fingerprint >> 20) % self.buckets
+        base = bucket * _BUCKET * _SLOT.size
+        mem = self._mem
+        unpack_from = _SLOT.unpack_from
+
+        with self._locks[bucket % len(self._locks)]:
+            found = None
+            free = None
+            oldest = None
+            oldest_window = None
+            for i in range(_BUCKET):
+                offset = base + i * _SLOT.size
+                slot_fingerprint, slot_window, previous, current = unpack_from(mem, offset)
+                if slot_fingerprint == fingerprint:
+                    found = offset
+                    break
+                if free is None and (slot_fingerprint == 0 or slot_window + 1 < window):
+                    free = offset
+                if oldest_window is None or slot_window < oldest_window:
+                    oldest, oldest_window = offset, slot_window
+
+            if found is not None:
+                offset = found
+                if slot_window != window:
+                    previous = current if slot_window + 1 == window else 0
+                    current = 0
+            else:
+                offset = free if free is not None else oldest
+                previous = current = 0
+
+            estimate = previous * (1.0 - (now / interval - window)) + current
+            allowed = estimate + cost - 1 < limit
+            if allowed and commit:
+                current = min(current + cost, _COUNT_MAX)
+            _SLOT.pack_into(mem, offset, fingerprint, window, previous, current)
+        return allowed
+
+    def limiter(self, limit: int, interval: float, tag: str) -> "SharedWindowLimiter":
+        return SharedWindowLimiter(self, limit, interval, tag)
+
+    def limiter_factory(self, mode: str, limit: int, interval: float, max_keys: int, tag: str) -> "SharedWindowLimiter":
+        # Matches the signature SubnetLimiter uses to build its levels; the
+        # shared table only implements the sliding-window counter.
+        return self.limiter(limit, interval, tag)
+
+
+class SharedWindowLimiter:
+    """Sliding-window limiter backed by a :class:`SharedCounterTable`."""
+
+    def __init__(self, table: SharedCounterTable, limit: int, interval: float, tag: str):
+        if limit <= 0 or interval <= 0:
+            raise ValueError("limit and interval must be positive")
+        self.table = table
+        self.limit = limit
+        self.interval = interval
+        self.tag = tag
+        self._salt = _fingerprint(tag)
+
+    def __len__(self):
+        return len(self.table)
+
+    def allow(self, key, now: float = None, cost: int = 1, charge: bool = True) -> bool:
+        if now is None:
+            now = time.monotonic()
+        fingerprint = (_fingerprint(key) ^ self._salt) or 1
+        return self.table.charge(fingerprint, now, self.interval, self.limit, cost, charge)
@@ -0,0 +1,204 @@
+import heapq
+import ipaddress
+import time
+
+from src.blocklist.index import parse_address
+from src.ratelimit.limiter import RateLimiter, create_limiter
+
+DEFAULT_V4_LIMITS = {32: 5, 24: 20, 16: 100}
+DEFAULT_V6_LIMITS = {128: 5, 64: 10, 48: 100}
+# Broader prefixes are limited but never banned on their own: one noisy
+# /24 should not take a whole provider's /16 offline for ban_duration.
+DEFAULT_MIN_BAN_PREFIX = {4: 24, 6: 48}
+
+
+def parse_prefix_limits(text: str) -> dict:
+    """``"24:20,16:100"`` -> ``{24: 20, 16: 100}``; an empty string means no subnet levels."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        length, _, limit = item.partition(":")
+        limits[int(length.strip().lstrip("/"))] = int(limit)
+    return limits
+
+
+def _local_limiter(mode, limit, interval, max_keys, tag):
+    return create_limiter(mode, limit, interval, max_keys=max_keys)
+
+
+class SubnetLimiter:
+    """Hierarchical rate limits over IPv4/IPv6 prefixes.
+
+    Each configured prefix length gets its own limiter keyed by a packed int
+    ``(prefix << 8 | length) << 1 | is_v6``. A check parses the address once
+    and looks at every level before charging any, so a connection denied by
+    one level (its own or a broader one) uses up nothing.
+
+    A prefix that keeps tripping its limit (``ban_threshold`` denials within
+    ``interval``) is promoted to a temporary ban for ``ban_duration`` seconds,
+    unless it is broader than ``min_ban_prefix`` (``{4: length, 6: length}``).
+    Bans are checked in the same pass and capped at ``max_bans``; when full,
+    the ban closest to expiry is dropped first.
+    """
+
+    def __init__(self, interval: float, v4_limits: dict = None, v6_limits: dict = None, mode: str = "sliding_window",
+                 max_keys: int = 1_000_000, ban_threshold: int = 10, ban_duration: float = 300, max_bans: int = 65536,
+                 min_ban_prefix: dict = None, limiter_factory=None, on_ban=None):
+        self.interval = interval
+        self.min_ban_prefix = {**DEFAULT_MIN_BAN_PREFIX, **(min_ban_prefix or {})}
+        self.ban_threshold = ban_threshold
+        self.ban_duration = ban_duration
+        self.max_bans = max_bans
+        self.on_ban = on_ban
+        if limiter_factory is None:
+            limiter_factory = _local_limiter
+        v4_limits = DEFAULT_V4_LIMITS if v4_limits is None else v4_limits
+        v6_limits = DEFAULT_V6_LIMITS if v6_limits is None else v6_limits
+        self._levels = {
+            4: self._build_levels(4, 32, v4_limits, interval, mode, max_keys, limiter_factory),
+            6: self._build_levels(6, 128, v6_limits, interval, mode, max_keys, limiter_factory),
+        }
+        # The same limiters split into the address itself and its subnets,
+        # for callers that check the two at different times.
+        self._host_levels = {version: levels[:1] if levels and levels[0][1] == 0 else ()
+                             for version, levels in self._levels.items()}
+        self._subnet_levels = {version: levels[len(self._host_levels[version]):]
+                               for version, levels in self._levels.items()}
+        self._strikes = limiter_factory("sliding_window", max(1, ban_threshold), interval, max_keys, "strikes")
+        self._fallback = create_limiter(mode, min(list(v4_limits.values()) or [1]), interval, max_keys=max_keys)
+        self._bans = {}
+        self._ban_expiry = []
+        self.bans_issued = 0
+
+    @staticmethod
+    def _build_levels(version, bits, limits, interval, mode, max_keys, limiter_factory):
+        levels = []
+        for length in sorted(limits, reverse=True):
+            if not 0 <= length <= bits:
+                raise ValueError(f"Invalid IPv{version} prefix length: {length}")
+            limiter = limiter_factory(mode, limits[length], interval, max_keys, f"v{version}/{length}")
+            levels.append((length, bits - length, limiter))
+        return tuple(levels)
+
+    def limiters(self):
+        """``(tag, limiter)`` for every limiter held in this process; shared ones are left out."""
+        tagged = [(f"v{version}/{length}", limiter) for version, levels in self._levels.items() for length, _, limiter in levels]
+        tagged += [("strikes", self._strikes), ("fallback", self._fallback)]
+        return [(tag, limiter) for tag, limiter in tagged if isinstance(limiter, RateLimiter)]
+
+    def __len__(self):
+        return sum(len(limiter) for levels in self._levels.values() for _, _, limiter in levels)
+
+    @staticmethod
+    def _key(version, value, length, shift):
+        return ((value >> shift) << 8 | length) << 1 | (version == 6)
+
+    @staticmethod
+    def describe(key) -> str:
+        is_v6 = key & 1
+        length = (key >> 1) & 0xFF
+        prefix = key >> 9
+        bits = 128 if is_v6 else 32
+        network = (ipaddress.IPv6Network if is_v6 else ipaddress.IPv4Network)((prefix << (bits - length), length))
+        return str(network)
+
+    def allow(self, ip: str, now: float = None, cost: int = 1, host: bool = True) -> bool:
+        """Check and charge every level; with ``host=False`` only the subnets, see :meth:`allow_host`."""
+        if now is None:
+            now = time.monotonic()
+        try:
+            version, value = parse_address(ip)
+        except (OSError, TypeError):
+            return self._fallback.allow(ip, now, cost) if host else True
+        return self._allow(version, value, self._levels[version] if host else self._subnet_levels[version], now, cost)
+
+    def allow_host(self, ip: str, now: float = None, cost: int = 1) -> bool:
+        """Check and charge only the address's own level (/32 or /128)."""
+        if now is None:
+            now = time.monotonic()
+        try:
+            version, value = parse_address(ip)
+        except (OSError, TypeError):
+            return self._fallback.allow(ip, now, cost)
+        return self._allow(version, value, self._host_levels[version], now, cost)
+
+    def _allow(self, version, value, levels, now, cost):
+        bans = self._bans
+        if bans:
+            for length, shift, _ in self._levels[version]:
+                key = self._key(version, value, length, shift)
+                expires = bans.get(key)
+                if expires is not None:
+                    if expires > now:
+                        return False
+                    del bans[key]
+
+        keys = [self._key(version, value, length, shift) for length, shift, _ in levels]
+        for (length, _, limiter), key in zip(levels, keys):
+            if not limiter.allow(key, now, cost, charge=False):
+                if length >= self.min_ban_prefix[version] and not self._strikes.allow(key, now):
+                    self._ban(key, now)
+                return False
+        for (_, _, limiter), key in zip(levels, keys):
+            limiter.allow(key, now, cost)
+        return True
+
+    def _ban(self, key, now: float):
+        if key in self._bans:
+            return
+        expires = now + self.ban_duration
+        self._add_ban(key, expires, now)
+        self.bans_issued += 1
+        print(f"Temporarily banned {self.describe(key)} for {self.ban_duration:.0f}s: connection flood.")
+        if self.on_ban is not None:
+            self.on_ban(self.describe(key), expires)
+
+    def _add_ban(self, key, expires: float, now: float):
+        self.purge_bans(now)
+        while len(self._bans) >= self.max_bans and self._ban_expiry:
+            _, oldest = heapq.heappop(self._ban_expiry)
+            self._bans.pop(oldest, None)
+        self._bans[key] = expires
+        heapq.heappush(self._ban_expiry, (expires, key))
+
+    @staticmethod
+    def _network_key(network: str):
+        network = ipaddress.ip_network(network, strict=False)
+        prefix = int(network.network_address) >> (network.max_prefixlen - network.prefixlen)
+        return (prefix << 8 | network.prefixlen) << 1 | (network.version == 6)
+
+    def ban(self, network: str, expires: float, now: float = None):
+        """Install a ban decided elsewhere, e.g. by another worker. ``expires`` is on the monotonic clock."""
+        if now is None:
+            now = time.monotonic()
+        if expires > now:
+            self._add_ban(self._network_key(network), expires, now)
+
+    def purge_bans(self, now: float = None):
+        if now is None:
+            now = time.monotonic()
+        expiry = self._ban_expiry
+        while expiry and expiry[0][0] <= now:
+            expires, key = heapq.heappop(expiry)
+            if self._bans.get(key) == expires:
+                del self._bans[key]
+
+    def bans(self) -> dict:
+        """Copy of the ban table, packed key -> monotonic expiry."""
+        return dict(self._bans)
+
+    def restore_bans(self, bans, now: float = None):
+        """Reinstall ``(key, expires)`` pairs from :meth:`bans`; expired ones are skipped."""
+        if now is None:
+            now = time.monotonic()
+        for key, expires in bans:
+            if expires > now:
+                self._add_ban(key, expires, now)
+
+    def active_bans(self, now: float = None):
+        if now is None:
+            now = time.monotonic()
+        self.purge_bans(now)
+        return [(self.describe(key), expires - now) for key, expires in self._bans.items()]
+
+    def lift_ban(self, network: str) -> bool:
+        return self._bans.pop(self._network_key(network), None) is not None
@@ -0,0 +1,325 @@
+import asyncio
+import time
+
+from collections import defaultdict, deque
+
+from src.protocol.status import StatusCache
+from src.ratelimit.subnet import _local_limiter
+
+BALANCE_MODES = ("least_connections", "weighted")
+
+
+def normalize_host(server_addr: str) -> str:
+    """The hostname a handshake asked for, lowercased.
+
+    Forge appends ``\\0FML\\0``-style markers and BungeeCord-style IP
+    forwarding appends ``\\0``-separated fields; both are dropped, as is a
+    trailing dot.
+    """
+    return server_addr.split("\0", 1)[0].rstrip(".").lower()
+
+
+def _route_key(hostname):
+    # NULL, empty and "*" all mean the default route.
+    if not hostname or hostname == "*":
+        return None
+    return normalize_host(hostname)
+
+
+class Backend:
+    """One row of ``servers``: where to dial, its share of traffic and its own limits.
+
+    ``connections`` and ``packets`` are per-backend limiters when the row sets
+    ``max_connections`` / ``max_packets``, otherwise ``None`` and the proxy-wide
+    limits apply. ``allowed`` is the per-backend ``/allow-con`` switch.
+    """
+
+    def __init__(self, server_id: int, host: str, port: int):
+        self.id = server_id
+        self.host = host
+        self.port = port
+        self.hostname = None
+        self.weight = 1
+        self.max_connections = None
+        self.max_packets = None
+        self.connections = None
+        self.packets = None
+        self.status_cache = None
+        self.allowed = True
+        # Optimistic until the first check says otherwise.
+        self.healthy = True
+        self.active = 0
+        self.total = 0
+        self.failures = 0
+        self.successes = 0
+        self.last_error = None
+        self.latency = None
+        self.checks = 0
+        self.checks_reused = 0
+        self.handoffs = 0
+        self._current = 0
+        self._idle = deque()
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def _live_idle(self, now: float, max_idle: float):
+        live = deque()
+        for reader, writer, opened in self._idle:
+            if now - opened < max_idle and not writer.is_closing() and not reader.at_eof():
+                live.append((reader, writer, opened))
+            else:
+                writer.close()
+        self._idle = live
+        return live
+
+    def take_connection(self, max_idle: float):
+        """A parked probe connection that is still open, or ``None``."""
+        live = self._live_idle(time.monotonic(), max_idle)
+        if not live:
+            return None
+        reader, writer, _ = live.pop()
+        return reader, writer
+
+    def close_idle(self):
+        for _, writer, _ in self._idle:
+            writer.close()
+        self._idle.clear()
+
+    def describe(self) -> dict:
+        return {
+            "id": self.id,
+            "address": self.address,
+            "hostname": self.hostname,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "allowed": self.allowed,
+            "active": self.active,
+            "total": self.total,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "latency_ms": round(self.latency * 1000, 2) if self.latency is not None else None,
+            "checks": self.checks,
+            "checks_reused": self.checks_reused,
+            "handoffs": self.handoffs,
+            "idle_connections": len(self._idle),
+            "max_connections": self.max_connections,
+            "max_packets": self.max_packets,
+        }
+
+
+class Router:
+    """Routes a handshake's server address to a backend from the ``servers`` table.
+
+    Rows sharing a ``hostname`` form a pool. A lookup tries the exact name,
+    then ``*.suffix`` wildcards from the most specific, then the default
+    route (hostname NULL or ``*``). Within a pool, backends that are healthy
+    and allowed are balanced by weighted least connections or smooth
+    weighted round robin.
+
+    Every ``check_interval`` each backend is probed with a TCP connect. Up to
+    ``pool_size`` probe connections are kept open: while one is still open
+    the next check passes without dialing, and the next client routed there
+    is handed it instead of waiting for a fresh connect. Parked connections
+    are retired after ``max_idle`` seconds, below vanilla's 30s read timeout.
+    ``fall`` consecutive failures (checks or client dials) take a backend out
+    of rotation; ``rise`` passing checks put it back.
+
+    Per-backend limiters come from ``limiter_factory`` (the signature
+    :class:`SubnetLimiter` takes); with workers it is the shared counter
+    table's, so ``max_connections`` and ``max_packets`` hold across all of them.
+    """
+
+    def __init__(self, db_manager, balance: str = "least_connections", limiter_mode: str = "sliding_window",
+                 conn_interval: float = 60, packet_interval: float = 1, max_tracked_ips: int = 1_000_000,
+                 status_refresh_interval: float = None, refresh_interval: float = 30, check_interval: float = 5,
+                 check_timeout: float = 2, connect_timeout: float = 5, fall: int = 2, rise: int = 2,
+                 pool_size: int = 1, max_idle: float = 20, limiter_factory=None):
+        if balance not in BALANCE_MODES:
+            raise ValueError(f"Unknown balance mode: {balance}")
+        self.db_manager = db_manager
+        self.balance = balance
+        self.limiter_mode = limiter_mode
+        self.conn_interval = conn_interval
+        self.packet_interval = packet_interval
+        self.max_tracked_ips = max_tracked_ips
+        self.status_refresh_interval = status_refresh_interval
+        self.refresh_interval = refresh_interval
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.connect_timeout = connect_timeout
+        self.fall = fall
+        self.rise = rise
+        self.pool_size = pool_size
+        self.max_idle = max_idle
+        self.limiter_factory = limiter_factory or _local_limiter
+        self.backends = {}
+        self._pools = {}
+        self._tasks = []
+
+    async def start(self):
+        await self.refresh()
+        await self.check_all()
+        self._tasks = [
+            asyncio.create_task(self._periodic_checks()),
+            asyncio.create_task(self._periodic_refresh()),
+        ]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        for backend in self.backends.values():
+            backend.close_idle()
+
+    async def refresh(self):
+        """Reload ``servers``; backends that stay keep their health, counts and parked connections."""
+        backends = {}
+        pools = defaultdict(list)
+        for row in await self.db_manager.list_servers():
+            backend = self.backends.get(row["id"])
+            if backend is None or (backend.host, backend.port) != (row["ip"], row["port"]):
+                if backend is not None:
+                    backend.close_idle()
+                backend = Backend(row["id"], row["ip"], row["port"])
+                if self.status_refresh_interval is not None:
+                    backend.status_cache = StatusCache(row["ip"], row["port"], refresh_interval=self.status_refresh_interval)
+            self._configure(backend, row)
+            backends[backend.id] = backend
+            pools[_route_key(row["hostname"])].append(backend)
+        for server_id, backend in self.backends.items():
+            if server_id not in backends:
+                backend.close_idle()
+        self.backends = backends
+        self._pools = dict(pools)
+
+    def _configure(self, backend: Backend, row: dict):
+        backend.hostname = row["hostname"]
+        backend.weight = max(1, row["weight"] or 1)
+        if row["max_connections"] != backend.max_connections:
+            backend.max_connections = row["max_connections"]
+            backend.connections = self.limiter_factory(
+                self.limiter_mode, backend.max_connections, self.conn_interval, self.max_tracked_ips,
+                f"server{backend.id}/connections"
+            ) if backend.max_connections else None
+        if row["max_packets"] != backend.max_packets:
+            backend.max_packets = row["max_packets"]
+            backend.packets = self.limiter_factory(
+                self.limiter_mode, backend.max_packets, self.packet_interval, self.max_tracked_ips,
+                f"server{backend.id}/packets"
+            ) if backend.max_packets else None
+
+    def route(self, server_addr: str):
+        """The pool serving ``server_addr``, or ``None`` if no route matches."""
+        pools = self._pools
+        host = normalize_host(server_addr)
+        pool = pools.get(host)
+        if pool is not None:
+            return pool
+        labels = host.split(".")
+        for i in range(1, len(labels)):
+            pool = pools.get("*." + ".".join(labels[i:]))
+            if pool is not None:
+                return pool
+        return pools.get(None)
+
+    def pick(self, pool, exclude=()):
+        candidates = [backend for backend in pool if backend.healthy and backend.allowed and backend not in exclude]
+        if not candidates:
+            return None
+        if self.balance == "weighted":
+            # Smooth weighted round robin: spreads picks in proportion to weight without bursts.
+            total = 0
+            best = None
+            for backend in candidates:
+                backend._current += backend.weight
+                total += backend.weight
+                if best is None or backend._current > best._current:
+                    best = backend
+            best._current -= total
+            return best
+        return min(candidates, key=lambda backend: (backend.active + 1) / backend.weight)
+
+    @staticmethod
+    def unavailable_reason(pool) -> str:
+        if any(backend.healthy for backend in pool):
+            return "connections_disabled"
+        return "no_healthy_backend"
+
+    def find(self, host: str, port: int):
+        return [backend for backend in self.backends.values() if backend.host == host and backend.port == port]
+
+    async def dial(self, backend: Backend):
+        connection = backend.take_connection(self.max_idle)
+        if connection is not None:
+            backend.handoffs += 1
+        else:
+            connection = await asyncio.wait_for(asyncio.open_connection(backend.host, backend.port), self.connect_timeout)
+        backend.failures = 0
+        backend.total += 1
+        return connection
+
+    def record_failure(self, backend: Backend, error):
+        backend.failures += 1
+        backend.successes = 0
+        backend.last_error = str(error) or type(error).__name__
+        if backend.healthy and backend.failures >= self.fall:
+            backend.healthy = False
+            backend.close_idle()
+            print(f"Backend {backend.address} is down: {backend.last_error}")
+
+    def _record_success(self, backend: Backend):
+        backend.failures = 0
+        backend.successes += 1
+        if not backend.healthy and backend.successes >= self.rise:
+            backend.healthy = True
+            print(f"Backend {backend.address} is back up.")
+
+    async def _check(self, backend: Backend):
+        backend.checks += 1
+        if backend._live_idle(time.monotonic(), self.max_idle):
+            backend.checks_reused += 1
+            self._record_success(backend)
+            return
+        started = time.monotonic()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(backend.host, backend.port), self.check_timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            self.record_failure(backend, e)
+            return
+        backend.latency = time.monotonic() - started
+        self._record_success(backend)
+        if len(backend._idle) < self.pool_size:
+            backend._idle.append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+
+    async def check_all(self):
+        await asyncio.gather(*(self._check(backend) for backend in list(self.backends.values())))
+
+    async def _periodic_checks(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check_all()
+            except Exception as e:
+                print(f"Backend health check failed: {e}")
+
+    async def _periodic_refresh(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Backend refresh failed: {e}")
+
+    def describe(self) -> dict:
+        return {
+            "balance": self.balance,
+            "routes": {
+                route if route is not None else "*": [backend.id for backend in pool]
+                for route, pool in self._pools.items()
+            },
+            "backends": [backend.describe() for backend in self.backends.values()],
+        }
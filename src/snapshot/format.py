@@ -0,0 +1,294 @@
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from itertools import accumulate
+from zlib import crc32
+
+MAGIC = b"DRGNSNAP"
+VERSION = 1
+
+# magic, format version, reserved, manifest length; the manifest is JSON and
+# describes where each section's arrays start in the data that follows it.
+_HEADER = struct.Struct("<8sHHI")
+_ALIGN = 8
+# SubnetLimiter keys are (prefix << 8 | length) << 1 | is_v6: at most 137 bits.
+_INT_KEY_BYTES = 18
+
+_ENCODERS = {
+    "str": str.encode,
+    "int": lambda key: key.to_bytes(_INT_KEY_BYTES, "little"),
+}
+_DECODERS = {
+    "str": lambda raw: str(raw, "utf-8"),
+    "int": lambda raw: int.from_bytes(raw, "little"),
+}
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class Section:
+    """One named table in a snapshot: keys, value columns aligned with them
+    (``array.array`` each) and a small JSON-able ``meta`` dict.
+
+    ``indexed`` sections also get an open-addressing hash table on disk so
+    single keys can be looked up straight from the mapping.
+    """
+
+    __slots__ = ("keys", "columns", "indexed", "meta")
+
+    def __init__(self, keys, columns=None, indexed=False, meta=None):
+        self.keys = keys
+        self.columns = columns or {}
+        self.indexed = indexed
+        self.meta = meta or {}
+
+
+def _pad(out, size):
+    padding = -size % _ALIGN
+    if padding:
+        out.append(bytes(padding))
+    return size + padding
+
+
+def _encode_section(section, out, size):
+    keys = section.keys
+    kind = "int" if keys and isinstance(keys[0], int) else "str"
+    encoded = list(map(_ENCODERS[kind], keys))
+    blob = b"".join(encoded)
+    if len(blob) >= 1 << 32:
+        raise SnapshotError("section keys exceed 4 GiB")
+    offsets = array.array("I", accumulate(map(len, encoded), initial=0))
+
+    info = {"count": len(keys), "kind": kind, "meta": section.meta, "columns": {}}
+    info["keys"] = [size, len(blob)]
+    out.append(blob)
+    size = _pad(out, size + len(blob))
+    info["offsets"] = size
+    out.append(offsets.tobytes())
+    size = _pad(out, size + len(offsets) * offsets.itemsize)
+
+    for name, column in section.columns.items():
+        if len(column) != len(keys):
+            raise SnapshotError(f"column {name} has {len(column)} values for {len(keys)} keys")
+        info["columns"][name] = [column.typecode, size]
+        out.append(column.tobytes())
+        size = _pad(out, size + len(column) * column.itemsize)
+
+    if section.indexed:
+        # Load factor at most 1/2 with linear probing; slots hold index + 1.
+        capacity = 1 << max(3, (2 * len(keys) - 1).bit_length())
+        mask = capacity - 1
+        slots = array.array("I", bytes(4 * capacity))
+        for index, raw in enumerate(encoded, 1):
+            slot = crc32(raw) & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = index
+        info["slots"] = [size, capacity]
+        out.append(slots.tobytes())
+        size = _pad(out, size + len(slots) * slots.itemsize)
+    return info, size
+
+
+def write_snapshot(path: str, sections: dict, meta: dict = None) -> int:
+    """Write ``sections`` (name -> :class:`Section`) to ``path`` atomically.
+
+    The file is written next to ``path``, fsynced and renamed over it, so a
+    crash leaves either the previous snapshot or the new one. This blocks;
+    call it from an executor. Returns the file size.
+    """
+    out = []
+    size = 0
+    manifest = {"byteorder": sys.byteorder, "meta": meta or {}, "sections": {}}
+    for name, section in sections.items():
+        manifest["sections"][name], size = _encode_section(section, out, size)
+    manifest["size"] = size
+
+    encoded = json.dumps(manifest, separators=(",", ":")).encode()
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(encoded)) + encoded
+    header += bytes(-len(header) % _ALIGN)
+
+    # A unique temporary name, so an overlapping write can't interleave with this one.
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=directory)
+    try:
+        with open(fd, "wb") as f:
+            f.write(header)
+            f.writelines(out)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return len(header) + size
+
+
+class MappedTable:
+    """A section viewed in place in the mapped file; nothing is copied."""
+
+    def __init__(self, view: memoryview, info: dict):
+        self.count = info["count"]
+        self.meta = info["meta"]
+        self._encode = _ENCODERS[info["kind"]]
+        self._decode = _DECODERS[info["kind"]]
+        start, length = info["keys"]
+        self._blob = view[start:start + length]
+        offsets = info["offsets"]
+        self._offsets = view[offsets:offsets + 4 * (self.count + 1)].cast("I")
+        self.columns = {}
+        for name, (typecode, start) in info["columns"].items():
+            itemsize = array.array(typecode).itemsize
+            self.columns[name] = view[start:start + itemsize * self.count].cast(typecode)
+        self._slots = None
+        if "slots" in info:
+            start, capacity = info["slots"]
+            self._slots = view[start:start + 4 * capacity].cast("I")
+            self._mask = capacity - 1
+
+    def __len__(self):
+        return self.count
+
+    def key(self, index: int):
+        offsets = self._offsets
+        return self._decode(self._blob[offsets[index]:offsets[index + 1]])
+
+    def keys(self):
+        return [self.key(index) for index in range(self.count)]
+
+    def find(self, key) -> int:
+        """Index of ``key``, or -1. Only for indexed sections."""
+        raw = self._encode(key)
+        slots, offsets, blob, mask = self._slots, self._offsets, self._blob, self._mask
+        slot = crc32(raw) & mask
+        while True:
+            index = slots[slot]
+            if not index:
+                return -1
+            if blob[offsets[index - 1]:offsets[index]] == raw:
+                return index - 1
+            slot = (slot + 1) & mask
+
+
+class MappedGeneration:
+    """A snapshot section standing in for a two-generation structure's old
+    generation (a limiter's dict or a :class:`RecentSet`'s set).
+
+    Supports the handful of operations those make on their old generation.
+    Values are stored relative to the snapshot's clock and ``offset`` is
+    added on the way out. ``pop`` leaves the entry in place: the caller
+    moves the key into its young generation, which is always checked first,
+    and the whole mapping goes away at the next rotation.
+    """
+
+    def __init__(self, table: MappedTable, column: str = None, offset: int = 0):
+        self._table = table
+        self._values = table.columns[column] if column else None
+        self._offset = offset
+        self._taken = 0
+
+    def __len__(self):
+        return len(self._table) - self._taken
+
+    def __contains__(self, key):
+        return self._table.find(key) >= 0
+
+    def __iter__(self):
+        table = self._table
+        return (table.key(index) for index in range(len(table)))
+
+    def get(self, key, default=None):
+        index = self._table.find(key)
+        if index < 0:
+            return default
+        return self._values[index] + self._offset
+
+    def pop(self, key, default=None):
+        index = self._table.find(key)
+        if index < 0:
+            return default
+        self._taken += 1
+        return self._values[index] + self._offset
+
+    def items(self):
+        table, values, offset = self._table, self._values, self._offset
+        return ((table.key(index), values[index] + offset) for index in range(len(table)))
+
+    def copy(self):
+        # Read-only, so a snapshot of it can share it.
+        return self
+
+    def clear(self):
+        self._table = _EMPTY
+        self._values = None
+        self._taken = 0
+
+
+class _EmptyTable:
+    count = 0
+
+    def __len__(self):
+        return 0
+
+    def find(self, key):
+        return -1
+
+
+_EMPTY = _EmptyTable()
+
+
+class Snapshot:
+    """A snapshot file mapped read-only.
+
+    Opening it only parses the header and manifest; sections are views into
+    the mapping, which stays open for as long as any of them is referenced.
+    The file must not be rewritten in place while mapped (reads past a
+    truncation fault); :func:`write_snapshot` only ever replaces it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                mem = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError("snapshot file is empty") from None
+        if len(mem) < _HEADER.size:
+            raise SnapshotError("snapshot file is truncated")
+        magic, version, _, manifest_length = _HEADER.unpack_from(mem, 0)
+        if magic != MAGIC:
+            raise SnapshotError("not a snapshot file")
+        if version != VERSION:
+            raise SnapshotError(f"unsupported snapshot version {version}, expected {VERSION}")
+        try:
+            manifest = json.loads(mem[_HEADER.size:_HEADER.size + manifest_length])
+        except ValueError:
+            raise SnapshotError("snapshot manifest is corrupt") from None
+        if manifest["byteorder"] != sys.byteorder:
+            raise SnapshotError(f"snapshot was written on a {manifest['byteorder']}-endian host")
+
+        data = _HEADER.size + manifest_length
+        data += -data % _ALIGN
+        if len(mem) < data + manifest["size"]:
+            raise SnapshotError("snapshot file is truncated")
+        self.version = version
+        self.meta = manifest["meta"]
+        self.size = len(mem)
+        self._sections = manifest["sections"]
+        self._view = memoryview(mem)[data:]
+
+    def __contains__(self, name):
+        return name in self._sections
+
+    def __iter__(self):
+        return iter(self._sections)
+
+    def section(self, name: str) -> MappedTable:
+        return MappedTable(self._view, self._sections[name])
@@ -0,0 +1,206 @@
+import asyncio
+import gc
+import json
+import os
+import time
+
+from array import array
+
+from src.ratelimit.limiter import RateLimiter
+from src.snapshot.format import MappedGeneration, Section, SnapshotError, write_snapshot
+
+
+def _limiters(aegis):
+    tagged = [("packets", aegis.packets)]
+    tagged += [(f"connections/{tag}", limiter) for tag, limiter in aegis.connections.limiters()]
+    if aegis.router is not None:
+        for backend in aegis.router.backends.values():
+            tagged += [(f"backend/{backend.id}/connections", backend.connections), (f"backend/{backend.id}/packets", backend.packets)]
+    return [(name, limiter) for name, limiter in tagged if isinstance(limiter, RateLimiter)]
+
+
+def _recent_sets(aegis):
+    attack = aegis.attack_detector
+    if attack is None:
+        return []
+    return [("attack/seen", attack.seen_ips), ("attack/good", attack.good_ips)]
+
+
+def _limiter_job(limiter, now):
+    young, old = limiter.generations()
+    base = limiter.clock_base(now)
+    meta = {"mode": type(limiter).__name__, "interval": limiter.interval}
+
+    def build():
+        states = dict(old.items())
+        states.update(young)
+        values = array("q", [state - base for state in states.values()])
+        return Section(list(states), {"state": values}, indexed=True, meta=meta)
+    return build
+
+
+def _recent_job(recent):
+    young, old = recent.generations()
+
+    def build():
+        keys = set(old)
+        keys.update(young)
+        return Section(list(keys), indexed=True)
+    return build
+
+
+def _bans_job(bans, now):
+    def build():
+        return Section(list(bans), {"remaining": array("d", [expires - now for expires in bans.values()])})
+    return build
+
+
+def capture_state(aegis, now: float = None):
+    """Copy the state worth keeping across a restart.
+
+    Runs on the event loop but only takes C-level copies of the tables;
+    the heavy part (merging generations, rebasing timestamps, encoding) is
+    in the returned ``build()``, which can run on another thread and returns
+    the sections to write. Also returns the snapshot's metadata.
+    """
+    if now is None:
+        now = time.monotonic()
+    jobs = {name: _limiter_job(limiter, now) for name, limiter in _limiters(aegis)}
+    jobs.update((name, _recent_job(recent)) for name, recent in _recent_sets(aegis))
+    jobs["bans"] = _bans_job(aegis.connections.bans(), now)
+
+    blocklist = list(aegis.blocked_ips)
+    sections = {"blocklist": Section(blocklist)}
+    for (event, dimension), table in aegis.heavy_hitters.tables.items():
+        keys, counts, errors, floor = table.export(now)
+        sections[f"top/{event}/{dimension}"] = Section(
+            keys, {"count": array("d", counts), "error": array("d", errors)}, meta={"floor": floor}
+        )
+
+    def build():
+        built = {name: job() for name, job in jobs.items()}
+        built.update(sections)
+        return built
+    return build, {"wall": time.time(), "monotonic": now}
+
+
+def _collect(pid: int, fd: int) -> dict:
+    # Blocking reads and waitpid release the GIL, so this sits on an executor thread.
+    chunks = []
+    try:
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+        os.waitpid(pid, 0)
+    return json.loads(b"".join(chunks) or b"{}")
+
+
+async def write_forked(aegis, path: str):
+    """Write a snapshot of ``aegis`` to ``path`` from a forked child.
+
+    The child works from a copy-on-write image of this process, so capturing,
+    encoding and writing never hold this process's GIL; the event loop only
+    pays for ``fork()`` itself. Returns ``(size, meta, paused)`` where
+    ``paused`` is how long the fork blocked the loop, in seconds.
+
+    The fork happens with the executor's threads live. Only the calling
+    thread exists in the child, so it must not take a lock one of them could
+    have held: it only reads the tables and writes a file before exiting.
+    It closes every inherited descriptor but its pipe first, so sockets the
+    parent closes meanwhile still send their FIN or RST straight away.
+    """
+    started = time.perf_counter()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.close(read_fd)
+            os.closerange(3, write_fd)
+            os.closerange(write_fd + 1, os.sysconf("SC_OPEN_MAX"))
+            # Finalizers of objects whose descriptors were just closed could
+            # otherwise close whatever the snapshot file reuses their numbers for.
+            gc.disable()
+            build, meta = capture_state(aegis)
+            reply = {"size": write_snapshot(path, build(), meta), "meta": meta}
+            status = 0
+        except BaseException as e:
+            reply = {"error": str(e) or type(e).__name__}
+        try:
+            os.write(write_fd, json.dumps(reply).encode())
+        finally:
+            # Never return into the parent's event loop.
+            os._exit(status)
+    os.close(write_fd)
+    paused = time.perf_counter() - started
+    reply = await asyncio.get_running_loop().run_in_executor(None, _collect, pid, read_fd)
+    if "error" in reply:
+        raise SnapshotError(reply["error"])
+    if "size" not in reply:
+        raise SnapshotError("snapshot process exited without a result")
+    return reply["size"], reply["meta"], paused
+
+
+def restore_state(aegis, snapshot, now: float = None) -> dict:
+    """Load ``snapshot`` into ``aegis``; returns the entries restored per section.
+
+    Limiter and recent-IP tables are not copied: each becomes its owner's
+    old generation, read straight from the mapping until the next rotation.
+    Timestamps are shifted onto this process's monotonic clock using the
+    wall-clock age of the snapshot. Limiters whose type or interval changed
+    since the snapshot start empty.
+    """
+    if now is None:
+        now = time.monotonic()
+    # The moment the snapshot was taken, on this process's monotonic clock.
+    then = now - max(0.0, time.time() - snapshot.meta["wall"])
+    restored = {}
+
+    for name, limiter in _limiters(aegis):
+        if name not in snapshot:
+            continue
+        table = snapshot.section(name)
+        if not len(table):
+            continue
+        if table.meta.get("mode") != type(limiter).__name__ or table.meta.get("interval") != limiter.interval:
+            continue
+        limiter.restore(MappedGeneration(table, "state", limiter.clock_base(then)), then)
+        restored[name] = len(table)
+
+    for name, recent in _recent_sets(aegis):
+        if name not in snapshot:
+            continue
+        table = snapshot.section(name)
+        if len(table):
+            recent.restore(MappedGeneration(table), then)
+            restored[name] = len(table)
+
+    if "bans" in snapshot:
+        table = snapshot.section("bans")
+        expiries = [then + remaining for remaining in table.columns["remaining"]]
+        aegis.connections.restore_bans(zip(table.keys(), expiries), now)
+        restored["bans"] = len(table)
+
+    for (event, dimension), counter in aegis.heavy_hitters.tables.items():
+        name = f"top/{event}/{dimension}"
+        if name in snapshot:
+            table = snapshot.section(name)
+            counter.restore(
+                table.keys(), table.columns["count"].tolist(), table.columns["error"].tolist(),
+                table.meta["floor"], then
+            )
+            restored[name] = len(table)
+
+    # A persistent backend already holds the blocklist and the first refresh
+    # loads it; an in-memory one lost it, so the snapshot's copy is blocked again.
+    if "blocklist" in snapshot and not aegis.db_manager.persistent:
+        present = set(aegis.blocked_ips)
+        entries = [entry for entry in snapshot.section("blocklist").keys() if entry not in present]
+        for entry in entries:
+            aegis.block_ip(entry)
+        restored["blocklist"] = len(entries)
+    return restored
@@ -0,0 +1,152 @@
+import ipaddress
+import time
+
+from operator import itemgetter
+
+
+class SpaceSaving:
+    """Approximate top-k counter in fixed memory with exponential decay.
+
+    Space-Saving: keys missing from a full table take over the smallest
+    count, so every estimate is an overcount by at most the recorded error.
+    Eviction is batched: the table may grow to twice ``capacity`` and is
+    then cut back to the largest ``capacity`` counts, whose floor becomes
+    the starting count for new keys. That keeps inserts amortised O(1)
+    instead of a minimum search per new key.
+
+    Decay uses forward weighting: each event is worth ``2 ** (t / half_life)``
+    so older events count for less without touching stored counts; all
+    counts are renormalised once the weight grows large.
+    """
+
+    def __init__(self, capacity: int = 100, half_life: float = 60.0):
+        self.capacity = capacity
+        self.half_life = half_life
+        self._counts = {}
+        self._errors = {}
+        self._floor = 0.0
+        self._origin = time.monotonic()
+
+    def __len__(self):
+        return len(self._counts)
+
+    def _weight(self, now: float) -> float:
+        weight = 2.0 ** ((now - self._origin) / self.half_life)
+        if weight > 2.0 ** 32:
+            self._rescale(weight, now)
+            weight = 1.0
+        return weight
+
+    def _rescale(self, weight: float, now: float) -> None:
+        self._counts = {key: count / weight for key, count in self._counts.items()}
+        self._errors = {key: error / weight for key, error in self._errors.items()}
+        self._floor /= weight
+        self._origin = now
+
+    def add(self, key, amount: int = 1, now: float = None) -> None:
+        if now is None:
+            now = time.monotonic()
+        # May rescale and replace the tables, so it has to come first.
+        weight = self._weight(now)
+        counts = self._counts
+        count = counts.get(key)
+        if count is None:
+            count = self._floor
+            self._errors[key] = count
+        counts[key] = count + amount * weight
+        if len(counts) > 2 * self.capacity:
+            self._compact()
+
+    def _compact(self) -> None:
+        kept = sorted(self._counts.items(), key=itemgetter(1), reverse=True)[:self.capacity]
+        self._floor = kept[-1][1]
+        self._counts = dict(kept)
+        self._errors = {key: self._errors[key] for key in self._counts}
+
+    def export(self, now: float = None):
+        """``(keys, counts, errors, floor)`` at the current weight, for snapshots."""
+        if now is None:
+            now = time.monotonic()
+        weight = self._weight(now)
+        keys = list(self._counts)
+        counts = [self._counts[key] / weight for key in keys]
+        errors = [self._errors[key] / weight for key in keys]
+        return keys, counts, errors, self._floor / weight
+
+    def restore(self, keys, counts, errors, floor: float, now: float = None):
+        """Load what :meth:`export` returned at ``now``; it keeps decaying from there."""
+        self._counts = dict(zip(keys, counts))
+        self._errors = dict(zip(keys, errors))
+        self._floor = floor
+        self._origin = time.monotonic() if now is None else now
+
+    def top(self, n: int = 10, now: float = None):
+        """Return ``[(key, decayed_count, max_overcount), ...]``, largest first."""
+        if now is None:
+            now = time.monotonic()
+        weight = self._weight(now)
+        ranked = sorted(self._counts.items(), key=itemgetter(1), reverse=True)[:n]
+        return [(key, count / weight, self._errors[key] / weight) for key, count in ranked]
+
+
+def subnet_of(ip: str) -> str:
+    """The /24 (IPv4) or /48 (IPv6) an address belongs to, as a string."""
+    if ":" not in ip:
+        return ip.rpartition(".")[0] + ".0/24"
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    if address.ipv4_mapped is not None:
+        return subnet_of(str(address.ipv4_mapped))
+    return str(ipaddress.ip_network(f"{address}/48", strict=False))
+
+
+class HeavyHitters:
+    """Top talkers by IP, subnet and username, for connections and packets."""
+
+    EVENTS = ("connections", "packets")
+    DIMENSIONS = ("ips", "subnets", "usernames")
+
+    def __init__(self, capacity: int = 100, half_life: float = 60.0):
+        self.half_life = half_life
+        self.tables = {
+            (event, dimension): SpaceSaving(capacity, half_life)
+            for event in self.EVENTS for dimension in self.DIMENSIONS
+        }
+        self._connection_ips = self.tables["connections", "ips"]
+        self._connection_subnets = self.tables["connections", "subnets"]
+        self._connection_usernames = self.tables["connections", "usernames"]
+        self._packet_ips = self.tables["packets", "ips"]
+        self._packet_subnets = self.tables["packets", "subnets"]
+        self._packet_usernames = self.tables["packets", "usernames"]
+
+    def record_connection(self, ip: str, subnet: str) -> None:
+        now = time.monotonic()
+        self._connection_ips.add(ip, 1, now)
+        self._connection_subnets.add(subnet, 1, now)
+
+    def record_login(self, username: str) -> None:
+        self._connection_usernames.add(username)
+
+    def record_packets(self, ip: str, subnet: str, username: str, count: int) -> None:
+        now = time.monotonic()
+        self._packet_ips.add(ip, count, now)
+        self._packet_subnets.add(subnet, count, now)
+        if username is not None:
+            self._packet_usernames.add(username, count, now)
+
+    def top(self, event: str, dimension: str, n: int = 10):
+        return self.tables[event, dimension].top(n)
+
+    def snapshot(self, n: int = 10) -> dict:
+        return {
+            event: {
+                dimension: [
+                    {"key": key, "count": round(count, 2), "error": round(error, 2)}
+                    for key, count, error in self.top(event, dimension, n)
+                ]
+                for dimension in self.DIMENSIONS
+            }
+            for event in self.EVENTS
+        }
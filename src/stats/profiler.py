@@ -0,0 +1,255 @@
+import time
+
+from collections import defaultdict
+from operator import itemgetter
+from time import perf_counter_ns
+
+from src.protocol.decoder import read_varint
+
+# Where handle_client spends its time, and what the proxy adds per direction.
+STAGES = ("parse", "rate_limit", "dial", "drain", "db_flush")
+DIRECTIONS = ("upstream", "downstream")
+PERCENTILES = (50, 90, 99, 99.9)
+# Tally key for frames whose packet id is inside zlib data.
+COMPRESSED = -1
+
+
+def compressed_packet_id(frame) -> int:
+    """Packet id of a decoded frame sent after Set Compression, or :data:`COMPRESSED`."""
+    # The decoder read the data length where the packet id would be; 0 means sent as is.
+    if frame.packet_id:
+        return COMPRESSED
+    packet_id, _ = read_varint(frame.payload)
+    return COMPRESSED if packet_id is None else packet_id
+
+
+class LatencyHistogram:
+    """HDR-style histogram of nanosecond durations in fixed memory.
+
+    Values below ``2 ** (bits + 1)`` get a bucket each; above that every
+    power of two is split into ``2 ** bits`` equal buckets, so any recorded
+    value is known to within ``2 ** -bits`` of itself (about 3% at the
+    default). Recording is a ``bit_length()``, a shift and a list increment.
+    Values past ``2 ** max_bits`` ns (about 18 minutes) land in the last bucket.
+    """
+
+    def __init__(self, bits: int = 5, max_bits: int = 40):
+        self.bits = bits
+        self._linear = 1 << (bits + 1)
+        self._counts = [0] * ((max_bits - bits + 1) << bits)
+        self._last = len(self._counts) - 1
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int) -> None:
+        if value < self._linear:
+            index = value if value > 0 else 0
+        else:
+            shift = value.bit_length() - self.bits - 1
+            index = (shift << self.bits) + (value >> shift)
+            if index > self._last:
+                index = self._last
+        self._counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def clear(self) -> None:
+        self._counts = [0] * len(self._counts)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def _upper(self, index: int) -> int:
+        # Highest value that maps to ``index``.
+        if index < self._linear:
+            return index
+        shift = (index >> self.bits) - 1
+        return ((index - (shift << self.bits)) << shift) + (1 << shift) - 1
+
+    def percentiles(self, percentiles=PERCENTILES) -> dict:
+        """``{percentile: ns}`` for each of ``percentiles``, in one pass over the buckets."""
+        result = {}
+        if not self.count:
+            return dict.fromkeys(percentiles, 0)
+        wanted = sorted(percentiles)
+        targets = [max(1, -(-self.count * percentile // 100)) for percentile in wanted]
+        seen = 0
+        position = 0
+        for index, count in enumerate(self._counts):
+            if not count:
+                continue
+            seen += count
+            while position < len(targets) and seen >= targets[position]:
+                result[wanted[position]] = min(self._upper(index), self.max)
+                position += 1
+            if position == len(targets):
+                break
+        return result
+
+    def describe(self) -> dict:
+        """Count, mean, percentiles and max, in microseconds."""
+        summary = {"count": self.count, "mean_us": round(self.total / self.count / 1000, 2) if self.count else 0}
+        for percentile, value in self.percentiles().items():
+            summary[f"p{percentile:g}_us"] = round(value / 1000, 2)
+        summary["max_us"] = round(self.max / 1000, 2)
+        return summary
+
+
+class PacketScanner:
+    """Tallies the frames of one byte stream by packet id without buffering it.
+
+    Like :class:`~src.protocol.decoder.FrameCounter` it skips frame bodies,
+    but also reads the packet id VarInt at the start of each one, which may
+    straddle reads. Malformed input is skipped rather than raised; the
+    forwarding path has its own checks.
+
+    Once ``compressed`` is set (after Set Compression) each frame starts
+    with the uncompressed data length: 0 is followed by the packet id,
+    anything else means the id is compressed and the frame is tallied
+    under :data:`COMPRESSED`.
+    """
+
+    def __init__(self):
+        self.compressed = False
+        self._skip = 0
+        self._value = 0
+        self._shift = 0
+        self._reading_id = False
+        self._reading_length = False
+        self._frame_bytes = 0
+        self._remaining = 0
+
+    def scan(self, data, tally) -> None:
+        """Add this chunk's complete packet headers to ``tally`` (packet id -> ``[packets, bytes]``)."""
+        end = len(data)
+        pos = self._skip
+        value = self._value
+        shift = self._shift
+        reading_id = self._reading_id
+        reading_length = self._reading_length
+        frame_bytes = self._frame_bytes
+        remaining = self._remaining
+        while pos < end:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            if not reading_id:
+                frame_bytes += 1
+                if byte & 0x80 and shift < 14:
+                    shift += 7
+                    continue
+                remaining = value
+                value = shift = 0
+                if remaining:
+                    frame_bytes += remaining
+                    reading_id = True
+                    reading_length = self.compressed
+                else:
+                    frame_bytes = 0
+                continue
+            remaining -= 1
+            if byte & 0x80 and remaining and shift < 28:
+                shift += 7
+                continue
+            if reading_length:
+                reading_length = False
+                if not value and remaining:
+                    shift = 0
+                    continue
+                value = COMPRESSED
+            entry = tally.get(value)
+            if entry is None:
+                tally[value] = [1, frame_bytes]
+            else:
+                entry[0] += 1
+                entry[1] += frame_bytes
+            pos += remaining
+            value = shift = frame_bytes = remaining = 0
+            reading_id = False
+        self._skip = pos - end
+        self._value = value
+        self._shift = shift
+        self._reading_id = reading_id
+        self._reading_length = reading_length
+        self._frame_bytes = frame_bytes
+        self._remaining = remaining
+
+
+class Profiler:
+    """Opt-in counters and timings for the forwarding pipeline.
+
+    Packets and bytes are counted per direction, connection state and
+    packet id; :data:`STAGES` and the added latency per direction (from a
+    read returning to its bytes being handed to the other side) each get a
+    :class:`LatencyHistogram`. ``handle_client`` picks up the installed
+    profiler once per connection; with none installed, the forwarding loop
+    pays a ``None`` check per read and nothing else.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {stage: LatencyHistogram() for stage in STAGES}
+        self.latency = {direction: LatencyHistogram() for direction in DIRECTIONS}
+        # (direction, state) -> packet id -> [packets, bytes]
+        self.packets = defaultdict(dict)
+
+    def tally(self, direction: str, state: str):
+        """The packet id table for ``direction`` in ``state``, for :meth:`PacketScanner.scan` or :meth:`count`."""
+        return self.packets[direction, state]
+
+    @staticmethod
+    def count(tally: dict, packet_id: int, size: int) -> None:
+        entry = tally.get(packet_id)
+        if entry is None:
+            tally[packet_id] = [1, size]
+        else:
+            entry[0] += 1
+            entry[1] += size
+
+    def record(self, stage: str, elapsed: int) -> None:
+        self.stages[stage].record(elapsed)
+
+    def timed(self, stage: str, func):
+        """``func`` wrapped to record each call's duration under ``stage``."""
+        histogram = self.stages[stage]
+
+        def timed(*args):
+            started = perf_counter_ns()
+            try:
+                return func(*args)
+            finally:
+                histogram.record(perf_counter_ns() - started)
+        return timed
+
+    def reset(self) -> None:
+        # In place: live connections hold on to the histograms and tallies.
+        self.started = time.time()
+        for histogram in (*self.stages.values(), *self.latency.values()):
+            histogram.clear()
+        for tally in self.packets.values():
+            tally.clear()
+
+    def top_packets(self, n: int = None):
+        """``[(direction, state, packet_id, packets, bytes), ...]``, most bytes first."""
+        rows = [
+            (direction, state, packet_id, packets, size)
+            for (direction, state), tally in self.packets.items()
+            for packet_id, (packets, size) in tally.items()
+        ]
+        rows.sort(key=itemgetter(4), reverse=True)
+        return rows[:n] if n is not None else rows
+
+    def describe(self) -> dict:
+        return {
+            "seconds": round(time.time() - self.started, 1),
+            "stages": {stage: histogram.describe() for stage, histogram in self.stages.items()},
+            "latency": {direction: histogram.describe() for direction, histogram in self.latency.items()},
+            "packets": [
+                {"direction": direction, "state": state, "packets": packets, "bytes": size,
+                 "packet_id": f"0x{packet_id:02x}" if packet_id != COMPRESSED else "compressed"}
+                for direction, state, packet_id, packets, size in self.top_packets()
+            ],
+        }
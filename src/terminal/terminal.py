@@ -1,13 +1,15 @@
 from colorama import Fore, Back, Style, init
 from collections import defaultdict
 import asyncio
+import time
 
-from src.database.DatabaseManager import DatabaseManager
+from src.database.StorageBackend import StorageBackend
+from src.stats.heavy_hitters import HeavyHitters
 
 import aioconsole
 
 class Terminal:
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: StorageBackend):
         self.db_manager = db_manager
         self._timeout_task = None
         self.session_timeout = 15 # 15 minutes in seconds
@@ -35,10 +37,18 @@ class Terminal:
         help_text = f"""
             {Fore.CYAN}📖 Available Commands:{Style.RESET_ALL}
             {Fore.GREEN}/allow-con <true>:<false>{Fore.WHITE} - Allows or disallows all connections to the selected server
+            {Fore.GREEN}/backends{Fore.WHITE}       - Show backends, their routes and health
+            {Fore.GREEN}/route <host|*> <ip>:<port> [weight]{Fore.WHITE} - Route a hostname to a backend
+            {Fore.GREEN}/unroute <id>{Fore.WHITE}   - Remove a backend by id
             {Fore.GREEN}/connections{Fore.WHITE}    - Show active connections
+            {Fore.GREEN}/top [connections|packets] [ips|subnets|usernames] [n]{Fore.WHITE} - Show the heaviest talkers
             {Fore.GREEN}/block <IP>{Fore.WHITE}     - Block an IP address
             {Fore.GREEN}/unblock <IP>{Fore.WHITE}   - Unblock an IP address
             {Fore.GREEN}/blocked{Fore.WHITE}       - List blocked IPs
+            {Fore.GREEN}/bans{Fore.WHITE}          - List temporary subnet bans
+            {Fore.GREEN}/stats{Fore.WHITE}         - Show proxy counters
+            {Fore.GREEN}/attack{Fore.WHITE}        - Show attack mode, its signals and recent transitions
+            {Fore.GREEN}/profile [on|off|reset]{Fore.WHITE} - Show stage timings and packet counts, or switch profiling
             {Fore.GREEN}/help{Fore.WHITE}          - Show this help
             {Fore.RED}/exit{Fore.WHITE}          - Shutdown the proxy{Style.RESET_ALL}
         """
@@ -56,8 +66,63 @@ class Terminal:
                 
                 if rate_limiter.server_selected is not None:
                     if parts[0] == "/connections":
-                        print(f"\n{Fore.CYAN}🔗 Active Connections:{Style.RESET_ALL}")
-                        print(await self.db_manager.get_connection_count(rate_limiter.server_selected.split(":")))
+                        active = rate_limiter.get_connections()
+                        print(f"\n{Fore.CYAN}🔗 Active Connections: {Fore.YELLOW}{rate_limiter.active_total}"
+                              f"{Fore.CYAN} from {Fore.YELLOW}{len(active)}{Fore.CYAN} IPs{Style.RESET_ALL}")
+                        for ip, count in sorted(active.items(), key=lambda item: item[1], reverse=True)[:10]:
+                            print(f"  {Fore.YELLOW}{ip}{Fore.WHITE} - {count}{Style.RESET_ALL}")
+                        print()
+                        await self._reset_session_timeout()
+
+                    elif parts[0] == "/backends":
+                        router = rate_limiter.router
+                        if router is None:
+                            print(f"{Fore.YELLOW}⚠️ Routing is disabled{Style.RESET_ALL}")
+                            continue
+                        print(f"\n{Fore.CYAN}🧭 Backends ({router.balance}):{Style.RESET_ALL}")
+                        for backend in router.backends.values():
+                            state = f"{Fore.GREEN}up" if backend.healthy else f"{Fore.RED}down"
+                            if not backend.allowed:
+                                state += f"{Fore.YELLOW} disabled"
+                            latency = f"{backend.latency * 1000:.1f}ms" if backend.latency is not None else "-"
+                            print(f"  {Fore.WHITE}#{backend.id} {Fore.YELLOW}{backend.hostname or '*'}{Fore.WHITE} → {backend.address} "
+                                  f"w{backend.weight} {state}{Fore.WHITE} - {backend.active} active, {backend.total} total, "
+                                  f"probe {latency}{Style.RESET_ALL}")
+                            if backend.last_error and not backend.healthy:
+                                print(f"      {Fore.RED}{backend.last_error}{Style.RESET_ALL}")
+                        print()
+                        await self._reset_session_timeout()
+
+                    elif parts[0] == "/route" and len(parts) > 2:
+                        host, _, port = parts[2].rpartition(":")
+                        weight = int(parts[3]) if len(parts) > 3 else 1
+                        hostname = None if parts[1] == "*" else parts[1]
+                        await self.db_manager.log_server(host, int(port), hostname=hostname, weight=weight)
+                        if rate_limiter.router is not None:
+                            await rate_limiter.router.refresh()
+                        print(f"{Fore.GREEN}🧭 Routing {Fore.YELLOW}{parts[1]}{Fore.GREEN} to {Fore.YELLOW}{parts[2]}{Style.RESET_ALL}")
+                        await self._reset_session_timeout()
+
+                    elif parts[0] == "/unroute" and len(parts) > 1:
+                        if not await self.db_manager.delete_server(int(parts[1])):
+                            print(f"{Fore.YELLOW}⚠️ No backend #{parts[1]}{Style.RESET_ALL}")
+                        else:
+                            if rate_limiter.router is not None:
+                                await rate_limiter.router.refresh()
+                            print(f"{Fore.RED}🧭 Removed backend {Fore.YELLOW}#{parts[1]}{Style.RESET_ALL}")
+                        await self._reset_session_timeout()
+
+                    elif parts[0] == "/top":
+                        event = parts[1] if len(parts) > 1 else "connections"
+                        dimension = parts[2] if len(parts) > 2 else "ips"
+                        count = int(parts[3]) if len(parts) > 3 else 10
+                        if event not in HeavyHitters.EVENTS or dimension not in HeavyHitters.DIMENSIONS:
+                            print(f"{Fore.RED}❌ Use /top [connections|packets] [ips|subnets|usernames] [n]{Style.RESET_ALL}")
+                            continue
+                        print(f"\n{Fore.CYAN}🔥 Top {event} by {dimension} (decaying, half-life {rate_limiter.heavy_hitters.half_life:.0f}s):{Style.RESET_ALL}")
+                        for key, value, error in rate_limiter.heavy_hitters.top(event, dimension, count):
+                            print(f"  {Fore.YELLOW}{key}{Fore.WHITE} - {value:.1f} (±{error:.1f}){Style.RESET_ALL}")
+                        print()
                         await self._reset_session_timeout()
                     elif parts[0] == "/block" and len(parts) > 1:
                         rate_limiter.block_ip(parts[1])
@@ -77,6 +142,64 @@ class Terminal:
                         print()
                         await self._reset_session_timeout()
                     
+                    elif parts[0] == "/bans":
+                        bans = rate_limiter.connections.active_bans()
+                        print(f"\n{Fore.RED}⏳ Temporary bans ({len(bans)}):{Style.RESET_ALL}")
+                        for network, remaining in bans:
+                            print(f"  {Fore.YELLOW}{network}{Fore.WHITE} - {remaining:.0f}s left{Style.RESET_ALL}")
+                        print()
+                        await self._reset_session_timeout()
+                    
+                    elif parts[0] == "/stats":
+                        print(f"\n{Fore.CYAN}📊 Proxy stats:{Style.RESET_ALL}")
+                        for name, value in sorted(rate_limiter.metrics.items()):
+                            print(f"  {Fore.WHITE}{name}: {Fore.YELLOW}{value}{Style.RESET_ALL}")
+                        buffers = rate_limiter.buffers.stats()
+                        print(f"  {Fore.WHITE}buffered bytes: {Fore.YELLOW}{buffers['used']}/{buffers['limit']}"
+                              f"{Fore.WHITE} (peak {buffers['peak']}, {buffers['holding']} connections, {buffers['shed']} shed){Style.RESET_ALL}")
+                        print()
+                        await self._reset_session_timeout()
+                    
+                    elif parts[0] == "/attack":
+                        attack = rate_limiter.attack_detector
+                        if attack is None:
+                            print(f"{Fore.YELLOW}⚠️ Attack detection is disabled{Style.RESET_ALL}")
+                        else:
+                            status = attack.describe()
+                            color = Fore.RED if status["active"] else Fore.GREEN
+                            print(f"\n{color}🛡️ Attack mode {'ON' if status['active'] else 'off'} for {status['for_seconds']}s{Style.RESET_ALL}")
+                            for name, value in status["signals"].items():
+                                print(f"  {Fore.WHITE}{name}: {Fore.YELLOW}{value}{Fore.WHITE} (threshold {status['thresholds'][name]}){Style.RESET_ALL}")
+                            print(f"  {Fore.WHITE}known good IPs: {Fore.YELLOW}{status['known_good_ips']}{Style.RESET_ALL}")
+                            for transition in status["transitions"][-5:]:
+                                when = time.strftime("%H:%M:%S", time.localtime(transition["time"]))
+                                print(f"  {Fore.WHITE}{when} {'enabled' if transition['active'] else 'disabled'}: {transition['reason']}{Style.RESET_ALL}")
+                            print()
+                        await self._reset_session_timeout()
+
+                    elif parts[0] == "/profile":
+                        if len(parts) > 1 and parts[1] in ("on", "off"):
+                            rate_limiter.set_profiling(parts[1] == "on")
+                            print(f"{Fore.CYAN}⏱️ Profiling {'enabled for new connections' if parts[1] == 'on' else 'disabled'}{Style.RESET_ALL}")
+                        elif rate_limiter.profiler is None:
+                            print(f"{Fore.YELLOW}⚠️ Profiling is disabled; /profile on to start{Style.RESET_ALL}")
+                        elif len(parts) > 1 and parts[1] == "reset":
+                            rate_limiter.profiler.reset()
+                            print(f"{Fore.CYAN}⏱️ Profile reset{Style.RESET_ALL}")
+                        else:
+                            profile = rate_limiter.profiler.describe()
+                            print(f"\n{Fore.CYAN}⏱️ Profile over the last {profile['seconds']}s (microseconds):{Style.RESET_ALL}")
+                            for group in ("stages", "latency"):
+                                for name, summary in profile[group].items():
+                                    print(f"  {Fore.WHITE}{name:<11}{Fore.YELLOW} n={summary['count']:<9} mean={summary['mean_us']:<9} "
+                                          f"p50={summary['p50_us']:<9} p99={summary['p99_us']:<9} p99.9={summary['p99.9_us']:<9} max={summary['max_us']}{Style.RESET_ALL}")
+                            print(f"  {Fore.CYAN}Packets by bytes:{Style.RESET_ALL}")
+                            for row in profile["packets"][:15]:
+                                print(f"  {Fore.WHITE}{row['direction']:<10} {row['state']:<9} {row['packet_id']:<6}"
+                                      f"{Fore.YELLOW} {row['packets']} packets, {row['bytes']} bytes{Style.RESET_ALL}")
+                            print()
+                        await self._reset_session_timeout()
+
                     elif parts[0] == "/help":
                         print(help_text)
                         await self._reset_session_timeout()
@@ -84,10 +207,14 @@ class Terminal:
                     elif parts[0] == "/allow-con":
                         if parts[1] == "true":
                             print(f"\n{Fore.CYAN}🔓 Allowing all connections to server {rate_limiter.server_selected}...{Style.RESET_ALL}")
-                            rate_limiter.allowed_connection = True
+                            matched = rate_limiter.set_allowed_connection(rate_limiter.server_selected, True)
                         elif parts[1] == "false":
                             print(f"\n{Fore.RED}🔒 Blocking all connections to server {rate_limiter.server_selected}...{Style.RESET_ALL}")
-                            rate_limiter.allowed_connection = False
+                            matched = rate_limiter.set_allowed_connection(rate_limiter.server_selected, False)
+                        else:
+                            continue
+                        if not matched:
+                            print(f"{Fore.YELLOW}⚠️ No backend is at {rate_limiter.server_selected}; see /backends{Style.RESET_ALL}")
                     elif parts[0] == "/exit":
                         print(f"\n{Fore.MAGENTA}🌸 Shutting down proxy...{Style.RESET_ALL}")
                         exit(0)
@@ -0,0 +1,89 @@
+import asyncio
+import math
+
+
+class Timer:
+    __slots__ = ("expires", "callback", "slot")
+
+    def __init__(self, expires: int, callback):
+        self.expires = expires
+        self.callback = callback
+        self.slot = None
+
+
+class TimerWheel:
+    """Hashed timer wheel shared by every connection on one event loop.
+
+    Deadlines are rounded up to whole ticks and hashed into ``slots`` buckets
+    by expiry tick. One ``call_at`` per tick walks a single bucket, so
+    scheduling and cancelling are set operations and the per-tick cost only
+    depends on how many timers share a bucket, not on how many exist. The
+    wheel stops ticking while it is empty.
+    """
+
+    def __init__(self, tick: float = 0.1, slots: int = 1024):
+        self.tick = tick
+        self.now = 0
+        self.pending = 0
+        self.fired = 0
+        self._slots = [set() for _ in range(slots)]
+        self._loop = None
+        self._origin = 0.0
+        self._handle = None
+
+    def __len__(self):
+        return self.pending
+
+    def schedule(self, delay: float, callback) -> Timer:
+        """Call ``callback()`` once ``delay`` seconds have passed, at tick resolution."""
+        if self._handle is None:
+            self._start()
+        timer = Timer(self.now + max(1, math.ceil(delay / self.tick)), callback)
+        slot = self._slots[timer.expires % len(self._slots)]
+        slot.add(timer)
+        timer.slot = slot
+        self.pending += 1
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        if timer.slot is not None:
+            timer.slot.discard(timer)
+            timer.slot = None
+            self.pending -= 1
+
+    def elapsed(self, since: int) -> float:
+        """Seconds between tick ``since`` and the current tick."""
+        return (self.now - since) * self.tick
+
+    def _start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        # Keep counting from the current tick when restarting after idling.
+        self._origin = self._loop.time() - self.now * self.tick
+        self._arm()
+
+    def _arm(self) -> None:
+        self._handle = self._loop.call_at(self._origin + (self.now + 1) * self.tick, self._advance)
+
+    def _advance(self) -> None:
+        target = max(self.now + 1, int((self._loop.time() - self._origin) / self.tick))
+        # After a stall, visit each bucket at most once.
+        steps = min(target - self.now, len(self._slots))
+        due = []
+        for tick in range(target - steps + 1, target + 1):
+            slot = self._slots[tick % len(self._slots)]
+            if slot:
+                expired = [timer for timer in slot if timer.expires <= target]
+                for timer in expired:
+                    slot.discard(timer)
+                    timer.slot = None
+                due += expired
+        self.now = target
+        self.pending -= len(due)
+        self.fired += len(due)
+        for timer in due:
+            timer.callback()
+
+        if self.pending:
+            self._arm()
+        else:
+            self._handle = None
@@ -1,11 +1,279 @@
-from flask import Flask
+import asyncio
+import json
 
-app = Flask(__name__)
-app.logger.disabled = True
+from src.blocklist.index import BlocklistIndex
 
-def run():
-    app.run('localhost', 8080)
+MAX_HEADER_BYTES = 8192
+MAX_BODY_BYTES = 65536
+KEEP_ALIVE_TIMEOUT = 30
 
-@app.route("/")
-def index():
-    return "<p>server enabled</p>"
\ No newline at end of file
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+}
+
+# Counters in DragonAegis.metrics with a dedicated metric name; everything
+# else is exported as dragonaegis_<name>_total.
+_BYTES_DIRECTIONS = {"bytes_upstream": "upstream", "bytes_downstream": "downstream"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class AdminServer:
+    """Admin API served from the proxy's own event loop.
+
+    Everything is read straight from in-memory counters, so a ``/metrics``
+    scrape is a few dict lookups and one string join.
+    """
+
+    def __init__(self, rate_limiter, host: str = "localhost", port: int = 8080):
+        self.rate_limiter = rate_limiter
+        self.host = host
+        self.port = port
+        self.server = None
+        self.routes = {
+            ("GET", "/"): self.index,
+            ("GET", "/metrics"): self.metrics,
+            ("GET", "/stats"): self.stats,
+            ("GET", "/blocked"): self.blocked,
+            ("GET", "/attack"): self.attack,
+            ("GET", "/top"): self.top,
+            ("GET", "/backends"): self.backends,
+            ("GET", "/profile"): self.profile,
+            ("POST", "/block"): self.block,
+            ("POST", "/unblock"): self.unblock,
+        }
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 413, "text/plain", b"Headers too large", False)
+                    break
+                if len(head) > MAX_HEADER_BYTES:
+                    await self._respond(writer, 413, "text/plain", b"Headers too large", False)
+                    break
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, "text/plain", b"Malformed request line", False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                # Digits only: int() would also take signs, spaces and underscores.
+                length = headers.get("content-length", "0") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    await self._respond(writer, 400, "text/plain", b"Invalid Content-Length", False)
+                    break
+                length = int(length)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, "text/plain", b"Body too large", False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                status, content_type, payload = await self._dispatch(method, target.split("?", 1)[0], body)
+                await self._respond(writer, status, content_type, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, body: bytes):
+        handler = self.routes.get((method, path))
+        if handler is None:
+            status = 405 if any(route_path == path for _, route_path in self.routes) else 404
+            return status, "application/json", json.dumps({"error": REASONS[status]}).encode()
+        try:
+            return handler(body)
+        except HTTPError as e:
+            return e.status, "application/json", json.dumps({"error": str(e)}).encode()
+
+    async def _respond(self, writer, status: int, content_type: str, payload: bytes, keep_alive: bool):
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + payload)
+        await writer.drain()
+
+    @staticmethod
+    def _json(data, status: int = 200):
+        return status, "application/json", json.dumps(data).encode()
+
+    @staticmethod
+    def _parse_entry(body: bytes) -> str:
+        try:
+            entry = json.loads(body or b"{}").get("ip")
+        except (ValueError, AttributeError):
+            raise HTTPError(400, "Body must be a JSON object") from None
+        if not isinstance(entry, str):
+            raise HTTPError(400, "Missing 'ip'")
+        try:
+            return BlocklistIndex.normalize(entry)
+        except ValueError:
+            raise HTTPError(400, f"Invalid IP or CIDR: {entry}") from None
+
+    def index(self, body):
+        return 200, "text/html", b"<p>server enabled</p>"
+
+    def metrics(self, body):
+        rate_limiter = self.rate_limiter
+        counters = rate_limiter.metrics
+        lines = [
+            "# TYPE dragonaegis_active_connections gauge",
+            f"dragonaegis_active_connections {rate_limiter.active_total}",
+            "# TYPE dragonaegis_connections_accepted_total counter",
+            f"dragonaegis_connections_accepted_total {counters.get('accepted', 0)}",
+            "# TYPE dragonaegis_connections_rejected_total counter",
+        ]
+        other = []
+        for name, value in counters.items():
+            if name.startswith("rejected_"):
+                lines.append(f'dragonaegis_connections_rejected_total{{reason="{name[9:]}"}} {value}')
+            elif name in _BYTES_DIRECTIONS:
+                continue
+            elif name != "accepted":
+                other.append((name, value))
+        lines += [
+            "# TYPE dragonaegis_bytes_forwarded_total counter",
+            f'dragonaegis_bytes_forwarded_total{{direction="upstream"}} {counters.get("bytes_upstream", 0)}',
+            f'dragonaegis_bytes_forwarded_total{{direction="downstream"}} {counters.get("bytes_downstream", 0)}',
+            "# TYPE dragonaegis_packets_per_second gauge",
+            f"dragonaegis_packets_per_second {rate_limiter.packets_per_second:.1f}",
+            "# TYPE dragonaegis_event_loop_lag_seconds gauge",
+            f"dragonaegis_event_loop_lag_seconds {rate_limiter.loop_lag:.6f}",
+            "# TYPE dragonaegis_blocklist_entries gauge",
+            f"dragonaegis_blocklist_entries {len(rate_limiter.blocked_ips)}",
+            "# TYPE dragonaegis_buffer_bytes gauge",
+            f"dragonaegis_buffer_bytes {rate_limiter.buffers.used}",
+            "# TYPE dragonaegis_buffer_budget_bytes gauge",
+            f"dragonaegis_buffer_budget_bytes {rate_limiter.buffers.limit}",
+            "# TYPE dragonaegis_buffer_shed_total counter",
+            f"dragonaegis_buffer_shed_total {rate_limiter.buffers.shed}",
+            "# TYPE dragonaegis_pending_deadlines gauge",
+            f"dragonaegis_pending_deadlines {len(rate_limiter.timers)}",
+        ]
+        for name, value in other:
+            lines.append(f"# TYPE dragonaegis_{name}_total counter")
+            lines.append(f"dragonaegis_{name}_total {value}")
+
+        attack = rate_limiter.attack_detector
+        if attack is not None:
+            lines += [
+                "# TYPE dragonaegis_attack_mode gauge",
+                f"dragonaegis_attack_mode {int(attack.active)}",
+                "# TYPE dragonaegis_attack_signal gauge",
+            ]
+            for name, value in attack.signals.items():
+                lines.append(f'dragonaegis_attack_signal{{signal="{name}"}} {value:.3f}')
+
+        router = rate_limiter.router
+        if router is not None:
+            backends = list(router.backends.values())
+            lines.append("# TYPE dragonaegis_backend_up gauge")
+            lines += [f'dragonaegis_backend_up{{backend="{b.address}",id="{b.id}"}} {int(b.healthy)}' for b in backends]
+            lines.append("# TYPE dragonaegis_backend_active_connections gauge")
+            lines += [f'dragonaegis_backend_active_connections{{backend="{b.address}",id="{b.id}"}} {b.active}' for b in backends]
+            lines.append("# TYPE dragonaegis_backend_connections_total counter")
+            lines += [f'dragonaegis_backend_connections_total{{backend="{b.address}",id="{b.id}"}} {b.total}' for b in backends]
+
+        db_manager = rate_limiter.db_manager
+        if db_manager is not None:
+            lines += [
+                "# TYPE dragonaegis_db_queue_depth gauge",
+                f"dragonaegis_db_queue_depth {db_manager.queue_depth}",
+                "# TYPE dragonaegis_db_dropped_events_total counter",
+                f"dragonaegis_db_dropped_events_total {db_manager.dropped_events}",
+                "# TYPE dragonaegis_db_last_flush_seconds gauge",
+                f"dragonaegis_db_last_flush_seconds {db_manager.last_flush_latency:.6f}",
+            ]
+        lines.append("")
+        return 200, "text/plain; version=0.0.4", "\n".join(lines).encode()
+
+    def stats(self, body):
+        rate_limiter = self.rate_limiter
+        db_manager = rate_limiter.db_manager
+        return self._json({
+            "active_connections": rate_limiter.active_total,
+            "packets_per_second": rate_limiter.packets_per_second,
+            "event_loop_lag": rate_limiter.loop_lag,
+            "metrics": dict(rate_limiter.metrics),
+            "blocklist_entries": len(rate_limiter.blocked_ips),
+            "buffers": rate_limiter.buffers.stats(),
+            "pending_deadlines": len(rate_limiter.timers),
+            "snapshot": rate_limiter.last_snapshot,
+            "attack_mode": rate_limiter.attack_detector.active if rate_limiter.attack_detector is not None else None,
+            "db_queue": db_manager.queue_stats() if db_manager is not None else None,
+        })
+
+    def blocked(self, body):
+        return self._json({
+            "blocked": self.rate_limiter.list_blocked(),
+            "bans": [
+                {"network": network, "remaining": round(remaining, 1)}
+                for network, remaining in self.rate_limiter.connections.active_bans()
+            ],
+        })
+
+    def attack(self, body):
+        attack = self.rate_limiter.attack_detector
+        if attack is None:
+            raise HTTPError(404, "Attack detection is disabled")
+        return self._json(attack.describe())
+
+    def top(self, body):
+        rate_limiter = self.rate_limiter
+        return self._json({
+            "active_connections": rate_limiter.active_total,
+            "half_life": rate_limiter.heavy_hitters.half_life,
+            **rate_limiter.heavy_hitters.snapshot(),
+        })
+
+    def backends(self, body):
+        router = self.rate_limiter.router
+        if router is None:
+            raise HTTPError(404, "Routing is disabled")
+        return self._json(router.describe())
+
+    def profile(self, body):
+        profiler = self.rate_limiter.profiler
+        if profiler is None:
+            raise HTTPError(404, "Profiling is disabled")
+        return self._json(profiler.describe())
+
+    def block(self, body):
+        return self._json({"blocked": self.rate_limiter.block_ip(self._parse_entry(body))})
+
+    def unblock(self, body):
+        return self._json({"unblocked": self.rate_limiter.unblock_ip(self._parse_entry(body))})
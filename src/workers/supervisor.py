@@ -0,0 +1,122 @@
+import mmap
+import os
+import signal
+import struct
+import time
+import traceback
+
+from multiprocessing import Lock
+
+from src.ratelimit.shared import SharedCounterTable
+
+EVENT_BLOCK = 1
+EVENT_UNBLOCK = 2
+EVENT_BAN = 3
+
+_HEADER = struct.Struct("=Q")
+# sequence, kind, entry length, expiry (monotonic clock), entry
+_EVENT = struct.Struct("=QBBd64s")
+
+
+class SharedEventLog:
+    """Fixed-size ring of block/ban events in shared memory.
+
+    Writers serialise on one lock; readers poll without locking and keep
+    their own cursor. A reader that falls more than ``capacity`` events
+    behind is told it overran so it can resync from the database.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self._mem = mmap.mmap(-1, _HEADER.size + capacity * _EVENT.size, flags=mmap.MAP_SHARED)
+        self._lock = Lock()
+
+    @property
+    def sequence(self) -> int:
+        return _HEADER.unpack_from(self._mem, 0)[0]
+
+    def _offset(self, seq: int) -> int:
+        return _HEADER.size + (seq % self.capacity) * _EVENT.size
+
+    def publish(self, kind: int, entry: str, expires: float = 0.0) -> int:
+        data = entry.encode("utf-8")
+        if len(data) > 64:
+            raise ValueError(f"Event entry too long: {entry}")
+        with self._lock:
+            seq = self.sequence + 1
+            _EVENT.pack_into(self._mem, self._offset(seq), seq, kind, len(data), expires, data)
+            _HEADER.pack_into(self._mem, 0, seq)
+        return seq
+
+    def read(self, after: int):
+        """Return ``(events, cursor, overrun)`` for everything published after ``after``."""
+        head = self.sequence
+        overrun = head - after > self.capacity
+        if overrun:
+            after = head - self.capacity
+        events = []
+        for seq in range(after + 1, head + 1):
+            slot_seq, kind, length, expires, data = _EVENT.unpack_from(self._mem, self._offset(seq))
+            if slot_seq != seq:
+                overrun = True
+                continue
+            events.append((kind, data[:length].decode("utf-8"), expires))
+        return events, head, overrun
+
+
+class SharedState:
+    """Everything the workers share; must be created before forking."""
+
+    def __init__(self, counter_slots: int = 1 << 20, event_capacity: int = 4096):
+        self.counters = SharedCounterTable(slots=counter_slots)
+        self.events = SharedEventLog(capacity=event_capacity)
+
+
+def run_workers(count: int, target) -> None:
+    """Fork ``count`` processes running ``target(worker_id)`` and keep them alive until interrupted."""
+    children = {}
+    stopping = False
+
+    def spawn(worker_id):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+            code = 0
+            try:
+                target(worker_id)
+            except KeyboardInterrupt:
+                pass
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = worker_id
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for worker_id in range(count):
+        spawn(worker_id)
+    print(f"Started {count} workers: {', '.join(str(pid) for pid in children)}")
+
+    signal.signal(signal.SIGTERM, stop)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except KeyboardInterrupt:
+            stop()
+            continue
+        worker_id = children.pop(pid, None)
+        if worker_id is not None and not stopping:
+            print(f"Worker {worker_id} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            time.sleep(1)
+            spawn(worker_id)
@@ -0,0 +1,102 @@
+import asyncio
+
+from dragonaegis import DragonAegis
+from src.protocol.encoder import encode_frame, encode_handshake
+from src.protocol.status import StatusCache
+from src.ratelimit.attack import AttackDetector, RecentSet
+
+
+def test_recent_set_forgets_after_two_generations():
+    recent = RecentSet(ttl=10, max_keys=100)
+    now = recent._rotated
+    assert recent.add("a", now=now)
+    assert not recent.add("a", now=now + 1)
+    recent.add("b", now=now + 11)
+    assert "a" in recent
+    recent.add("c", now=now + 22)
+    assert "a" not in recent and "b" in recent
+
+
+def test_enters_after_a_streak_and_leaves_once_calm():
+    detector = AttackDetector(connection_rate=10, enter_after=2, exit_after=2)
+    now = 1000.0
+    detector._last = now
+    for tick in (1, 2):
+        for i in range(20):
+            detector.record_connection(f"10.0.{tick}.{i}")
+        transition = detector.evaluate(now + tick)
+    assert transition and detector.active
+    assert not detector.evaluate(now + 3)
+    assert detector.evaluate(now + 4)
+    assert not detector.active
+    assert [entry["active"] for entry in detector.transitions] == [True, False]
+
+
+def test_failure_ratio_needs_enough_handshakes():
+    detector = AttackDetector(failure_ratio=0.5, min_handshakes=10, enter_after=1)
+    detector._last = 0.0
+    for _ in range(5):
+        detector.record_failure()
+    assert not detector.evaluate(1.0)
+    assert detector.signals["failure_ratio"] == 0.0
+    for _ in range(8):
+        detector.record_failure()
+    for _ in range(2):
+        detector.record_success()
+    assert detector.evaluate(2.0)
+    assert detector.signals["failure_ratio"] == 0.8
+
+
+def test_admission_prefers_known_good_ips():
+    detector = AttackDetector(unknown_rate=2)
+    detector.record_success("1.1.1.1")
+    assert all(detector.admit("1.1.1.1") for _ in range(10))
+    assert [detector.admit(f"2.2.2.{i}") for i in range(4)] == [True, True, False, False]
+
+
+def status_exchanges(*exchanges):
+    """Run each client byte string through handle_client; return the detector's failure ratio."""
+    async def main():
+        detector = AttackDetector(min_handshakes=1)
+        # Nothing listens on port 1, so the cache answers with its fallback status.
+        cache = StatusCache("127.0.0.1", 1, timeout=0.5)
+        rate_limiter = DragonAegis(None, status_cache=cache, attack_detector=detector, login_timeout=0.5)
+        server = await asyncio.start_server(
+            lambda r, w: DragonAegis.handle_client(r, w, "127.0.0.1", 1, rate_limiter), "127.0.0.1", 0
+        )
+        for data in exchanges:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+            writer.write(data)
+            await writer.drain()
+            await asyncio.wait_for(reader.read(), 2)
+            writer.close()
+        server.close()
+        detector._last -= 1
+        detector.evaluate()
+        return detector.signals["failure_ratio"], rate_limiter.metrics
+
+    return asyncio.run(main())
+
+
+HANDSHAKE = encode_handshake("localhost", 25565, 1)
+STATUS_REQUEST = encode_frame(0x00)
+PING = encode_frame(0x01, bytes(8))
+
+
+def test_answered_status_counts_as_success():
+    ratio, metrics = status_exchanges(HANDSHAKE + STATUS_REQUEST + PING, HANDSHAKE + STATUS_REQUEST)
+    assert ratio == 0.0
+    assert metrics["status_served"] == 2
+
+
+def test_unanswered_status_counts_as_failure():
+    ratio, metrics = status_exchanges(
+        HANDSHAKE + STATUS_REQUEST + PING,
+        HANDSHAKE,
+        HANDSHAKE + encode_frame(0x05),
+        HANDSHAKE + PING,
+    )
+    assert ratio == 0.75
+    assert metrics["status_served"] == 1
+    assert metrics["rejected_status_timeout"] + metrics["rejected_early_close"] == 1
+    assert metrics["rejected_invalid_packet"] == 2
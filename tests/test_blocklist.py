@@ -0,0 +1,61 @@
+import pytest
+
+from src.blocklist.index import BlocklistIndex
+
+
+def test_single_addresses_and_ranges():
+    index = BlocklistIndex(["1.2.3.4", "10.0.0.0/8", "2001:db8::/32"])
+    assert "1.2.3.4" in index
+    assert "1.2.3.5" not in index
+    assert "10.200.1.1" in index
+    assert "11.0.0.1" not in index
+    assert "2001:db8:1::5" in index
+    assert "2001:db9::1" not in index
+
+
+def test_most_specific_match_wins():
+    index = BlocklistIndex(["10.0.0.0/8", "10.1.0.0/16", "10.1.2.3"])
+    assert index.match("10.1.2.3") == 32
+    assert index.match("10.1.9.9") == 16
+    assert index.match("10.9.9.9") == 8
+
+
+def test_entries_are_normalized():
+    index = BlocklistIndex()
+    assert index.add("10.1.2.3/8") == "10.0.0.0/8"
+    assert index.add("1.2.3.4/32") == "1.2.3.4"
+    assert index.add("::ffff:5.6.7.8") == "5.6.7.8"
+    assert index.add("10.0.0.0/8") == "10.0.0.0/8"
+    assert sorted(index) == ["1.2.3.4", "10.0.0.0/8", "5.6.7.8"]
+
+
+def test_ipv4_mapped_lookups():
+    index = BlocklistIndex(["5.6.7.0/24"])
+    assert "::ffff:5.6.7.8" in index
+
+
+def test_remove_keeps_other_entries():
+    index = BlocklistIndex(["10.0.0.0/8", "10.1.0.0/16"])
+    assert index.remove("10.1.0.0/16")
+    assert not index.remove("10.1.0.0/16")
+    assert index.match("10.1.2.3") == 8
+    assert index.remove("10.0.0.0/8")
+    assert "10.1.2.3" not in index
+    assert len(index) == 0
+
+
+def test_invalid_input():
+    index = BlocklistIndex()
+    with pytest.raises(ValueError):
+        index.add("not an ip")
+    assert index.match("not an ip") is None
+    assert index.match(None) is None
+
+
+def test_sync_touches_only_the_difference():
+    index = BlocklistIndex(["1.1.1.1", "2.2.2.0/24"])
+    added, removed = index.sync(["2.2.2.0/24", "3.3.3.3", "garbage"], keep={"4.4.4.4"})
+    assert sorted(added) == ["3.3.3.3", "4.4.4.4"]
+    assert removed == ["1.1.1.1"]
+    assert sorted(index) == ["2.2.2.0/24", "3.3.3.3", "4.4.4.4"]
+    assert index.sync(index) == ([], [])
@@ -0,0 +1,75 @@
+from src.protocol.budget import ByteBudget
+
+
+def holders(budget):
+    return sum(holder[0] for holder in budget._holders.values())
+
+
+def test_usage_tracks_updates_and_releases():
+    budget = ByteBudget(limit=1000, connection_limit=500)
+    a = budget.register(lambda: None)
+    b = budget.register(lambda: None)
+    assert budget.update(a, 100)
+    assert budget.update(b, 300)
+    assert budget.update(a, 50)
+    assert budget.used == 350 == holders(budget)
+    assert budget.peak == 400
+    budget.release(a)
+    budget.release(a)
+    assert budget.used == 300 == holders(budget)
+    assert len(budget) == 1
+
+
+def test_one_connection_over_its_limit_is_refused():
+    aborted = []
+    budget = ByteBudget(limit=1000, connection_limit=100)
+    token = budget.register(lambda: aborted.append(token))
+    assert not budget.update(token, 101)
+    assert budget.refused == 1
+    # Refused, not shed: the caller closes it, the budget only forgets it.
+    assert aborted == []
+    assert budget.used == 0 and len(budget) == 0
+    assert not budget.update(token, 1)
+
+
+def test_shedding_prefers_earlier_stages_then_newest():
+    aborted = []
+    budget = ByteBudget(limit=1000, connection_limit=1000, shed_to=0.6)
+    tokens = {}
+    for name, stage in (("play", "play"), ("old_handshake", "handshake"), ("login", "login"), ("new_handshake", "handshake")):
+        tokens[name] = budget.register(lambda name=name: aborted.append(name), stage)
+    for name in tokens:
+        assert budget.update(tokens[name], 240)
+    idle = budget.register(lambda: aborted.append("idle"), "handshake")
+
+    assert budget.update(tokens["play"], 300)
+    assert aborted == ["new_handshake", "old_handshake"]
+    assert budget.used == 540 == holders(budget)
+    assert budget.used <= budget.limit
+    assert budget.shed == 2
+    # Holding nothing, so never a candidate.
+    assert idle in budget._holders
+
+
+def test_the_updating_connection_can_be_shed_itself():
+    budget = ByteBudget(limit=100, connection_limit=100)
+    aborted = []
+    token = budget.register(lambda: aborted.append(token), "handshake")
+    other = budget.register(lambda: aborted.append(other), "play")
+    assert budget.update(other, 50)
+    assert not budget.update(token, 60)
+    assert aborted == [token]
+    assert budget.used == 50
+
+
+def test_stage_changes():
+    budget = ByteBudget(limit=100, connection_limit=100, shed_to=0.8)
+    aborted = []
+    first = budget.register(lambda: aborted.append("first"))
+    second = budget.register(lambda: aborted.append("second"))
+    budget.set_stage(second, "play")
+    budget.set_stage(12345, "play")
+    budget.update(first, 40)
+    budget.update(second, 70)
+    assert aborted == ["first"]
+    assert budget.stats()["connections"] == 1
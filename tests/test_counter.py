@@ -0,0 +1,21 @@
+import pytest
+
+from src.protocol.decoder import FrameCounter, FrameError
+from src.protocol.encoder import encode_frame, encode_varint
+
+
+def test_counter_matches_decoder_across_splits():
+    stream = b"".join(encode_frame(i % 5, b"p" * (i * 37 % 400)) for i in range(50))
+    for step in (1, 2, 3, 7, 64, len(stream)):
+        counter = FrameCounter()
+        counted = sum(counter.count(stream[i:i + step]) for i in range(0, len(stream), step))
+        assert counted == 50
+
+
+def test_counter_errors():
+    with pytest.raises(FrameError):
+        FrameCounter().count(b"\x00")
+    with pytest.raises(FrameError):
+        FrameCounter(max_frame_size=10).count(encode_varint(11))
+    with pytest.raises(FrameError):
+        FrameCounter().count(b"\xff\xff\xff\x01")
@@ -0,0 +1,108 @@
+import pytest
+
+from src.protocol.decoder import FrameDecoder, FrameError, read_varint
+from src.protocol.encoder import encode_frame, encode_varint
+
+
+def frames(decoder):
+    return [(frame.packet_id, bytes(frame.payload)) for frame in decoder]
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 255, 25565, 2097151, 2 ** 31 - 1])
+def test_varint_round_trip(value):
+    data = encode_varint(value)
+    assert read_varint(data) == (value, len(data))
+
+
+def test_varint_incomplete_and_too_long():
+    assert read_varint(b"\x80\x80") == (None, 0)
+    assert read_varint(b"\x00\xff", offset=1) == (None, 1)
+    with pytest.raises(FrameError):
+        read_varint(b"\xff" * 6)
+
+
+def test_frames_fed_byte_by_byte():
+    # Length prefixes and packet ids of two and three bytes straddle every boundary.
+    stream = encode_frame(0x00, b"a") + encode_frame(0x1234, b"x" * 300) + encode_frame(0x7F, b"")
+    decoder = FrameDecoder(initial_size=16)
+    seen = []
+    for i in range(len(stream)):
+        decoder.feed(stream[i:i + 1])
+        seen += frames(decoder)
+    assert seen == [(0x00, b"a"), (0x1234, b"x" * 300), (0x7F, b"")]
+    assert len(decoder) == 0
+
+
+def test_frame_data_includes_length_prefix():
+    data = encode_frame(0x05, b"hello")
+    decoder = FrameDecoder()
+    decoder.feed(data)
+    frame = decoder.next_frame()
+    assert bytes(frame.data) == data
+    assert decoder.next_frame() is None
+
+
+def test_empty_frame_is_rejected():
+    decoder = FrameDecoder()
+    decoder.feed(b"\x00")
+    with pytest.raises(FrameError):
+        decoder.next_frame()
+
+
+def test_oversize_frame_is_rejected_before_its_body_arrives():
+    decoder = FrameDecoder(max_frame_size=1024)
+    decoder.feed(encode_varint(1025))
+    with pytest.raises(FrameError):
+        decoder.next_frame()
+
+
+def test_length_prefix_longer_than_three_bytes_is_rejected():
+    decoder = FrameDecoder()
+    decoder.feed(b"\x80\x80\x80\x01")
+    with pytest.raises(FrameError):
+        decoder.next_frame()
+
+
+def test_truncated_packet_id_is_rejected():
+    decoder = FrameDecoder()
+    decoder.feed(b"\x01\x80")
+    with pytest.raises(FrameError):
+        decoder.next_frame()
+
+
+def test_compaction_reuses_the_buffer():
+    decoder = FrameDecoder(initial_size=64)
+    frame = encode_frame(0x01, b"z" * 20)
+    for _ in range(100):
+        decoder.feed(frame + frame[:5])
+        assert frames(decoder) == [(0x01, b"z" * 20)]
+        decoder.feed(frame[5:])
+        assert frames(decoder) == [(0x01, b"z" * 20)]
+    # Consumed frames are reclaimed by moving the tail, not by growing.
+    assert decoder.capacity == 64
+
+
+def test_buffer_grows_for_large_frames():
+    decoder = FrameDecoder(initial_size=16)
+    payload = bytes(range(256)) * 40
+    decoder.feed(encode_frame(0x02, payload))
+    assert frames(decoder) == [(0x02, payload)]
+    assert decoder.capacity >= len(payload)
+
+
+def test_partial_frame_completed_by_next_feed():
+    decoder = FrameDecoder(initial_size=32)
+    decoder.feed(encode_frame(0x01, b"a" * 10) + encode_frame(0x02, b"b" * 4)[:3])
+    first = decoder.next_frame()
+    assert bytes(first.payload) == b"a" * 10
+    decoder.feed(encode_frame(0x02, b"b" * 4)[3:])
+    assert frames(decoder) == [(0x02, b"b" * 4)]
+
+
+def test_take_pending_returns_the_undecoded_tail():
+    decoder = FrameDecoder()
+    tail = encode_frame(0x03, b"rest")[:4]
+    decoder.feed(encode_frame(0x01, b"x") + tail)
+    assert frames(decoder) == [(0x01, b"x")]
+    assert decoder.take_pending() == tail
+    assert len(decoder) == 0
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from src.stats.heavy_hitters import SpaceSaving, subnet_of
+
+
+def test_space_saving_finds_heavy_keys_within_its_error():
+    counter = SpaceSaving(capacity=10, half_life=1e9)
+    rng = random.Random(7)
+    true = {}
+    stream = [f"heavy{i}" for i in range(5) for _ in range(200)] + [f"noise{rng.randrange(5000)}" for _ in range(3000)]
+    rng.shuffle(stream)
+    for key in stream:
+        counter.add(key, now=0.0)
+        true[key] = true.get(key, 0) + 1
+    assert len(counter) <= 20
+    top = counter.top(5, now=0.0)
+    assert sorted(key for key, _, _ in top) == [f"heavy{i}" for i in range(5)]
+    for key, count, error in top:
+        # Never an undercount, and never over by more than the recorded error.
+        assert true[key] <= count + 1e-6
+        assert count - error <= true[key] + 1e-6
+
+
+def test_space_saving_decays():
+    counter = SpaceSaving(capacity=10, half_life=10.0)
+    counter.add("old", 100, now=0.0)
+    counter.add("new", 30, now=20.0)
+    top = dict((key, count) for key, count, _ in counter.top(now=20.0))
+    assert top["old"] == pytest.approx(25.0)
+    assert top["new"] == pytest.approx(30.0)
+    assert counter.top(1, now=20.0)[0][0] == "new"
+
+
+def test_space_saving_export_restore():
+    counter = SpaceSaving(capacity=4, half_life=10.0)
+    for i in range(10):
+        counter.add(i % 3, i, now=float(i))
+    restored = SpaceSaving(capacity=4, half_life=10.0)
+    restored.restore(*counter.export(now=10.0), now=10.0)
+    assert restored.top(now=10.0) == pytest.approx(counter.top(now=10.0))
+
+
+def test_subnet_of():
+    assert subnet_of("1.2.3.4") == "1.2.3.0/24"
+    assert subnet_of("2001:db8:1:2::5") == "2001:db8:1::/48"
@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+from dragonaegis import DragonAegis
+from src.database.MemoryManager import MemoryManager
+from src.web.http import MAX_BODY_BYTES, AdminServer
+
+
+def admin_requests(*requests, aegis=None):
+    """Send each raw request on its own connection; returns ``(status, headers, body)`` per request."""
+    async def main():
+        rate_limiter = aegis or DragonAegis(MemoryManager())
+        admin = AdminServer(rate_limiter, "127.0.0.1", 0)
+        server = await admin.start()
+        port = server.sockets[0].getsockname()[1]
+        responses = []
+        for raw in requests:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(raw)
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), 2)
+            writer.close()
+            head, _, body = response.partition(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            headers = dict(line.lower().split(": ", 1) for line in lines[1:])
+            responses.append((int(lines[0].split(" ")[1]), headers, body))
+        await admin.close()
+        return responses
+
+    return asyncio.run(main())
+
+
+def get(path):
+    return f"GET {path} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n".encode()
+
+
+def post(path, body, length=None):
+    length = len(body) if length is None else length
+    return f"POST {path} HTTP/1.1\r\nContent-Length: {length}\r\nConnection: close\r\n\r\n".encode() + body
+
+
+def test_metrics_exports_rejections_by_reason():
+    aegis = DragonAegis(MemoryManager())
+    aegis.metrics["accepted"] += 3
+    aegis.metrics["rejected_handshake_timeout"] += 2
+    aegis.metrics["status_served"] += 1
+    [(status, headers, body)] = admin_requests(get("/metrics"), aegis=aegis)
+    assert status == 200 and headers["content-type"].startswith("text/plain")
+    lines = body.decode().splitlines()
+    assert "dragonaegis_connections_accepted_total 3" in lines
+    assert 'dragonaegis_connections_rejected_total{reason="handshake_timeout"} 2' in lines
+    assert "dragonaegis_status_served_total 1" in lines
+    assert "dragonaegis_active_connections 0" in lines
+
+
+def test_block_and_unblock_round_trip():
+    aegis = DragonAegis(MemoryManager())
+    responses = admin_requests(
+        post("/block", b'{"ip": "203.0.113.9/24"}'),
+        get("/blocked"),
+        post("/unblock", b'{"ip": "203.0.113.0/24"}'),
+        get("/blocked"),
+        aegis=aegis,
+    )
+    assert [status for status, _, _ in responses] == [200] * 4
+    assert json.loads(responses[0][2]) == {"blocked": "203.0.113.0/24"}
+    assert json.loads(responses[1][2])["blocked"] == ["203.0.113.0/24"]
+    assert json.loads(responses[3][2])["blocked"] == []
+
+
+def test_bad_bodies_are_rejected():
+    responses = admin_requests(
+        post("/block", b"[1]"),
+        post("/block", b'{"ip": 5}'),
+        post("/block", b'{"ip": "not an ip"}'),
+    )
+    assert [status for status, _, _ in responses] == [400, 400, 400]
+    assert json.loads(responses[2][2]) == {"error": "Invalid IP or CIDR: not an ip"}
+
+
+def test_malformed_requests():
+    responses = admin_requests(
+        post("/block", b"", length="+5"),
+        post("/block", b"", length=MAX_BODY_BYTES + 1),
+        b"GET /metrics HTTP/1.1\r\nX-Pad: " + b"a" * 70000 + b"\r\n\r\n",
+        b"NONSENSE\r\n\r\n",
+    )
+    assert [status for status, _, _ in responses] == [400, 413, 413, 400]
+    assert all(headers["connection"] == "close" for _, headers, _ in responses)
+
+
+def test_unknown_paths_and_methods():
+    responses = admin_requests(get("/nope"), post("/metrics", b""), get("/attack"), get("/metrics?x=1"))
+    assert [status for status, _, _ in responses] == [404, 405, 404, 200]
+
+
+def test_keep_alive_serves_several_requests():
+    async def main():
+        admin = AdminServer(DragonAegis(MemoryManager()), "127.0.0.1", 0)
+        server = await admin.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        statuses = []
+        for _ in range(3):
+            writer.write(b"GET /stats HTTP/1.1\r\n\r\n")
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 2)
+            length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+            statuses.append(int(head.split(b" ")[1]))
+        writer.close()
+        await admin.close()
+        return statuses
+
+    assert asyncio.run(main()) == [200, 200, 200]
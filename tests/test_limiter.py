@@ -0,0 +1,53 @@
+import pytest
+
+from src.ratelimit.limiter import LIMITER_MODES, create_limiter
+
+MODES = sorted(LIMITER_MODES)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_limit_per_interval(mode):
+    limiter = create_limiter(mode, 5, 1.0)
+    now = 100.0
+    assert [limiter.allow("a", now) for _ in range(7)] == [True] * 5 + [False] * 2
+    assert limiter.allow("b", now)
+    # A full interval later the allowance is back.
+    assert limiter.allow("a", now + 2.0)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_cost_is_charged_at_once(mode):
+    limiter = create_limiter(mode, 10, 1.0)
+    assert limiter.allow("a", 100.0, cost=8)
+    assert not limiter.allow("a", 100.0, cost=3)
+    assert limiter.allow("a", 100.0, cost=2)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_check_without_charge(mode):
+    limiter = create_limiter(mode, 3, 1.0)
+    for _ in range(10):
+        assert limiter.allow("a", 100.0, charge=False)
+    assert [limiter.allow("a", 100.0) for _ in range(4)] == [True, True, True, False]
+    assert not limiter.allow("a", 100.0, charge=False)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_tracked_keys_stay_bounded(mode):
+    limiter = create_limiter(mode, 5, 1.0, max_keys=100)
+    for i in range(10000):
+        limiter.allow(i, 100.0)
+    assert len(limiter) <= 100
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_invalid_limits(mode):
+    with pytest.raises(ValueError):
+        create_limiter(mode, 0, 1.0)
+    with pytest.raises(ValueError):
+        create_limiter(mode, 1, 0)
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        create_limiter("leaky", 1, 1.0)
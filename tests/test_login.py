@@ -0,0 +1,76 @@
+import os
+import zlib
+
+from src.protocol.encoder import encode_frame, encode_string, encode_varint
+from src.protocol.login import LoginWatcher
+
+
+def compressed(packet_id, payload=b"", threshold=256):
+    body = encode_varint(packet_id) + payload
+    if len(body) < threshold:
+        return encode_frame(0, body)
+    # The packet id slot carries the uncompressed length.
+    return encode_frame(len(body), zlib.compress(body))
+
+
+def feed_split(watcher, data, step):
+    for i in range(0, len(data), step):
+        watcher.feed(data[i:i + step])
+
+
+def test_encryption_request_is_detected():
+    watcher = LoginWatcher()
+    request = encode_frame(0x01, encode_string("") + encode_varint(4) + b"keyy" + encode_varint(4) + b"tokn")
+    feed_split(watcher, request + os.urandom(64), 1)
+    assert watcher.encrypted and watcher.done
+
+
+def test_offline_login_success():
+    watcher = LoginWatcher()
+    watcher.feed(encode_frame(0x02, bytes(16) + encode_string("alice") + b"\x00"))
+    assert watcher.done and not watcher.encrypted
+
+
+def test_encryption_after_set_compression():
+    for threshold, payload in ((256, b"k" * 10), (16, b"k" * 100)):
+        watcher = LoginWatcher()
+        stream = encode_frame(0x03, encode_varint(threshold)) + compressed(0x01, payload, threshold)
+        feed_split(watcher, stream, 3)
+        assert watcher.encrypted, threshold
+
+
+def test_compressed_login_success():
+    watcher = LoginWatcher()
+    watcher.feed(encode_frame(0x03, encode_varint(16)) + compressed(0x02, b"u" * 64, 16))
+    assert watcher.done and not watcher.encrypted
+
+
+def test_plugin_requests_are_skipped():
+    watcher = LoginWatcher()
+    watcher.feed(encode_frame(0x04, encode_varint(1) + encode_string("velocity:player_info")))
+    assert not watcher.done
+    watcher.feed(encode_frame(0x01, b"x"))
+    assert watcher.encrypted
+
+
+def test_disconnect_garbage_and_size_end_the_watch():
+    watcher = LoginWatcher()
+    watcher.feed(encode_frame(0x00, encode_string('{"text":"bye"}')))
+    assert watcher.done and not watcher.encrypted
+
+    watcher = LoginWatcher()
+    watcher.feed(b"\x00")
+    assert watcher.done and not watcher.encrypted
+
+    watcher = LoginWatcher(max_bytes=100)
+    watcher.feed(encode_frame(0x04, b"p" * 200)[:150])
+    assert watcher.done and not watcher.encrypted
+    watcher.feed(encode_frame(0x01, b"x"))
+    assert not watcher.encrypted
+
+
+def test_compression_start_is_the_end_of_set_compression():
+    watcher = LoginWatcher()
+    set_compression = encode_frame(0x04, encode_varint(1) + encode_string("a:b")) + encode_frame(0x03, encode_varint(64))
+    feed_split(watcher, set_compression + compressed(0x04, b"p" * 8, 64), 5)
+    assert watcher.compression_start == len(set_compression)
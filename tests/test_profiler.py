@@ -0,0 +1,81 @@
+import math
+import random
+import zlib
+
+from src.protocol.decoder import FrameDecoder
+from src.protocol.encoder import encode_frame, encode_varint
+from src.stats.profiler import COMPRESSED, LatencyHistogram, PacketScanner, Profiler, compressed_packet_id
+
+
+def test_histogram_percentiles_within_relative_error():
+    histogram = LatencyHistogram(bits=5)
+    rng = random.Random(3)
+    values = sorted(int(rng.lognormvariate(12, 2)) for _ in range(20000))
+    for value in values:
+        histogram.record(value)
+    assert histogram.count == len(values)
+    assert histogram.max == values[-1]
+    for percentile, estimate in histogram.percentiles().items():
+        exact = values[max(0, math.ceil(len(values) * percentile / 100) - 1)]
+        assert exact <= estimate <= exact * (1 + 2 ** -5) + 1
+
+
+def test_histogram_small_values_are_exact_and_clear_resets():
+    histogram = LatencyHistogram()
+    for value in (1, 2, 3, 4):
+        histogram.record(value)
+    assert histogram.percentiles((50, 100)) == {50: 2, 100: 4}
+    histogram.clear()
+    assert histogram.count == 0
+    assert histogram.percentiles((50,)) == {50: 0}
+    assert histogram.describe()["count"] == 0
+
+
+def test_histogram_clamps_huge_values():
+    histogram = LatencyHistogram(max_bits=20)
+    histogram.record(1 << 40)
+    histogram.record(-5)
+    assert histogram.count == 2
+    assert histogram.max == 1 << 40
+
+
+def test_packet_scanner_across_splits():
+    stream = b"".join(encode_frame(packet_id, b"x" * size) for packet_id, size in
+                      [(0x00, 3), (0x2A, 200), (0x1234, 0), (0x2A, 5), (0x7F, 1000)])
+    for step in (1, 2, 5, 64, len(stream)):
+        scanner = PacketScanner()
+        tally = {}
+        for i in range(0, len(stream), step):
+            scanner.scan(stream[i:i + step], tally)
+        assert {packet_id: packets for packet_id, (packets, _) in tally.items()} == {0x00: 1, 0x2A: 2, 0x1234: 1, 0x7F: 1}
+        assert sum(size for _, size in tally.values()) == len(stream)
+
+
+def test_packet_scanner_reads_ids_behind_the_data_length():
+    frames = [
+        encode_frame(0, encode_varint(0x24) + b"s" * 10),
+        encode_frame(300, zlib.compress(encode_varint(0x27) + b"c" * 299)),
+        encode_frame(0, encode_varint(0x1234)),
+        encode_frame(0, b""),
+    ]
+    stream = b"".join(frames)
+    for step in (1, 3, len(stream)):
+        scanner = PacketScanner()
+        scanner.compressed = True
+        tally = {}
+        for i in range(0, len(stream), step):
+            scanner.scan(stream[i:i + step], tally)
+        assert {packet_id: packets for packet_id, (packets, _) in tally.items()} == {0x24: 1, COMPRESSED: 2, 0x1234: 1}
+        assert sum(size for _, size in tally.values()) == len(stream)
+
+
+def test_compressed_packet_id_of_decoded_frames():
+    decoder = FrameDecoder()
+    decoder.feed(encode_frame(0, encode_varint(0x07) + b"hi") + encode_frame(300, zlib.compress(b"z" * 300)))
+    assert [compressed_packet_id(frame) for frame in decoder] == [0x07, COMPRESSED]
+
+
+def test_compressed_bucket_is_described_by_name():
+    profiler = Profiler()
+    profiler.count(profiler.tally("upstream", "play"), COMPRESSED, 10)
+    assert [row["packet_id"] for row in profiler.describe()["packets"]] == ["compressed"]
@@ -0,0 +1,187 @@
+import asyncio
+
+from dragonaegis import DragonAegis
+from src.protocol.encoder import encode_frame, encode_handshake, encode_string
+
+LOGIN_START = encode_frame(0x00, encode_string("alice") + bytes(16))
+
+
+class Backend:
+    """A backend that records what it is sent and answers each read with ``ok``."""
+
+    def __init__(self):
+        self.received = bytearray()
+        self.connections = 0
+        self.server = None
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            self.received += data
+            writer.write(b"ok")
+            await writer.drain()
+        writer.close()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+
+async def start_proxy(backend, **options):
+    rate_limiter = DragonAegis(None, **options)
+    server = await asyncio.start_server(
+        lambda r, w: DragonAegis.handle_client(r, w, "127.0.0.1", backend.port, rate_limiter), "127.0.0.1", 0
+    )
+    return rate_limiter, server
+
+
+async def exchange(server, data, wait=0.3):
+    """Send ``data``, then return whatever comes back within ``wait`` and whether the proxy closed."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+    writer.write(data)
+    await writer.drain()
+    received = b""
+    closed = False
+    try:
+        while True:
+            chunk = await asyncio.wait_for(reader.read(4096), wait)
+            if not chunk:
+                closed = True
+                break
+            received += chunk
+    except asyncio.TimeoutError:
+        pass
+    except ConnectionError:
+        closed = True
+    writer.close()
+    return received, closed
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_login_is_replayed_to_the_backend():
+    async def main():
+        async with Backend() as backend:
+            rate_limiter, server = await start_proxy(backend)
+            data = encode_handshake("localhost", 25565, 2) + LOGIN_START + encode_frame(0x07, b"hey")
+            received, closed = await exchange(server, data)
+            server.close()
+            return backend, rate_limiter, received, closed
+
+    backend, rate_limiter, received, closed = run(main())
+    assert received.startswith(b"ok") and not closed
+    assert bytes(backend.received) == encode_handshake("localhost", 25565, 2) + LOGIN_START + encode_frame(0x07, b"hey")
+    assert rate_limiter.metrics["backend_dials"] == 1
+
+
+def test_unknown_next_state_is_never_dialed():
+    async def main():
+        async with Backend() as backend:
+            rate_limiter, server = await start_proxy(backend)
+            received, closed = await exchange(server, encode_handshake("localhost", 25565, 5) + LOGIN_START)
+            server.close()
+            return backend, rate_limiter, received, closed
+
+    backend, rate_limiter, received, closed = run(main())
+    assert closed and received == b""
+    assert backend.connections == 0
+    assert rate_limiter.metrics["backend_dials"] == 0
+    assert rate_limiter.metrics["rejected_invalid_packet"] == 1
+    assert rate_limiter.active_total == 0
+
+
+def test_transfer_logs_in_and_outlives_the_handshake_deadline():
+    async def main():
+        async with Backend() as backend:
+            rate_limiter, server = await start_proxy(backend, handshake_timeout=0.2)
+            received, closed = await exchange(server, encode_handshake("localhost", 25565, 3) + LOGIN_START, wait=0.6)
+            server.close()
+            return backend, rate_limiter, received, closed
+
+    backend, rate_limiter, received, closed = run(main())
+    assert received == b"ok" and not closed
+    assert backend.connections == 1
+    assert rate_limiter.metrics["rejected_handshake_timeout"] == 0
+
+
+def test_transfer_without_login_start_is_never_dialed():
+    async def main():
+        async with Backend() as backend:
+            rate_limiter, server = await start_proxy(backend)
+            received, closed = await exchange(server, encode_handshake("localhost", 25565, 3) + encode_frame(0x05, b""))
+            server.close()
+            return backend, rate_limiter, closed
+
+    backend, rate_limiter, closed = run(main())
+    assert closed and backend.connections == 0
+    assert rate_limiter.metrics["rejected_invalid_packet"] == 1
+
+
+def test_garbage_and_early_close_are_never_dialed():
+    async def main():
+        async with Backend() as backend:
+            rate_limiter, server = await start_proxy(backend)
+            await exchange(server, b"\x05\xff\xff\xff\xff\xff")
+            await exchange(server, encode_handshake("localhost", 25565, 2)[:4], wait=0.05)
+            await exchange(server, encode_frame(0x00, b"\x01"))
+            await asyncio.sleep(0.1)
+            server.close()
+            return backend, rate_limiter
+
+    backend, rate_limiter = run(main())
+    assert backend.connections == 0
+    assert rate_limiter.metrics["rejected_invalid_packet"] == 2
+    assert rate_limiter.metrics["rejected_early_close"] == 1
+    assert rate_limiter.active_total == 0
+
+
+def test_silent_client_times_out_in_handshake_state():
+    async def main():
+        async with Backend() as backend:
+            rate_limiter, server = await start_proxy(backend, handshake_timeout=0.2)
+            received, closed = await exchange(server, b"", wait=1.0)
+            server.close()
+            return backend, rate_limiter, closed
+
+    backend, rate_limiter, closed = run(main())
+    assert closed and backend.connections == 0
+    assert rate_limiter.metrics["rejected_handshake_timeout"] == 1
+
+
+def test_missing_login_start_times_out_in_login_state():
+    async def main():
+        async with Backend() as backend:
+            rate_limiter, server = await start_proxy(backend, login_timeout=0.2)
+            received, closed = await exchange(server, encode_handshake("localhost", 25565, 2), wait=1.0)
+            server.close()
+            return backend, rate_limiter, closed
+
+    backend, rate_limiter, closed = run(main())
+    assert closed and backend.connections == 0
+    assert rate_limiter.metrics["rejected_login_timeout"] == 1
+
+
+def test_idle_player_is_dropped():
+    async def main():
+        async with Backend() as backend:
+            rate_limiter, server = await start_proxy(backend, idle_timeout=0.3)
+            received, closed = await exchange(server, encode_handshake("localhost", 25565, 2) + LOGIN_START, wait=1.5)
+            server.close()
+            return rate_limiter, received, closed
+
+    rate_limiter, received, closed = run(main())
+    assert received == b"ok" and closed
+    assert rate_limiter.metrics["rejected_play_timeout"] == 1
+    assert rate_limiter.active_total == 0
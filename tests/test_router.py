@@ -0,0 +1,136 @@
+import asyncio
+
+from src.database.MemoryManager import MemoryManager
+from src.ratelimit.shared import SharedCounterTable
+from src.routing.router import Router, normalize_host
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_router(servers, **options):
+    """A router over ``servers`` (``log_server`` keyword arguments), refreshed once."""
+    async def main():
+        db = MemoryManager()
+        for server in servers:
+            await db.log_server(**server)
+        router = Router(db, **options)
+        await router.refresh()
+        return db, router
+
+    return run(main())
+
+
+def test_normalize_host_drops_forwarding_fields():
+    assert normalize_host("Play.Example.com.\0FML3\0") == "play.example.com"
+    assert normalize_host("lobby.example.com\x00203.0.113.5\x00uuid") == "lobby.example.com"
+
+
+def test_exact_then_wildcard_then_default_route():
+    _, router = make_router([
+        {"ip": "10.0.0.1", "port": 25565, "hostname": "play.example.com"},
+        {"ip": "10.0.0.2", "port": 25565, "hostname": "*.example.com"},
+        {"ip": "10.0.0.3", "port": 25565, "hostname": "*.eu.example.com"},
+        {"ip": "10.0.0.4", "port": 25565, "hostname": "*"},
+    ])
+
+    def host(name):
+        pool = router.route(name)
+        return [backend.host for backend in pool]
+
+    assert host("PLAY.example.com.") == ["10.0.0.1"]
+    assert host("lobby.example.com") == ["10.0.0.2"]
+    assert host("a.eu.example.com") == ["10.0.0.3"]
+    assert host("other.net") == ["10.0.0.4"]
+
+
+def test_no_default_route():
+    _, router = make_router([{"ip": "10.0.0.1", "port": 25565, "hostname": "play.example.com"}])
+    assert router.route("other.net") is None
+
+
+def test_weighted_picks_follow_weights():
+    _, router = make_router([
+        {"ip": "10.0.0.1", "port": 25565, "weight": 3},
+        {"ip": "10.0.0.2", "port": 25565, "weight": 1},
+    ], balance="weighted")
+    pool = router.route("any")
+    picks = [router.pick(pool).host for _ in range(8)]
+    assert picks.count("10.0.0.1") == 6
+    # Smooth: never more than three in a row for the heavier backend.
+    assert "10.0.0.2" in picks[:4] and "10.0.0.2" in picks[4:]
+
+
+def test_least_connections_and_exclusions():
+    _, router = make_router([
+        {"ip": "10.0.0.1", "port": 25565},
+        {"ip": "10.0.0.2", "port": 25565, "weight": 2},
+    ])
+    pool = router.route("any")
+    first, second = pool
+    first.active = 1
+    second.active = 2
+    assert router.pick(pool) is second
+    second.active = 3
+    assert router.pick(pool) is first
+    assert router.pick(pool, exclude=(first,)) is second
+    assert router.pick(pool, exclude=(first, second)) is None
+
+
+def test_health_falls_and_rises():
+    _, router = make_router([{"ip": "10.0.0.1", "port": 25565}], fall=2, rise=2)
+    pool = router.route("any")
+    backend = pool[0]
+    router.record_failure(backend, ConnectionRefusedError())
+    assert backend.healthy
+    router.record_failure(backend, ConnectionRefusedError())
+    assert not backend.healthy and backend.last_error == "ConnectionRefusedError"
+    assert router.pick(pool) is None
+    assert router.unavailable_reason(pool) == "no_healthy_backend"
+    router._record_success(backend)
+    assert not backend.healthy
+    router._record_success(backend)
+    assert backend.healthy
+
+    backend.allowed = False
+    assert router.pick(pool) is None
+    assert router.unavailable_reason(pool) == "connections_disabled"
+
+
+def test_refresh_keeps_backends_and_drops_deleted_ones():
+    db, router = make_router([
+        {"ip": "10.0.0.1", "port": 25565, "max_connections": 5},
+        {"ip": "10.0.0.2", "port": 25565},
+    ])
+    kept = router.backends[1]
+    kept.active = 4
+    limiter = kept.connections
+
+    async def main():
+        await db.delete_server(2)
+        await router.refresh()
+
+    run(main())
+    assert list(router.backends) == [1]
+    assert router.backends[1] is kept and kept.active == 4
+    # Unchanged limits keep their counts.
+    assert kept.connections is limiter
+
+
+def test_backend_limits_hold_across_workers():
+    table = SharedCounterTable(slots=1024)
+    servers = [{"ip": "10.0.0.1", "port": 25565, "max_connections": 3, "max_packets": 10}]
+    # Two workers, each with its own router over the same servers.
+    workers = [make_router(servers, limiter_factory=table.limiter_factory)[1].backends[1] for _ in range(2)]
+    allowed = [workers[i % 2].connections.allow("1.2.3.4", now=100.0) for i in range(6)]
+    assert allowed == [True, True, True, False, False, False]
+    assert workers[0].packets.allow("1.2.3.4", now=100.0, cost=6)
+    assert not workers[1].packets.allow("1.2.3.4", now=100.0, cost=6)
+
+
+def test_backend_limits_are_per_process_without_workers():
+    servers = [{"ip": "10.0.0.1", "port": 25565, "max_connections": 3}]
+    workers = [make_router(servers)[1].backends[1] for _ in range(2)]
+    allowed = [workers[i % 2].connections.allow("1.2.3.4", now=100.0) for i in range(6)]
+    assert allowed == [True] * 6
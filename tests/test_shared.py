@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from dragonaegis import DragonAegis
+from src.database.MemoryManager import MemoryManager
+from src.ratelimit.shared import SharedCounterTable
+from src.workers.supervisor import EVENT_BAN, EVENT_BLOCK, EVENT_UNBLOCK, SharedEventLog, SharedState
+
+
+def in_child(fn):
+    """Run ``fn`` in a forked child and wait for it; fails the test if it raised."""
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            fn()
+            code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_window_limit_and_peek():
+    limiter = SharedCounterTable(slots=1024).limiter(3, 10, "test")
+    assert [limiter.allow("1.1.1.1", 100.0) for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow("2.2.2.2", 100.0, cost=3)
+    assert not limiter.allow("2.2.2.2", 100.0)
+    # Half way through the next window, half of the previous one still counts.
+    assert limiter.allow("1.1.1.1", 115.0, charge=False)
+    assert [limiter.allow("1.1.1.1", 115.0) for _ in range(3)] == [True, True, False]
+
+
+def test_tags_keep_limiters_apart():
+    table = SharedCounterTable(slots=1024)
+    first = table.limiter(1, 10, "first")
+    second = table.limiter_factory("sliding_window", 1, 10, 100, "second")
+    assert first.allow("1.1.1.1", 100.0) and second.allow("1.1.1.1", 100.0)
+    assert not first.allow("1.1.1.1", 100.0) and not second.allow("1.1.1.1", 100.0)
+    assert len(table) == 2
+
+
+def test_full_bucket_evicts_the_oldest_window():
+    table = SharedCounterTable(slots=4, stripes=1)
+    limiter = table.limiter(1, 10, "test")
+    for i in range(4):
+        assert limiter.allow(f"10.0.0.{i}", 1.0)
+    assert limiter.allow("10.0.0.9", 1.0)
+    assert len(table) == 4
+    # The first key lost its slot and its count; the others kept theirs.
+    assert limiter.allow("10.0.0.0", 1.0)
+    assert not limiter.allow("10.0.0.3", 1.0)
+
+
+def test_counts_are_shared_with_forked_workers():
+    limiter = SharedCounterTable(slots=1024).limiter(6, 60, "test")
+
+    def worker():
+        for _ in range(3):
+            assert limiter.allow("1.1.1.1", 100.0)
+
+    in_child(worker)
+    in_child(worker)
+    assert not limiter.allow("1.1.1.1", 100.0)
+
+
+def test_event_log_cursor_and_overrun():
+    log = SharedEventLog(capacity=4)
+    log.publish(EVENT_BLOCK, "1.1.1.1")
+    log.publish(EVENT_BAN, "10.0.0.0/24", 123.5)
+    events, cursor, overrun = log.read(0)
+    assert events == [(EVENT_BLOCK, "1.1.1.1", 0.0), (EVENT_BAN, "10.0.0.0/24", 123.5)]
+    assert cursor == 2 and not overrun
+    assert log.read(cursor) == ([], 2, False)
+
+    for i in range(6):
+        log.publish(EVENT_UNBLOCK, f"2.2.2.{i}")
+    events, cursor, overrun = log.read(2)
+    assert overrun and cursor == 8
+    assert [entry for _, entry, _ in events] == ["2.2.2.2", "2.2.2.3", "2.2.2.4", "2.2.2.5"]
+
+    with pytest.raises(ValueError):
+        log.publish(EVENT_BLOCK, "x" * 65)
+
+
+def test_events_reach_other_workers():
+    state = SharedState(counter_slots=1024, event_capacity=16)
+    in_child(lambda: DragonAegis(MemoryManager(), shared_state=state).block_ip("203.0.113.0/24"))
+    in_child(lambda: state.events.publish(EVENT_BAN, "198.51.100.0/24", 1e12))
+
+    worker = DragonAegis(MemoryManager(), shared_state=state)
+    worker.apply_shared_events()
+    assert worker.list_blocked() == ["203.0.113.0/24"]
+    assert [network for network, _ in worker.connections.active_bans()] == ["198.51.100.0/24"]
+
+
+def test_connection_limits_hold_across_workers():
+    state = SharedState(counter_slots=1024)
+    workers = [DragonAegis(MemoryManager(), max_connections=2, shared_state=state) for _ in range(2)]
+    allowed = [workers[i % 2].connections.allow_host("1.2.3.4", 100.0) for i in range(4)]
+    assert allowed == [True, True, False, False]
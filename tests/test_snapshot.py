@@ -0,0 +1,139 @@
+import asyncio
+import socket
+import time
+
+from array import array
+
+import pytest
+
+from dragonaegis import DragonAegis
+from src.database.MemoryManager import MemoryManager
+from src.snapshot.format import MappedGeneration, Section, Snapshot, SnapshotError, write_snapshot
+from src.snapshot.state import capture_state, restore_state, write_forked
+
+
+def test_sections_round_trip(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    keys = [f"10.0.{i // 256}.{i % 256}" for i in range(1000)]
+    write_snapshot(path, {
+        "ips": Section(keys, {"hits": array("q", range(1000))}, indexed=True, meta={"interval": 1}),
+        "networks": Section([1 << 136, 5], {"left": array("d", [1.5, 2.5])}),
+        "empty": Section([]),
+    }, {"wall": 1.0})
+
+    snapshot = Snapshot(path)
+    assert snapshot.meta == {"wall": 1.0}
+    assert sorted(snapshot) == ["empty", "ips", "networks"]
+    ips = snapshot.section("ips")
+    assert ips.meta == {"interval": 1}
+    assert ips.keys() == keys
+    assert ips.find("10.0.3.7") == 3 * 256 + 7
+    assert ips.find("192.0.2.1") == -1
+    assert snapshot.section("networks").keys() == [1 << 136, 5]
+    assert snapshot.section("networks").columns["left"].tolist() == [1.5, 2.5]
+    assert len(snapshot.section("empty")) == 0
+
+
+def test_mapped_generation_reads_through_with_an_offset(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    write_snapshot(path, {"t": Section(["a", "b"], {"state": array("q", [10, 20])}, indexed=True)})
+    generation = MappedGeneration(Snapshot(path).section("t"), "state", 100)
+    assert "a" in generation and "c" not in generation
+    assert generation.get("b") == 120 and generation.get("c", 0) == 0
+    assert generation.pop("a") == 110 and len(generation) == 1
+    assert dict(generation.items()) == {"a": 110, "b": 120}
+    generation.clear()
+    assert len(generation) == 0 and "b" not in generation
+
+
+def test_bad_files_are_rejected(tmp_path):
+    path = tmp_path / "state.snapshot"
+    write_snapshot(str(path), {"t": Section(["a"])})
+    data = path.read_bytes()
+    for broken in (b"", data[:20], b"NOTSNAPS" + data[8:], data[:-4]):
+        path.write_bytes(broken)
+        with pytest.raises(SnapshotError):
+            Snapshot(str(path))
+
+
+def populated(now):
+    aegis = DragonAegis(MemoryManager(), max_packets=3, packet_interval=10, conn_interval=60)
+    for ip in ("1.1.1.1", "2.2.2.2", "2.2.2.2"):
+        aegis.packets.allow(ip, now)
+    aegis.connections.ban("203.0.113.0/24", now + 30, now)
+    aegis.block_ip("198.51.100.7")
+    return aegis
+
+
+def assert_restored(original, restored, now):
+    for ip in ("1.1.1.1", "2.2.2.2", "3.3.3.3"):
+        assert restored.packets.peek(ip, now) == pytest.approx(original.packets.peek(ip, now), abs=0.01)
+    assert list(restored.connections.bans()) == list(original.connections.bans())
+    assert list(restored.blocked_ips) == ["198.51.100.7"]
+
+
+def test_state_survives_a_restart(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    now = time.monotonic()
+    aegis = populated(now)
+    build, meta = capture_state(aegis, now)
+    write_snapshot(path, build(), meta)
+
+    restored = DragonAegis(MemoryManager(), max_packets=3, packet_interval=10, conn_interval=60)
+    later = now + (time.time() - meta["wall"])
+    counts = restore_state(restored, Snapshot(path), later)
+    assert counts["packets"] == 2 and counts["bans"] == 1 and counts["blocklist"] == 1
+    assert_restored(aegis, restored, later)
+    assert not restored.packets.allow("2.2.2.2", later, cost=2)
+
+
+def test_changed_limits_start_empty(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    now = time.monotonic()
+    build, meta = capture_state(populated(now), now)
+    write_snapshot(path, build(), meta)
+    restored = DragonAegis(MemoryManager(), max_packets=3, packet_interval=5, conn_interval=60)
+    assert "packets" not in restore_state(restored, Snapshot(path))
+
+
+def test_forked_write(tmp_path):
+    path = str(tmp_path / "state.snapshot")
+    now = time.monotonic()
+    aegis = populated(now)
+    size, meta, paused = asyncio.run(write_forked(aegis, path))
+    snapshot = Snapshot(path)
+    assert snapshot.size == size and snapshot.meta == meta
+    assert paused < 1
+
+    restored = DragonAegis(MemoryManager(), max_packets=3, packet_interval=10, conn_interval=60)
+    later = time.monotonic()
+    restore_state(restored, snapshot, later)
+    assert_restored(aegis, restored, later)
+
+
+def test_forked_write_reports_errors(tmp_path):
+    with pytest.raises(SnapshotError):
+        asyncio.run(write_forked(populated(time.monotonic()), str(tmp_path / "missing" / "state.snapshot")))
+
+
+def test_forked_writer_does_not_hold_sockets_open(tmp_path, monkeypatch):
+    def slow_capture(aegis):
+        time.sleep(1)
+        return capture_state(aegis)
+
+    monkeypatch.setattr("src.snapshot.state.capture_state", slow_capture)
+
+    async def main():
+        ours, theirs = socket.socketpair()
+        theirs.settimeout(0.5)
+        task = asyncio.create_task(write_forked(populated(time.monotonic()), str(tmp_path / "state.snapshot")))
+        await asyncio.sleep(0.2)
+        # The child is still capturing; closing our end must reach the peer now.
+        ours.close()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, theirs.recv, 1)
+        finally:
+            theirs.close()
+            await task
+
+    assert asyncio.run(main()) == b""
@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+from src.protocol.decoder import FrameDecoder, read_varint
+from src.protocol.encoder import encode_frame, encode_string
+from src.protocol.status import FALLBACK_STATUS, StatusCache
+
+
+class StatusBackend:
+    """Answers each status request with a description counting the requests so far."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = 0
+        self.failing = False
+        self.server = None
+
+    async def handle(self, reader, writer):
+        await reader.read(4096)
+        self.requests += 1
+        if not self.failing:
+            await asyncio.sleep(self.delay)
+            status = json.dumps({"description": {"text": str(self.requests)}})
+            writer.write(encode_frame(0x00, encode_string(status)))
+            await writer.drain()
+        writer.close()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+
+    def cache(self, **options):
+        return StatusCache("127.0.0.1", self.server.sockets[0].getsockname()[1], **options)
+
+
+def description(response):
+    decoder = FrameDecoder()
+    decoder.feed(response)
+    payload = decoder.next_frame().payload
+    length, offset = read_varint(payload)
+    return json.loads(str(payload[offset:offset + length], "utf-8"))["description"]["text"]
+
+
+def test_backend_is_asked_once_per_interval():
+    async def main():
+        async with StatusBackend() as backend:
+            cache = backend.cache(refresh_interval=60)
+            served = [description(await cache.get()) for _ in range(5)]
+            return backend.requests, served, cache
+
+    requests, served, cache = asyncio.run(main())
+    assert requests == 1 and served == ["1"] * 5
+    assert cache.refreshes == 1 and cache.served == 5
+    assert json.loads(cache.status_json)["description"]["text"] == "1"
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def main():
+        async with StatusBackend(delay=0.1) as backend:
+            cache = backend.cache()
+            served = await asyncio.gather(*(cache.get() for _ in range(10)))
+            return backend.requests, {description(response) for response in served}
+
+    assert asyncio.run(main()) == (1, {"1"})
+
+
+def test_stale_status_is_served_while_refreshing():
+    async def main():
+        async with StatusBackend(delay=0.05) as backend:
+            cache = backend.cache(refresh_interval=1, max_stale=60)
+            await cache.get()
+            cache.fetched_at -= 2
+            stale = description(await cache.get())
+            # The refresh runs in the background; the next caller gets its result.
+            await asyncio.sleep(0.2)
+            fresh = description(await cache.get())
+            return stale, fresh, backend.requests
+
+    assert asyncio.run(main()) == ("1", "2", 2)
+
+
+def test_too_stale_status_waits_for_a_fresh_one():
+    async def main():
+        async with StatusBackend() as backend:
+            cache = backend.cache(refresh_interval=1, max_stale=5)
+            await cache.get()
+            cache.fetched_at -= 10
+            return description(await cache.get())
+
+    assert asyncio.run(main()) == "2"
+
+
+def test_fallbacks_when_the_backend_is_down():
+    fallback = encode_frame(0x00, encode_string(json.dumps(FALLBACK_STATUS)))
+
+    async def main():
+        async with StatusBackend() as backend:
+            cache = backend.cache(refresh_interval=1, max_stale=5)
+            backend.failing = True
+            first = await cache.get()
+            await asyncio.sleep(0)
+            error = cache.last_error
+            backend.failing = False
+            await cache.get()
+            backend.failing = True
+            cache.fetched_at -= 10
+            # Past max_stale and the refresh fails: the last good status still beats the fallback.
+            last_good = description(await cache.get())
+            return first, error, last_good
+
+    first, error, last_good = asyncio.run(main())
+    assert first == fallback
+    assert error == "Backend closed before sending status"
+    assert last_good == "2"
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from src.database.MemoryManager import MemoryManager
+from src.database.SQLiteManager import SQLiteManager
+
+
+class FlakyMemoryManager(MemoryManager):
+    """Fails the next ``failures`` block writes."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = 0
+
+    async def _write_blocks(self, changes):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database went away")
+        await super()._write_blocks(changes)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    def make(**kwargs):
+        options = {"flush_interval": 3600, **kwargs}
+        if request.param == "memory":
+            return MemoryManager(**options)
+        return SQLiteManager(str(tmp_path / "test.db"), **options)
+    return make
+
+
+def test_latest_block_change_wins(make_backend):
+    async def main():
+        db = make_backend()
+        await db.initialize()
+        try:
+            await db.block_ip("1.1.1.1", 1)
+            await db.unblock_ip("1.1.1.1", 1)
+            await db.block_ip("2.2.2.2", 1)
+            await db.unblock_ip("2.2.2.2", 1)
+            await db.block_ip("2.2.2.2", 1)
+            await db.flush()
+            return await db.list_blocked(1)
+        finally:
+            await db.close()
+
+    assert run(main()) == ["2.2.2.2"]
+
+
+def test_blocks_survive_a_full_event_queue(make_backend):
+    async def main():
+        db = make_backend(max_queue=10, overflow_policy="drop_newest")
+        await db.initialize()
+        try:
+            await db.block_ip("3.3.3.3", 1)
+            for _ in range(100):
+                await db.log_packet("4.4.4.4", 1)
+            await db.block_ip("5.5.5.5", 1)
+            await db.flush()
+            return db.dropped_events, sorted(await db.list_blocked(1))
+        finally:
+            await db.close()
+
+    dropped, blocked = run(main())
+    assert dropped == 90
+    assert blocked == ["3.3.3.3", "5.5.5.5"]
+
+
+def test_failed_block_writes_are_retried_in_order():
+    async def main():
+        db = FlakyMemoryManager(flush_interval=3600)
+        await db.initialize()
+        try:
+            db.failures = 2
+            await db.block_ip("6.6.6.6", 1)
+            await db.block_ip("7.7.7.7", 1)
+            await db.flush()
+            # Made while the first batch is waiting for a retry; newer than it.
+            await db.unblock_ip("6.6.6.6", 1)
+            await db.flush()
+            pending = db.queue_stats()["pending_block_changes"]
+            await db.flush()
+            return pending, db.block_write_failures, await db.list_blocked(1), db.queue_stats()["pending_block_changes"]
+        finally:
+            await db.close()
+
+    pending, failures, blocked, left = run(main())
+    assert pending == 2
+    assert failures == 2
+    assert blocked == ["7.7.7.7"]
+    assert left == 0
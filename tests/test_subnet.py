@@ -0,0 +1,74 @@
+import pytest
+
+from src.ratelimit.limiter import LIMITER_MODES
+from src.ratelimit.subnet import SubnetLimiter, parse_prefix_limits
+
+MODES = sorted(LIMITER_MODES)
+
+
+def test_parse_prefix_limits():
+    assert parse_prefix_limits("24:20, /16:100") == {24: 20, 16: 100}
+    assert parse_prefix_limits("") == {}
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_subnet_denial_charges_nothing(mode):
+    limiter = SubnetLimiter(60, v4_limits={32: 5, 24: 3}, v6_limits={}, mode=mode, ban_threshold=100)
+    now = 100.0
+    assert all(limiter.allow(f"10.0.0.{i}", now) for i in range(3))
+    # Denied by the /24, so its own /32 allowance is untouched.
+    assert not any(limiter.allow("10.0.0.9", now) for _ in range(10))
+    assert limiter.allow("10.0.1.9", now)
+    assert [limiter.allow_host("10.0.0.9", now) for _ in range(6)] == [True] * 5 + [False]
+
+
+def test_subnet_levels_checked_separately():
+    limiter = SubnetLimiter(60, v4_limits={32: 2, 24: 100}, v6_limits={}, ban_threshold=100)
+    now = 100.0
+    assert all(limiter.allow("10.0.0.1", now, host=False) for _ in range(10))
+    assert [limiter.allow_host("10.0.0.1", now) for _ in range(3)] == [True, True, False]
+    assert not limiter.allow("10.0.0.1", now)
+
+
+def test_ipv6_and_mapped_addresses_share_levels():
+    limiter = SubnetLimiter(60, v4_limits={32: 2}, v6_limits={128: 1, 64: 2}, ban_threshold=100)
+    now = 100.0
+    assert limiter.allow("1.2.3.4", now)
+    assert limiter.allow("::ffff:1.2.3.4", now)
+    assert not limiter.allow("1.2.3.4", now)
+    assert limiter.allow("2001:db8::1", now)
+    assert limiter.allow("2001:db8::2", now)
+    assert not limiter.allow("2001:db8::3", now)
+
+
+def test_repeated_denials_ban_the_prefix():
+    limiter = SubnetLimiter(60, v4_limits={32: 1}, v6_limits={}, ban_threshold=3, ban_duration=10)
+    now = 100.0
+    for _ in range(5):
+        limiter.allow("10.0.0.1", now)
+    assert [network for network, _ in limiter.active_bans(now)] == ["10.0.0.1/32"]
+    # Banned even though a new interval would have reset the limiter.
+    assert not limiter.allow("10.0.0.1", now + 5)
+    assert limiter.allow("10.0.0.1", now + 200)
+    assert limiter.active_bans(now + 200) == []
+
+
+def test_broad_prefixes_are_never_banned_by_default():
+    limiter = SubnetLimiter(60, v4_limits={32: 1000, 16: 5}, v6_limits={}, ban_threshold=2)
+    now = 100.0
+    for i in range(50):
+        limiter.allow(f"10.0.{i}.1", now)
+    assert limiter.active_bans(now) == []
+    assert not limiter.allow("10.0.99.1", now)
+
+
+def test_lift_ban_and_ban_cap():
+    limiter = SubnetLimiter(60, max_bans=2)
+    now = 100.0
+    limiter.ban("10.0.0.0/24", now + 10, now)
+    limiter.ban("10.0.1.0/24", now + 20, now)
+    limiter.ban("10.0.2.0/24", now + 30, now)
+    assert sorted(network for network, _ in limiter.active_bans(now)) == ["10.0.1.0/24", "10.0.2.0/24"]
+    assert limiter.lift_ban("10.0.1.0/24")
+    assert not limiter.lift_ban("10.0.1.0/24")
+    assert limiter.allow("10.0.1.5", now)
@@ -0,0 +1,90 @@
+import asyncio
+
+from src.timers.wheel import TimerWheel
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_timers_fire_in_order_and_once():
+    async def main():
+        wheel = TimerWheel(tick=0.01, slots=8)
+        fired = []
+        for delay in (0.05, 0.01, 0.03, 0.2):
+            wheel.schedule(delay, lambda delay=delay: fired.append(delay))
+        assert len(wheel) == 4
+        await asyncio.sleep(0.3)
+        return wheel, fired
+
+    wheel, fired = run(main())
+    # 0.2s wraps the 8-slot wheel several times before it is due.
+    assert fired == [0.01, 0.03, 0.05, 0.2]
+    assert len(wheel) == 0
+    assert wheel.fired == 4
+
+
+def test_cancel():
+    async def main():
+        wheel = TimerWheel(tick=0.01)
+        fired = []
+        timer = wheel.schedule(0.02, lambda: fired.append("cancelled"))
+        wheel.schedule(0.02, lambda: fired.append("kept"))
+        wheel.cancel(timer)
+        wheel.cancel(timer)
+        assert len(wheel) == 1
+        await asyncio.sleep(0.1)
+        return wheel, fired
+
+    wheel, fired = run(main())
+    assert fired == ["kept"]
+    assert len(wheel) == 0
+
+
+def test_cancel_after_firing_is_harmless():
+    async def main():
+        wheel = TimerWheel(tick=0.01)
+        timer = wheel.schedule(0.01, lambda: None)
+        await asyncio.sleep(0.05)
+        wheel.cancel(timer)
+        return wheel
+
+    wheel = run(main())
+    assert len(wheel) == 0 and wheel.pending == 0
+
+
+def test_stops_when_empty_and_restarts():
+    async def main():
+        wheel = TimerWheel(tick=0.01)
+        fired = []
+        wheel.schedule(0.01, lambda: fired.append(1))
+        await asyncio.sleep(0.05)
+        idle = wheel._handle is None
+        started = wheel.now
+        wheel.schedule(0.02, lambda: fired.append(2))
+        await asyncio.sleep(0.05)
+        return wheel, fired, idle, started
+
+    wheel, fired, idle, started = run(main())
+    assert idle
+    assert fired == [1, 2]
+    assert wheel.now >= started + 2
+    assert wheel.elapsed(started) >= 0.02
+
+
+def test_timer_scheduled_from_a_callback():
+    async def main():
+        wheel = TimerWheel(tick=0.01)
+        fired = []
+
+        def first():
+            fired.append(1)
+            wheel.schedule(0.01, lambda: fired.append(2))
+
+        wheel.schedule(0.01, first)
+        await asyncio.sleep(0.1)
+        return wheel, fired
+
+    wheel, fired = run(main())
+    assert fired == [1, 2]
+    assert len(wheel) == 0